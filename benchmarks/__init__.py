@@ -0,0 +1,16 @@
+'''
+I/O与计算热点的基准测试
+
+在生成的磁盘数据集（产品数量 x 天数 x 时间粒度）上运行，报告每项测试的耗时、rows/s、MB/s与峰值内存
+结果保存为JSON，可以比较不同版本之间的差异
+
+运行:
+    python -m benchmarks --symbols 20 --days 30 --bar 1m --format npy
+    python -m benchmarks --only load_candle_by_date --only to_candle
+比较:
+    python -m benchmarks --compare benchmarks/results/a.json benchmarks/results/b.json
+
+dataset     生成测试用的磁盘数据集
+cases       测试项目
+runner      在子进程中运行测试项目并统计结果
+'''
@@ -0,0 +1,150 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import candlelite
+from benchmarks import cases as _cases
+from benchmarks import dataset as _dataset
+from benchmarks import runner as _runner
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+# 当前的git提交，不是git仓库返回None
+def _get_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=HERE,
+            stderr=subprocess.DEVNULL,
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _fmt(value, fmt: str) -> str:
+    return '-' if value == None else fmt.format(value)
+
+
+# 打印结果表格
+def _print_results(results: list) -> None:
+    print('{:<32}{:>12}{:>12}{:>14}{:>10}{:>10}'.format('case', 'min(ms)', 'median(ms)', 'rows/s', 'MB/s', 'RSS(MB)'))
+    for result in results:
+        print('{:<32}{:>12}{:>12}{:>14}{:>10}{:>10}'.format(
+            result['name'],
+            _fmt(result['min'] * 1000, '{:.2f}'),
+            _fmt(result['median'] * 1000, '{:.2f}'),
+            _fmt(result['rows_per_sec'], '{:,.0f}'),
+            _fmt(result['mb_per_sec'], '{:.1f}'),
+            _fmt(result['peak_rss_mb'], '{:.0f}'),
+        ))
+
+
+# 比较两次结果，ratio为新/旧的中位数耗时
+def _print_compare(old_path: str, new_path: str) -> None:
+    with open(old_path, 'r', encoding='UTF-8') as f:
+        old = json.load(f)
+    with open(new_path, 'r', encoding='UTF-8') as f:
+        new = json.load(f)
+    if old['params'] != new['params']:
+        print('warning: params differ {old} != {new}'.format(old=old['params'], new=new['params']), file=sys.stderr)
+    old_map = {result['name']: result for result in old['results']}
+    print('{:<32}{:>12}{:>12}{:>10}'.format(
+        'case',
+        '{}(ms)'.format(old['commit'] or old['version'])[:12],
+        '{}(ms)'.format(new['commit'] or new['version'])[:12],
+        'ratio',
+    ))
+    for result in new['results']:
+        old_result = old_map.get(result['name'])
+        if old_result == None:
+            continue
+        print('{:<32}{:>12.2f}{:>12.2f}{:>10.2f}'.format(
+            result['name'],
+            old_result['median'] * 1000,
+            result['median'] * 1000,
+            result['median'] / old_result['median'],
+        ))
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='candlelite benchmarks')
+    parser.add_argument('--symbols', type=int, default=20, help='产品数量')
+    parser.add_argument('--days', type=int, default=30, help='天数')
+    parser.add_argument('--bar', default='1m', help='时间粒度')
+    parser.add_argument('--timezone', default='Asia/Shanghai', help='时区')
+    parser.add_argument('--format', default='npy', help='存储格式 csv|npy|npc')
+    parser.add_argument('--p-num', type=int, default=4, help='多产品读取的进程数')
+    parser.add_argument('--repeat', type=int, default=5, help='计时次数')
+    parser.add_argument('--only', action='append', default=[], choices=list(_cases.CASES.keys()), help='只运行指定项目')
+    parser.add_argument('--data-dir', default=None, help='数据集文件夹，默认benchmarks/.data/<参数>')
+    parser.add_argument('--output-dir', default=os.path.join(HERE, 'results'), help='结果文件夹')
+    parser.add_argument('--no-save', action='store_true', help='不保存结果')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='比较两次结果')
+    parser.add_argument('--list', action='store_true', help='列出全部测试项目')
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name, (group, _) in _cases.CASES.items():
+            print('{:<12}{}'.format(group, name))
+        return None
+    if args.compare:
+        _print_compare(*args.compare)
+        return None
+
+    params = {
+        'symbols': args.symbols,
+        'days': args.days,
+        'bar': args.bar,
+        'timezone': args.timezone,
+        'format': args.format,
+        'p_num': args.p_num,
+    }
+    data_dir = args.data_dir
+    if data_dir == None:
+        data_dir = os.path.join(
+            HERE,
+            '.data',
+            '{symbols}x{days}-{bar}-{format}-{tz}'.format(tz=args.timezone.replace('/', '_'), **params),
+        )
+    print('preparing dataset {data_dir} ...'.format(data_dir=data_dir), file=sys.stderr, flush=True)
+    info = _dataset.make_dataset(
+        base_dir=data_dir,
+        symbols=args.symbols,
+        days=args.days,
+        bar=args.bar,
+        timezone=args.timezone,
+        format=args.format,
+        p_num=args.p_num,
+    )
+    ctx = {
+        'base_dir': data_dir,
+        'info': info,
+        'bar': args.bar,
+        'timezone': args.timezone,
+        'format': args.format,
+        'p_num': args.p_num,
+    }
+    results = _runner.run_cases(names=args.only, ctx=ctx, repeat=args.repeat)
+    _print_results(results)
+    if args.no_save:
+        return None
+    now = time.strftime('%Y%m%d-%H%M%S')
+    os.makedirs(args.output_dir, exist_ok=True)
+    path = os.path.join(args.output_dir, '{version}-{now}.json'.format(version=candlelite.__version__, now=now))
+    with open(path, 'w', encoding='UTF-8') as f:
+        json.dump({
+            'version': candlelite.__version__,
+            'commit': _get_commit(),
+            'time': now,
+            'python': sys.version.split()[0],
+            'params': params,
+            'results': results,
+        }, f, indent=2)
+    print('saved {path}'.format(path=path), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
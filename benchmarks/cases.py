@@ -0,0 +1,243 @@
+'''
+测试项目
+
+每个测试项目接收运行参数ctx，返回(run, rows, bytes):
+    run     无参数的函数，每次计时调用一次
+    rows    每次调用处理的K线行数
+    bytes   每次调用读取或写入的字节数（计算项目为输入数据的字节数）
+
+ctx:
+    {
+        'base_dir': 数据集文件夹,
+        'info': make_dataset的返回结果,
+        'bar': 时间粒度,
+        'timezone': 时区,
+        'format': 存储格式,
+        'p_num': 多产品读取的进程数,
+        'tmp_dir': 写入测试使用的临时文件夹,
+    }
+'''
+
+import os
+import numpy as np
+from paux import date as _date
+from candlelite.calculate import transform as _transform
+from candlelite.calculate import technical as _technical
+from candlelite.io import load as _load
+from candlelite.io import save as _save
+from candlelite.io import path as _path
+from candlelite.io import synthetic as _synthetic
+from benchmarks import dataset as _dataset
+
+__all__ = ['CASES']
+
+# {name: (group, func)}
+CASES = {}
+
+
+# 注册测试项目
+def case(group: str):
+    def register(func):
+        CASES[func.__name__] = (group, func)
+        return func
+
+    return register
+
+
+# 以日期为单位存储的文件大小
+def _get_date_bytes(ctx: dict, symbols: list) -> int:
+    info = ctx['info']
+    size = 0
+    for symbol in symbols:
+        candle_dates_result = _path.get_candle_dates(
+            instType=_dataset.INST_TYPE,
+            symbol=symbol,
+            start=info['start'],
+            end=info['end'],
+            base_dir=ctx['base_dir'],
+            timezone=ctx['timezone'],
+            bar=ctx['bar'],
+            format=ctx['format'],
+        )
+        data = candle_dates_result['data']
+        if not data['start']:
+            continue
+        for date in _date.get_range_dates(start=data['start'], end=data['end'], timezone=ctx['timezone']):
+            if date in data['non']:
+                continue
+            size += os.path.getsize(_path.get_candle_date_path(
+                instType=_dataset.INST_TYPE,
+                symbol=symbol,
+                date=date,
+                base_dir=ctx['base_dir'],
+                timezone=ctx['timezone'],
+                bar=ctx['bar'],
+                format=ctx['format'],
+            ))
+    return size
+
+
+# 读取一个产品的全部日期
+def _load_kwargs(ctx: dict) -> dict:
+    return dict(
+        instType=_dataset.INST_TYPE,
+        base_dir=ctx['base_dir'],
+        timezone=ctx['timezone'],
+        bar=ctx['bar'],
+        format=ctx['format'],
+    )
+
+
+# 测试用的candle
+def _get_candle(ctx: dict) -> np.ndarray:
+    info = ctx['info']
+    return _synthetic.make_candle(
+        start=info['start'],
+        end=info['end'],
+        bar=ctx['bar'],
+        timezone=ctx['timezone'],
+    )
+
+
+@case(group='io')
+def load_candle_by_date(ctx: dict):
+    info = ctx['info']
+    symbol = info['symbols'][0]
+
+    def run():
+        _load.load_candle_by_date(symbol=symbol, start=info['start'], end=info['end'], **_load_kwargs(ctx))
+
+    return run, info['rows'], _get_date_bytes(ctx, [symbol])
+
+
+@case(group='io')
+def load_candle_by_date_columns(ctx: dict):
+    info = ctx['info']
+    symbol = info['symbols'][0]
+
+    def run():
+        _load.load_candle_by_date(
+            symbol=symbol, start=info['start'], end=info['end'], columns=[0, 4], **_load_kwargs(ctx)
+        )
+
+    return run, info['rows'], _get_date_bytes(ctx, [symbol])
+
+
+@case(group='io')
+def load_candle_map_by_date(ctx: dict):
+    info = ctx['info']
+
+    def run():
+        _load.load_candle_map_by_date(
+            symbols=info['symbols'], start=info['start'], end=info['end'], p_num=ctx['p_num'], **_load_kwargs(ctx)
+        )
+
+    return run, info['rows'] * len(info['symbols']), _get_date_bytes(ctx, info['symbols'])
+
+
+@case(group='io')
+def load_candle_by_file(ctx: dict):
+    info = ctx['info']
+    symbol = info['symbols'][0]
+    kwargs = _load_kwargs(ctx)
+    path = _path.get_candle_file_path(symbol=symbol, **kwargs)
+
+    def run():
+        _load.load_candle_by_file(symbol=symbol, **kwargs)
+
+    return run, info['rows'], os.path.getsize(path)
+
+
+@case(group='io')
+def save_candle_by_date(ctx: dict):
+    info = ctx['info']
+    candle = _get_candle(ctx)
+    kwargs = dict(_load_kwargs(ctx), base_dir=ctx['tmp_dir'])
+
+    def run():
+        _save.save_candle_by_date(candle=candle, symbol='SAVE', start=info['start'], end=info['end'], **kwargs)
+
+    run()
+    size = 0
+    for dirpath, _, filenames in os.walk(ctx['tmp_dir']):
+        size += sum(os.path.getsize(os.path.join(dirpath, filename)) for filename in filenames)
+    return run, candle.shape[0], size
+
+
+@case(group='calculate')
+def compress_candle(ctx: dict):
+    candle = _get_candle(ctx)
+
+    def run():
+        _transform.compress_candle(candle=candle, target_bar='1H', org_bar=ctx['bar'], timezone=ctx['timezone'])
+
+    return run, candle.shape[0], candle.nbytes
+
+
+@case(group='calculate')
+def to_candle(ctx: dict):
+    candle = _get_candle(ctx)
+    # 打乱顺序并加入重复的行
+    rng = np.random.default_rng(0)
+    indexes = rng.permutation(candle.shape[0])
+    dirty = np.concatenate([candle[indexes], candle[indexes[:candle.shape[0] // 10]]])
+
+    def run():
+        _transform.to_candle(candle=dirty)
+
+    return run, dirty.shape[0], dirty.nbytes
+
+
+@case(group='calculate')
+def concat_candle(ctx: dict):
+    candle = _get_candle(ctx)
+    # 每天一个分块
+    candles = np.array_split(candle, ctx['info']['days'])
+
+    def run():
+        _transform.concat_candle(candles=candles)
+
+    return run, candle.shape[0], candle.nbytes
+
+
+@case(group='calculate')
+def technical_ma_map(ctx: dict):
+    candle = _get_candle(ctx)
+
+    def run():
+        _technical.ma_map(candle=candle, ns=[5, 10, 20, 60, 120])
+
+    return run, candle.shape[0], candle.nbytes
+
+
+@case(group='calculate')
+def technical_boll(ctx: dict):
+    candle = _get_candle(ctx)
+
+    def run():
+        _technical.boll(candle=candle, n=20)
+
+    return run, candle.shape[0], candle.nbytes
+
+
+@case(group='calculate')
+def technical_dualThrust(ctx: dict):
+    candle = _get_candle(ctx)
+
+    def run():
+        _technical.dualThrust(candle=candle, n=20, ks=0.5, kx=0.5)
+
+    return run, candle.shape[0], candle.nbytes
+
+
+@case(group='calculate')
+def technical_history_suc_batch(ctx: dict):
+    candle = _get_candle(ctx)
+    close = candle[:, 4]
+    buyLines = np.linspace(close.min(), close.max(), 50)
+    sellLines = buyLines * 1.01
+
+    def run():
+        _technical.history_suc_batch(candle=candle, posSide='long', buyLines=buyLines, sellLines=sellLines)
+
+    return run, candle.shape[0], candle.nbytes
@@ -0,0 +1,91 @@
+'''
+生成测试用的磁盘数据集（candlelite.io.synthetic），相同的参数生成相同的数据
+
+生成参数保存在数据集文件夹的params.json中，参数不同时删除旧的数据集重新生成
+'''
+
+import os
+import json
+import shutil
+import datetime
+from candlelite.io import synthetic as _synthetic
+
+__all__ = ['INST_TYPE', 'make_dataset']
+
+INST_TYPE = 'BENCH'
+PARAMS_FILENAME = 'params.json'
+
+
+# 日期加上天数
+def _add_days(date: str, days: int) -> str:
+    return (datetime.date.fromisoformat(date) + datetime.timedelta(days=days)).isoformat()
+
+
+# 读取数据集的生成参数，没有参数文件返回None
+def _read_params(base_dir: str) -> dict:
+    params_path = os.path.join(base_dir, PARAMS_FILENAME)
+    if not os.path.isfile(params_path):
+        return None
+    with open(params_path, 'r', encoding='UTF-8') as f:
+        return json.load(f)
+
+
+# 生成以日期为单位与以文件为单位存储的数据集
+def make_dataset(
+        base_dir: str,
+        symbols: int,
+        days: int,
+        bar: str = '1m',
+        timezone: str = None,
+        format: str = 'npy',
+        start: str = '2023-01-01',
+        p_num: int = 1,
+) -> dict:
+    '''
+    :param base_dir: 数据文件夹
+    :param symbols: 产品数量
+    :param days: 天数
+    :param bar: 时间粒度
+    :param timezone: 时区
+    :param format: 存储格式
+    :param start: 起始日期
+    :param p_num: 生成数据集的并行数量
+    :return: {'symbols': 产品名称列表, 'start': 起始日期, 'end': 终止日期, 'days': 天数, 'rows': 每个产品的行数}
+
+    base_dir不为空并且没有params.json时抛出异常，不会删除其他文件夹
+    '''
+    end = _add_days(start, days - 1)
+    kwargs = dict(
+        instType=INST_TYPE,
+        base_dir=base_dir,
+        symbols=symbols,
+        start=start,
+        end=end,
+        timezone=timezone,
+        bar=bar,
+        format=format,
+        p_num=p_num,
+    )
+    params = dict(symbols=symbols, days=days, bar=bar, timezone=timezone, format=format, start=start)
+    if os.path.isdir(base_dir) and os.listdir(base_dir):
+        old_params = _read_params(base_dir)
+        if old_params == None:
+            raise ValueError('{base_dir} is not empty and has no {filename}'.format(
+                base_dir=base_dir,
+                filename=PARAMS_FILENAME,
+            ))
+        if old_params != params:
+            shutil.rmtree(base_dir)
+    if not os.path.isdir(base_dir) or not os.listdir(base_dir):
+        _synthetic.make_candle_by_date(**kwargs)
+        _synthetic.make_candle_by_file(**kwargs)
+        # 生成完成后写入参数，中途失败时下次重新生成
+        with open(os.path.join(base_dir, PARAMS_FILENAME), 'w', encoding='UTF-8') as f:
+            json.dump(params, f, indent=2)
+    return {
+        'symbols': _synthetic.make_symbols(symbols),
+        'start': start,
+        'end': end,
+        'days': days,
+        'rows': int(_synthetic.make_candle(start=start, end=end, bar=bar, timezone=timezone).shape[0]),
+    }
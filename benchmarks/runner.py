@@ -0,0 +1,106 @@
+'''
+在子进程中运行测试项目并统计结果
+
+每个测试项目使用独立的子进程，峰值内存不受其他项目影响，缓存也不会在项目之间共享
+'''
+
+import sys
+import time
+import shutil
+import statistics
+import tempfile
+import multiprocessing
+from benchmarks import cases as _cases
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+__all__ = ['run_case', 'run_cases']
+
+
+# 进程的峰值内存（MB），不支持的平台返回None
+def _get_peak_rss() -> float:
+    if resource == None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux单位为KB，macOS单位为字节
+    if sys.platform == 'darwin':
+        return peak / 1024 / 1024
+    return peak / 1024
+
+
+# 在当前进程中运行一个测试项目
+def _run_case(name: str, ctx: dict, repeat: int) -> dict:
+    group, func = _cases.CASES[name]
+    tmp_dir = tempfile.mkdtemp(prefix='candlelite-bench-')
+    try:
+        run, rows, size = func(dict(ctx, tmp_dir=tmp_dir))
+        # 预热一次，读取类项目的文件缓存与CandleCache在预热后保持稳定
+        run()
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    median = statistics.median(times)
+    return {
+        'name': name,
+        'group': group,
+        'repeat': repeat,
+        'min': min(times),
+        'median': median,
+        'rows': rows,
+        'bytes': size,
+        'rows_per_sec': rows / median if median > 0 else None,
+        'mb_per_sec': size / 1024 / 1024 / median if median > 0 else None,
+        'peak_rss_mb': _get_peak_rss(),
+    }
+
+
+def _target(queue, name: str, ctx: dict, repeat: int) -> None:
+    try:
+        queue.put({'code': 200, 'data': _run_case(name=name, ctx=ctx, repeat=repeat), 'msg': ''})
+    except Exception as e:
+        queue.put({'code': 500, 'data': None, 'msg': '{name}: {e!r}'.format(name=name, e=e)})
+
+
+# 在子进程中运行一个测试项目
+def run_case(name: str, ctx: dict, repeat: int = 5) -> dict:
+    '''
+    :param name: 测试项目名称
+    :param ctx: 运行参数（见cases）
+    :param repeat: 计时次数
+    :return: {'code': 200, 'data': 结果, 'msg': ''}，失败时code为500
+    '''
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_target, args=(queue, name, ctx, repeat))
+    process.start()
+    # 先取结果再join，避免子进程因队列未读取而阻塞
+    result = queue.get()
+    process.join()
+    return result
+
+
+# 依次运行多个测试项目
+def run_cases(names: list, ctx: dict, repeat: int = 5, log: bool = True) -> list:
+    '''
+    :param names: 测试项目名称列表，空列表表示全部
+    :param ctx: 运行参数（见cases）
+    :param repeat: 计时次数
+    :param log: 是否打印进度
+    :return: 成功的结果列表
+    '''
+    results = []
+    for name in names or list(_cases.CASES.keys()):
+        if log:
+            print('running {name} ...'.format(name=name), file=sys.stderr, flush=True)
+        result = run_case(name=name, ctx=ctx, repeat=repeat)
+        if result['code'] != 200:
+            print(result['msg'], file=sys.stderr, flush=True)
+            continue
+        results.append(result['data'])
+    return results
@@ -2,7 +2,89 @@ from typing import Literal, Union
 import numpy as np
 from candlelite import exception
 
-__all__ = ['history_suc', 'ma', 'boll', 'dualThrust']
+__all__ = ['history_suc', 'history_suc_batch', 'ma', 'ma_map', 'boll', 'dualThrust']
+
+
+# 开仓与平仓的触发列，posSide非法时抛出异常
+def _get_suc_columns(posSide: str, func: str) -> tuple:
+    '''
+    :return: (开仓列, 开仓是否为<=, 平仓列, 平仓是否为<=)
+        long:  最低价<=buyLine开仓，最高价>=sellLine平仓
+        short: 最高价>=buyLine开仓，最低价<=sellLine平仓
+    '''
+    if posSide.upper() == 'LONG':
+        return 3, True, 2, False
+    elif posSide.upper() == 'SHORT':
+        return 2, False, 3, True
+    else:
+        raise exception.PosSideException(
+            func=func,
+            posSide=posSide,
+        )
+
+
+# 触发价格的K线索引（升序）
+def _get_event_indexes(values: np.ndarray, line: Union[int, float], less_equal: bool) -> np.ndarray:
+    if less_equal:
+        return np.flatnonzero(values <= line)
+    else:
+        return np.flatnonzero(values >= line)
+
+
+# 合并全部触发K线后向量化地执行状态机，统计完成的次数
+def _count_suc_by_events(fill_indexes: np.ndarray, exit_indexes: np.ndarray) -> int:
+    '''
+    每根触发K线最多改变一次状态:
+        只开仓触发  状态置为持仓
+        只平仓触发  状态置为空仓（持仓时完成一次）
+        同时触发    状态翻转（持仓时完成一次）
+    两次置位之间的状态由翻转次数的奇偶决定
+    '''
+    if fill_indexes.shape[0] == 0 or exit_indexes.shape[0] == 0:
+        return 0
+    # 用K线位置上的布尔标记代替排序合并
+    size = max(fill_indexes[-1], exit_indexes[-1]) + 1
+    fill_mask = np.zeros(size, dtype=bool)
+    fill_mask[fill_indexes] = True
+    exit_mask = np.zeros(size, dtype=bool)
+    exit_mask[exit_indexes] = True
+    events = np.flatnonzero(fill_mask | exit_mask)
+    is_fill = fill_mask[events]
+    is_exit = exit_mask[events]
+    is_toggle = is_fill & is_exit
+    is_set = is_fill ^ is_exit
+    # 每个触发K线所在的置位分段，分段0为第一次置位之前（初始为空仓）
+    segment = np.cumsum(is_set)
+    segment_state = np.concatenate([[0], is_fill[is_set]]).astype(np.int64)
+    toggle_cumsum = np.cumsum(is_toggle)
+    segment_toggle = np.concatenate([[0], toggle_cumsum[is_set]])
+    state_after = segment_state[segment] ^ ((toggle_cumsum - segment_toggle[segment]) & 1)
+    state_before = np.concatenate([[0], state_after[:-1]])
+    return int(np.count_nonzero((state_before == 1) & is_exit))
+
+
+# 在开仓索引与平仓索引之间交替跳转，统计完成的次数
+def _count_suc(fill_indexes: np.ndarray, exit_indexes: np.ndarray) -> int:
+    '''
+    开仓在上一次平仓之后的K线（包含第0根），平仓在开仓之后的K线（不包含开仓K线）
+    跳转次数超过触发K线数量的1/64时，改为向量化的状态机
+    '''
+    fill_num = fill_indexes.shape[0]
+    exit_num = exit_indexes.shape[0]
+    max_hop = (fill_num + exit_num) // 64 + 16
+    suc_num = 0
+    fill_pos = 0
+    while fill_pos < fill_num:
+        if suc_num >= max_hop:
+            return _count_suc_by_events(fill_indexes, exit_indexes)
+        # 开仓之后的第一次平仓
+        exit_pos = exit_indexes.searchsorted(fill_indexes[fill_pos] + 1)
+        if exit_pos >= exit_num:
+            break
+        suc_num += 1
+        # 平仓之后的第一次开仓
+        fill_pos = fill_indexes.searchsorted(exit_indexes[exit_pos] + 1)
+    return suc_num
 
 
 # 按照开仓价格与平仓价格在历史数据中的成功次数
@@ -21,45 +103,88 @@ def history_suc(
     :param sellLine: 平仓价格
     :return: 历史成功次数
     '''
-    this_order_index = 0
-    suc_num = 0
-    if posSide.upper() == 'LONG':
-        while True:
-            for index in range(this_order_index, candle.shape[0]):
-                if candle[index, 3] <= buyLine:
-                    this_order_index = index
-                    break
-                this_order_index = index
-            for index in range(this_order_index + 1, candle.shape[0]):
-                if candle[index, 2] >= sellLine:
-                    this_order_index = index + 1
-                    suc_num += 1
-                    break
-                this_order_index = index
-            if this_order_index >= candle.shape[0] - 1:
-                break
-        return suc_num
-    elif posSide.upper() == 'SHORT':
-        while True:
-            for index in range(this_order_index, candle.shape[0]):
-                if candle[index, 2] >= buyLine:
-                    this_order_index = index
-                    break
-                this_order_index = index
-            for index in range(this_order_index + 1, candle.shape[0]):
-                if candle[index, 3] <= sellLine:
-                    this_order_index = index + 1
-                    suc_num += 1
-                    break
-                this_order_index = index
-            if this_order_index >= candle.shape[0] - 1:
-                break
-        return suc_num
-    else:
-        raise exception.PosSideException(
-            func='history_suc',
-            posSide=posSide,
+    fill_column, fill_le, exit_column, exit_le = _get_suc_columns(posSide, func='history_suc')
+    candle = np.asarray(candle)
+    return _count_suc(
+        fill_indexes=_get_event_indexes(candle[:, fill_column], buyLine, fill_le),
+        exit_indexes=_get_event_indexes(candle[:, exit_column], sellLine, exit_le),
+    )
+
+
+# 批量计算多组开仓价格与平仓价格在历史数据中的成功次数
+def history_suc_batch(
+        candle: np.array,
+        posSide: Literal['long', 'short', 'LONG', 'SHORT'],
+        buyLines: Union[list, np.ndarray],
+        sellLines: Union[list, np.ndarray],
+) -> np.ndarray:
+    '''
+    :param candle: 历史K线数据
+    :param posSide: 持仓方向
+        long: 多单
+        short: 空单
+    :param buyLines: 开仓价格序列
+    :param sellLines: 平仓价格序列，与buyLines一一对应
+    :return: 每组(buyLine,sellLine)的历史成功次数
+
+    相同的开仓价格或平仓价格只计算一次触发索引
+    '''
+    fill_column, fill_le, exit_column, exit_le = _get_suc_columns(posSide, func='history_suc_batch')
+    candle = np.asarray(candle)
+    buyLines = np.asarray(buyLines, dtype=np.float64).reshape(-1)
+    sellLines = np.asarray(sellLines, dtype=np.float64).reshape(-1)
+    if buyLines.shape != sellLines.shape:
+        raise exception.ParamException(
+            func='history_suc_batch',
+            msg='buyLines and sellLines must have the same length',
         )
+    fill_indexes_map = {
+        buyLine: _get_event_indexes(candle[:, fill_column], buyLine, fill_le)
+        for buyLine in np.unique(buyLines).tolist()
+    }
+    exit_indexes_map = {
+        sellLine: _get_event_indexes(candle[:, exit_column], sellLine, exit_le)
+        for sellLine in np.unique(sellLines).tolist()
+    }
+    suc_nums = np.zeros(buyLines.shape[0], dtype=np.int64)
+    for i, (buyLine, sellLine) in enumerate(zip(buyLines.tolist(), sellLines.tolist())):
+        suc_nums[i] = _count_suc(
+            fill_indexes=fill_indexes_map[buyLine],
+            exit_indexes=exit_indexes_map[sellLine],
+        )
+    return suc_nums
+
+
+# 滑动窗口均值，使用累加和计算，窗口内有nan时结果为nan
+def _rolling_mean_map(
+        values: np.ndarray,
+        ns: list,
+) -> dict:
+    '''
+    :param values: 二维数据
+    :param ns: 窗口长度列表
+    :return: {n: array}，前n-1行为nan
+    '''
+    values = np.asarray(values, dtype=np.float64)
+    rows = values.shape[0]
+    nan_mask = np.isnan(values)
+    has_nan = nan_mask.any()
+    # 首行补0的累加和，窗口[i-n+1,i]的和为cumsum[i+1]-cumsum[i-n+1]
+    cumsum = np.zeros((rows + 1,) + values.shape[1:], dtype=np.float64)
+    np.cumsum(np.where(nan_mask, 0, values) if has_nan else values, axis=0, out=cumsum[1:])
+    if has_nan:
+        nan_cumsum = np.zeros(cumsum.shape, dtype=np.int64)
+        np.cumsum(nan_mask, axis=0, out=nan_cumsum[1:])
+    result = {}
+    for n in ns:
+        n = int(n)
+        mean = np.full(values.shape, np.nan)
+        if 0 < n <= rows:
+            mean[n - 1:] = (cumsum[n:] - cumsum[:-n]) / n
+            if has_nan:
+                mean[n - 1:][(nan_cumsum[n:] - nan_cumsum[:-n]) > 0] = np.nan
+        result[n] = mean
+    return result
 
 
 # Candle MA 均线
@@ -77,28 +202,48 @@ def ma(
                 [ts.ma...],
             ])
     '''
-    # list
-    ma_datas = []
-    candle_shape = candle.shape
-    for index in range(candle_shape[0]):
-        if index < n - 1:
-            this_data = [candle[index, 0]] + [np.nan] * (candle_shape[1] - 1)
-        else:
-            this_data = [candle[index, 0]] + candle[index - n + 1:index + 1, 1:].mean(axis=0).tolist()
-        ma_datas.append(this_data)
-    # array
-    candle_ma = np.array(ma_datas)
-    return candle_ma
+    return ma_map(candle=candle, ns=[n])[int(n)]
+
+
+# Candle MA 均线，一次计算多个间隔
+def ma_map(
+        candle: np.array,
+        ns: list
+) -> dict:
+    '''
+    :param candle:历史K线数据
+    :param ns:间隔列表
+    :return:
+        {
+            n: array([
+                [ts,ma...],
+                [ts.ma...],
+                [ts.ma...],
+            ]),
+            ...
+        }
+    '''
+    candle = np.asarray(candle)
+    mean_map = _rolling_mean_map(values=candle[:, 1:], ns=ns)
+    candle_ma_map = {}
+    for n, mean in mean_map.items():
+        candle_ma = np.empty(candle.shape, dtype=np.float64)
+        candle_ma[:, 0] = candle[:, 0]
+        candle_ma[:, 1:] = mean
+        candle_ma_map[n] = candle_ma
+    return candle_ma_map
 
 
 # Candle BOLL 布林带
 def boll(
         candle: np.array,
-        n: int
+        n: int,
+        k: Union[int, float] = 2,
 ) -> np.ndarray:
     '''
     :param candle:历史K线数据
     :param n:间隔
+    :param k:标准差的倍数
     :return:
         array([
             [ts,mb,up,dn],
@@ -106,27 +251,84 @@ def boll(
             [ts,mb,up,dn],
         ])
         (mb:均线 up:上轨 dn:下轨)
+        第index行由index之前n根K线的收盘价计算（不包含当前K线）
     '''
-    # list
-    boll_datas = []
-    for index in range(candle.shape[0]):
-        if index <= n - 1:
-            mb = np.nan
-            up = np.nan
-            dn = np.nan
-        else:
-            mb = candle[index - n:index, 4].mean()  # 收盘价均值
-            sd = (candle[index - n:index, 4] - mb).std()  # 收盘价标准差
-            up = mb + 2 * sd  # 上轨
-            dn = mb - 2 * sd  # 下轨
-        boll_datas.append(
-            [candle[index, 0], mb, up, dn]
-        )
-    # array
-    candle_boll = np.array(boll_datas)
+    candle = np.asarray(candle)
+    close = np.asarray(candle[:, 4], dtype=np.float64)
+    rows = close.shape[0]
+    candle_boll = np.full((rows, 4), np.nan)
+    candle_boll[:, 0] = candle[:, 0]
+    if n <= 0 or rows <= n:
+        return candle_boll
+    # 第index行使用[index-n,index)，即第index-n个窗口
+    mb, sd = _rolling_mean_std(close[:rows - 1], n)  # 收盘价均值与标准差
+    candle_boll[n:, 1] = mb
+    candle_boll[n:, 2] = mb + k * sd  # 上轨
+    candle_boll[n:, 3] = mb - k * sd  # 下轨
     return candle_boll
 
 
+# 滑动窗口均值与标准差，result[j]由values[j:j+n]计算
+def _rolling_mean_std(
+        values: np.ndarray,
+        n: int,
+        chunk_size: int = 1 << 22,
+) -> tuple:
+    '''
+    :param values: 一维数据
+    :param n: 窗口长度
+    :param chunk_size: 每次计算的窗口元素数量上限，限制临时数组的内存
+    :return: (mean, std)，长度为len(values)-n+1，包含nan的窗口为nan
+
+    每个窗口单独求均值与离差，不使用累加和相减，长序列与大数值时不损失精度
+    '''
+    values = np.asarray(values, dtype=np.float64)
+    windows = np.lib.stride_tricks.sliding_window_view(values, n)
+    mean = np.empty(windows.shape[0], dtype=np.float64)
+    std = np.empty(windows.shape[0], dtype=np.float64)
+    step = max(1, chunk_size // n)
+    for start in range(0, windows.shape[0], step):
+        chunk = windows[start:start + step]
+        chunk_mean = chunk.mean(axis=1)
+        mean[start:start + step] = chunk_mean
+        deviation = chunk - chunk_mean[:, None]
+        std[start:start + step] = np.sqrt(np.einsum('ij,ij->i', deviation, deviation) / n)
+    return mean, std
+
+
+# 滑动窗口最大值（van Herk/Gil-Werman算法），result[j] = max(values[j:j+n])
+def _rolling_max(
+        values: np.ndarray,
+        n: int,
+) -> np.ndarray:
+    '''
+    :param values: 一维数据
+    :param n: 窗口长度
+    :return: 长度为len(values)-n+1的数组
+    '''
+    values = np.asarray(values, dtype=np.float64)
+    rows = values.shape[0]
+    if n <= 0 or rows < n:
+        return np.empty(0, dtype=np.float64)
+    # 按照n分块，块内分别求前缀最大值与后缀最大值
+    block_num = -(-rows // n)
+    padded = np.full(block_num * n, -np.inf)
+    padded[:rows] = values
+    blocks = padded.reshape(block_num, n)
+    prefix = np.maximum.accumulate(blocks, axis=1).reshape(-1)
+    suffix = np.maximum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].reshape(-1)
+    # 窗口[j,j+n-1]最多跨越两个块
+    return np.maximum(suffix[0:rows - n + 1], prefix[n - 1:rows])
+
+
+# 滑动窗口最小值，result[j] = min(values[j:j+n])
+def _rolling_min(
+        values: np.ndarray,
+        n: int,
+) -> np.ndarray:
+    return -_rolling_max(-np.asarray(values, dtype=np.float64), n)
+
+
 # 得到DualThrust中的上轨和下轨
 def dualThrust(
         candle: np.array,
@@ -140,7 +342,7 @@ def dualThrust(
     :param n:间隔
     :param ks:ks参数
     :param kx:kx参数
-    :param update_n:更新的间隔n
+    :param update_n:更新的间隔n，None表示每根K线都更新
     :return:
         array([
             [ts,range_ks,range_kx],
@@ -149,26 +351,29 @@ def dualThrust(
         ])
         (range_ks上轨 range_kx下轨)
     '''
-    # list
-    dualThrust_datas = []
-    for i in range(0, candle.shape[0], update_n):
-        if i <= n - 1:
-            range_kx = np.nan
-            range_ks = np.nan
-        else:
-            last_k_array = candle[i - n:i]  # 前n间隔的数据
-            hh = last_k_array[:, 2].max()  # 最高价的最高价
-            hc = last_k_array[:, 4].max()  # 最高价的收盘价
-            lc = last_k_array[:, 4].min()  # 最低价的收盘价
-            ll = last_k_array[:, 3].min()  # 最低价的最低价
-            range_ = max(hh - lc, hc - ll)
-            o = candle[i, 1]
-            range_ks = o + ks * range_  # 上轨
-            range_kx = o - kx * range_  # 下轨
-        for ts in candle[i:i + update_n, 0]:
-            dualThrust_datas.append(
-                [ts, range_ks, range_kx]
-            )
-    # array
-    candle_dualThrust = np.array(dualThrust_datas)
+    if update_n == None:
+        update_n = 1
+    candle = np.asarray(candle)
+    rows = candle.shape[0]
+    candle_dualThrust = np.full((rows, 3), np.nan)
+    candle_dualThrust[:, 0] = candle[:, 0]
+    # 更新的位置，每个位置使用前n根K线[i-n,i)计算
+    update_indexes = np.arange(0, rows, update_n)
+    valid_indexes = update_indexes[update_indexes > n - 1]
+    if not valid_indexes.shape[0]:
+        return candle_dualThrust
+    window_indexes = valid_indexes - n
+    hh = _rolling_max(candle[:, 2], n)[window_indexes]  # 最高价的最高价
+    hc = _rolling_max(candle[:, 4], n)[window_indexes]  # 最高价的收盘价
+    lc = _rolling_min(candle[:, 4], n)[window_indexes]  # 最低价的收盘价
+    ll = _rolling_min(candle[:, 3], n)[window_indexes]  # 最低价的最低价
+    range_ = np.maximum(hh - lc, hc - ll)
+    o = candle[valid_indexes, 1].astype(np.float64)
+    range_ks = o + ks * range_  # 上轨
+    range_kx = o - kx * range_  # 下轨
+    # 每个更新位置的数值保持到下一个更新位置
+    repeats = np.diff(np.append(valid_indexes, rows))
+    start = valid_indexes[0]
+    candle_dualThrust[start:, 1] = np.repeat(range_ks, repeats)
+    candle_dualThrust[start:, 2] = np.repeat(range_kx, repeats)
     return candle_dualThrust
@@ -6,7 +6,7 @@ to_candle                   转换为ndarray类型的K数据
 get_candle_index_by_date    根据日期时间，得到K线中的行索引
 '''
 
-from typing import Union
+from typing import Union, Literal
 import datetime
 import numpy as np
 import pandas as pd
@@ -18,29 +18,52 @@ from candlelite.calculate import interval as _interval
 __all__ = ['compress_candle', 'extract_candle', 'to_candle', 'concat_candle', 'get_candle_index_by_date']
 
 
+# 已排序时间戳对应时区的UTC偏移（毫秒），timezone为None时偏移为0
+def _get_utc_offset(ts: np.ndarray, timezone: Union[str, None] = None) -> Union[np.ndarray, int]:
+    if not timezone or not ts.shape[0]:
+        return 0
+    # 时区偏移的切换发生在15分钟的整数倍上，每15分钟只需要计算一次
+    quarter = np.floor(ts / 900000)
+    starts = np.flatnonzero(np.concatenate([[True], quarter[1:] != quarter[:-1]]))
+    counts = np.diff(np.append(starts, ts.shape[0]))
+    utc_index = pd.to_datetime((quarter[starts] * 900000).astype(np.int64), unit='ms', utc=True)
+    local_index = utc_index.tz_convert(timezone)
+    # 本地时间与UTC时间的差值（毫秒）
+    offset = (local_index.tz_localize(None) - utc_index.tz_localize(None)) / pd.Timedelta(milliseconds=1)
+    return np.repeat(np.asarray(offset, dtype=np.float64), counts)
+
+
 # 压缩历史K线
 def compress_candle(
         candle: np.array,
         target_bar: str,
-        org_bar: str = 'auto'
+        org_bar: str = 'auto',
+        timezone: str = None,
+        partial: Literal['drop', 'keep', 'raise'] = 'drop',
 ) -> np.ndarray:
     '''
     :param candle: 历史K线数据
     :param target_bar: 目标K线的bar
     :param org_bar: 原始K线的bar
        auto: 自动识别原始K线的bar
+    :param timezone: 时区，按照该时区的时钟对齐目标K线（例如1d从当地0点开始），None按照UTC对齐
+    :param partial: 不完整（数据不足或者有缺失）的目标K线的处理方式
+        drop:   丢弃
+        keep:   保留
+        raise:  抛出异常
     :return:压缩后的历史K线数据
         array([
             [ts,open,high,low,close,volume...],
             [ts,open,high,low,close,volume...],
             [ts,open,high,low,close,volume...],
         ])
+        ts为目标K线的起始时间，volume及之后的列为求和
     example：
         将1Minute的K线数据压缩成5Minute的K线数据
         compress_candle(candle,target_bar='5m',org_bar='1m')
 
         将1Hour的K线数据压缩成1Day的K线数据
-        compress_candle(candle,target_bar='1d',org_bar='1h'
+        compress_candle(candle,target_bar='1d',org_bar='1h',timezone='Asia/Shanghai')
     '''
     if org_bar == 'auto':
         org_bar = _bar.predict_bar(candle)
@@ -59,27 +82,47 @@ def compress_candle(
             )
         )
     compress_quantity = int(compress_quantity)
-    # 目标K线数据
-    target_datas = []
-    candle_shape = candle.shape
-    for i in range(0, candle.shape[0], compress_quantity):
-        if i + compress_quantity <= candle_shape[0]:
-            this_data = [
-                candle[i, 0],  # ts
-                candle[i, 1],  # open
-                candle[i:i + compress_quantity, 2].max(),  # high
-                candle[i:i + compress_quantity, 3].min(),  # low
-                candle[i + compress_quantity - 1, 4],  # close
-                candle[i:i + compress_quantity, 5].sum()  # volume
-            ]
-            # 如果有其他数据
-            for i in range(6, candle_shape[1]):
-                this_data.append(
-                    candle[i:i + compress_quantity, i].sum()
+    if partial not in ['drop', 'keep', 'raise']:
+        raise exception.ParamException(
+            func='compress_candle',
+            msg="partial={partial}, partial must in ['drop','keep','raise']".format(partial=partial)
+        )
+    candle = np.asarray(candle, dtype=np.float64)
+    if not candle.shape[0]:
+        return candle.reshape(0, candle.shape[1] if candle.ndim == 2 else 6)
+    # 需要按照时间排序且没有重复
+    if not (np.diff(candle[:, 0]) > 0).all():
+        candle = to_candle(candle, drop_duplicate=True, sort=True)
+    ts = candle[:, 0]
+    offset = _get_utc_offset(ts, timezone)
+    # 目标K线的编号
+    bucket = np.floor((ts + offset) / target_bar_interval)
+    # 每个目标K线在原始K线中的起始索引与终止索引（不包含）
+    starts = np.flatnonzero(np.concatenate([[True], bucket[1:] != bucket[:-1]]))
+    ends = np.append(starts[1:], ts.shape[0])
+    counts = ends - starts
+    target_candle = np.empty((starts.shape[0], candle.shape[1]), dtype=np.float64)
+    target_candle[:, 0] = bucket[starts] * target_bar_interval - (offset[starts] if timezone else 0)  # ts
+    target_candle[:, 1] = candle[starts, 1]  # open
+    target_candle[:, 2] = np.maximum.reduceat(candle[:, 2], starts)  # high
+    target_candle[:, 3] = np.minimum.reduceat(candle[:, 3], starts)  # low
+    target_candle[:, 4] = candle[ends - 1, 4]  # close
+    # volume以及其他数据
+    if candle.shape[1] > 5:
+        target_candle[:, 5:] = np.add.reduceat(candle[:, 5:], starts, axis=0)
+    # 不完整的目标K线
+    partial_mask = counts != compress_quantity
+    if partial_mask.any():
+        if partial == 'drop':
+            target_candle = target_candle[~partial_mask]
+        elif partial == 'raise':
+            raise exception.ExecuteException(
+                func='compress_candle',
+                msg='{num} partial candles, ts={ts}'.format(
+                    num=int(partial_mask.sum()),
+                    ts=str(target_candle[partial_mask, 0][0:10].tolist()),
                 )
-            target_datas.append(this_data)
-    # 目标K线Candle
-    target_candle = np.array(target_datas)
+            )
     return target_candle
 
 
@@ -101,6 +144,38 @@ def extract_candle(
     return candle[(candle[:, 0] >= start_ts) & (candle[:, 0] <= end_ts)]
 
 
+# 是否可以不经过DataFrame处理（二维数值数组，时间戳没有nan）
+def _is_numeric_candle(candle) -> bool:
+    return (
+            isinstance(candle, np.ndarray)
+            and candle.ndim == 2
+            and candle.dtype.kind in 'iuf'
+            and not np.isnan(candle[:, 0]).any()
+    )
+
+
+# ndarray去重排序，结果与DataFrame处理相同，已经排序且没有重复的float64数组不复制
+def _to_candle_array(candle: np.ndarray, drop_duplicate: bool, sort: bool) -> np.ndarray:
+    candle = np.asarray(candle, dtype=np.float64)
+    ts = candle[:, 0]
+    diffs = np.diff(ts)
+    # 已经严格递增
+    if (diffs > 0).all():
+        return candle
+    # 已经排序，不需要去重
+    if not drop_duplicate and (diffs >= 0).all():
+        return candle
+    if drop_duplicate:
+        # 相同时间戳保留第一次出现的行
+        _, indexes = np.unique(ts, return_index=True)
+        if not sort:
+            indexes.sort()
+        return candle[indexes]
+    if sort:
+        return candle[np.argsort(ts, kind='stable')]
+    return candle
+
+
 # 转换为candle数据
 def to_candle(
         candle: Union[list, tuple, np.ndarray, pd.DataFrame],
@@ -111,7 +186,11 @@ def to_candle(
     :param candle: 历史K线数据，支持列表、元组、array、DataFrame
     :param drop_duplicate: 去重
     :param sort: 排序
+
+    数值类型的二维array不经过DataFrame，已经排序且没有重复的float64 array直接返回原对象
     '''
+    if _is_numeric_candle(candle):
+        return _to_candle_array(candle, drop_duplicate=drop_duplicate, sort=sort)
     # list和tuple
     if isinstance(candle, list) or isinstance(candle, tuple):
         df = pd.DataFrame(candle)
@@ -154,7 +233,28 @@ def concat_candle(
     :param candles: 多个历史K线数据
     :param drop_duplicate: 去重
     :param sort: 排序
+
+    全部为列数相同的数值类型array时不经过DataFrame:
+        每个candle各自排序并且首尾相接时只用np.concatenate复制一次（单个candle不复制）
+        否则合并后用稳定排序归并各个有序的部分
     '''
+    if candles and all(_is_numeric_candle(candle) for candle in candles) \
+            and len(set(candle.shape[1] for candle in candles)) == 1:
+        candles = [np.asarray(candle, dtype=np.float64) for candle in candles if candle.shape[0]] \
+                  or [np.asarray(candles[0], dtype=np.float64)]
+        if len(candles) == 1:
+            return _to_candle_array(candles[0], drop_duplicate=drop_duplicate, sort=sort)
+        # 各部分严格递增并且首尾相接
+        if all((np.diff(candle[:, 0]) > 0).all() for candle in candles) \
+                and all(candles[i][-1, 0] < candles[i + 1][0, 0] for i in range(len(candles) - 1)):
+            return np.concatenate(candles)
+        candle = np.concatenate(candles)
+        if drop_duplicate or sort:
+            # 合并后是若干段有序序列，稳定排序（timsort/radix）接近线性
+            candle = candle[np.argsort(candle[:, 0], kind='stable')] if sort else candle
+            return _to_candle_array(candle, drop_duplicate=drop_duplicate, sort=sort)
+        return candle
+    candles = list(candles)
     for i in range(len(candles)):
         # list和tuple
         if isinstance(candles[i], list) or isinstance(candles[i], tuple):
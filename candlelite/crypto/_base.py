@@ -1,4 +1,4 @@
-from candlelite.io import load, path, save
+from candlelite.io import load, path, save, convert, manifest, cache, view, compact, trace, codec
 from typing import Union, Literal
 import datetime
 import numpy as np
@@ -10,6 +10,46 @@ class IO():
     CANDLE_FILE_BASE_DIR: str
     TIMEZONE: str
     BAR: str
+    FORMAT: str = 'csv'
+
+    def __init__(self, cache_bytes: int = 0, codec_options: dict = None):
+        '''
+        :param cache_bytes: 单日数据缓存的最大字节数，0表示不使用缓存
+            开启后重复读取相同日期的数据不再解析文件，保存数据时会删除被覆盖文件的缓存
+        :param codec_options: 这个实例写入npc文件的设置 {'codec': auto|zstd|gzip|none, 'level': 压缩等级, 'float32': bool}
+            None表示默认设置，只影响新写入的文件，追加与合并已有文件时沿用原文件的设置
+        '''
+        self.cache = cache.CandleCache(max_bytes=cache_bytes) if cache_bytes > 0 else None
+        self.codec_options = codec.check_options(codec_options, func='IO') if codec_options != None else None
+
+    # 单日数据缓存的命中统计，没有开启缓存返回None
+    def get_cache_stats(self):
+        if self.cache == None:
+            return None
+        return self.cache.stats()
+
+    # 清空单日数据缓存
+    def clear_cache(self):
+        if self.cache != None:
+            self.cache.clear()
+
+    # 记录读写流程各阶段的耗时、文件数量、字节数与行数
+    def tracing(self, tracer: trace.Tracer = None, callback=None):
+        '''
+        :param tracer: 记录事件的Tracer，None表示新建
+        :param callback: 新建Tracer时，每记录一个事件调用一次 callback(event)
+        :return: 上下文管理器，with语句中得到Tracer
+
+            with io.tracing() as tracer:
+                io.load_candle_map_by_date(...)
+            print(tracer.format_summary())
+            tracer.dump_chrome_trace('trace.json')
+
+        追踪期间当前进程中的全部读写都会被记录，多进程读写时合并子进程的记录
+        '''
+        if tracer == None:
+            tracer = trace.Tracer(callback=callback)
+        return trace.tracing(tracer)
 
     # 获取candle具备数据的日期序列
     def get_candle_dates(
@@ -19,6 +59,7 @@ class IO():
             base_dir: str = None,
             timezone: str = None,
             bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = None,
+            format: str = None,
     ):
         if base_dir == None:
             base_dir = self.CANDLE_DATE_BASE_DIR
@@ -26,6 +67,8 @@ class IO():
             timezone = self.TIMEZONE
         if bar == None:
             bar = self.BAR
+        if format == None:
+            format = self.FORMAT
         return path.get_candle_dates(**to_local(locals()))
 
     # 获取全部的产品名称
@@ -35,6 +78,7 @@ class IO():
             base_dir: str = None,
             timezone: str = None,
             bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = None,
+            format: str = None,
     ):
         if base_dir == None:
             base_dir = self.CANDLE_DATE_BASE_DIR
@@ -42,8 +86,33 @@ class IO():
             timezone = self.TIMEZONE
         if bar == None:
             bar = self.BAR
+        if format == None:
+            format = self.FORMAT
         return path.get_symbols_all(**to_local(locals()))
 
+    # 获取start~end日期中每一天都有数据的产品名称
+    def get_symbols_by_date(
+            self,
+            instType: str,
+            start: Union[int, float, str, datetime.date],
+            end: Union[int, float, str, datetime.date],
+            base_dir: str = None,
+            timezone: str = None,
+            bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = None,
+            format: str = None,
+            endswith: str = '',
+            contains: str = '',
+    ):
+        if base_dir == None:
+            base_dir = self.CANDLE_DATE_BASE_DIR
+        if timezone == None:
+            timezone = self.TIMEZONE
+        if bar == None:
+            bar = self.BAR
+        if format == None:
+            format = self.FORMAT
+        return path.get_symbols_by_date(**to_local(locals()))
+
     # 加载一个产品已有的全部K线
     def load_candle_all(
             self,
@@ -55,6 +124,8 @@ class IO():
             columns: list = [],
             timezone: str = None,
             bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = '1m',
+            format: str = None,
+            mmap: bool = False,
     ):
         if base_dir == None:
             base_dir = self.CANDLE_DATE_BASE_DIR
@@ -62,7 +133,32 @@ class IO():
             timezone = self.TIMEZONE
         if bar == None:
             bar = self.BAR
-        return load.load_candle_all(**to_local(locals()))
+        if format == None:
+            format = self.FORMAT
+        return load.load_candle_all(cache=self.cache, **to_local(locals()))
+
+    # 单个产品的延迟加载视图，只读取访问到的日期
+    def get_candle_view(
+            self,
+            instType: str,
+            symbol: str,
+            base_dir: str = None,
+            timezone: str = None,
+            bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = None,
+            format: str = None,
+            mmap: bool = False,
+            valid_interval: bool = True,
+            max_days: int = 366,
+    ) -> view.CandleView:
+        if base_dir == None:
+            base_dir = self.CANDLE_DATE_BASE_DIR
+        if timezone == None:
+            timezone = self.TIMEZONE
+        if bar == None:
+            bar = self.BAR
+        if format == None:
+            format = self.FORMAT
+        return view.CandleView(cache=self.cache, **to_local(locals()))
 
     # 加载全部产品已有的K线
     def load_candle_map_all(
@@ -76,8 +172,12 @@ class IO():
             end: Union[int, float, str, datetime.date] = None,
             timezone: str = None,
             p_num: int = 1,
+            p_mode: Literal['process', 'thread'] = 'process',
+            shared_memory: bool = False,
             columns: list = [],
             bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = '1m',
+            format: str = None,
+            mmap: bool = False,
     ):
         if base_dir == None:
             base_dir = self.CANDLE_DATE_BASE_DIR
@@ -85,7 +185,9 @@ class IO():
             timezone = self.TIMEZONE
         if bar == None:
             bar = self.BAR
-        return load.load_candle_map_all(**to_local(locals()))
+        if format == None:
+            format = self.FORMAT
+        return load.load_candle_map_all(cache=self.cache, **to_local(locals()))
 
     # 读取从start~end日期的历史K线数据
     def load_candle_by_date(
@@ -101,6 +203,8 @@ class IO():
             valid_interval: bool = True,
             valid_start: bool = True,
             valid_end: bool = True,
+            format: str = None,
+            mmap: bool = False,
     ) -> np.ndarray:
         if base_dir == None:
             base_dir = self.CANDLE_DATE_BASE_DIR
@@ -108,7 +212,9 @@ class IO():
             timezone = self.TIMEZONE
         if bar == None:
             bar = self.BAR
-        return load.load_candle_by_date(**to_local(locals()))
+        if format == None:
+            format = self.FORMAT
+        return load.load_candle_by_date(cache=self.cache, **to_local(locals()))
 
     # 按照日期读取candle_map
     def load_candle_map_by_date(
@@ -124,9 +230,13 @@ class IO():
             endswith: str = '',
             contains: str = '',
             p_num: int = 1,
+            p_mode: Literal['process', 'thread'] = 'process',
+            shared_memory: bool = False,
             valid_interval: bool = True,
             valid_start: bool = True,
             valid_end: bool = True,
+            format: str = None,
+            mmap: bool = False,
     ) -> dict:
         if base_dir == None:
             base_dir = self.CANDLE_DATE_BASE_DIR
@@ -134,7 +244,67 @@ class IO():
             timezone = self.TIMEZONE
         if bar == None:
             bar = self.BAR
-        return load.load_candle_map_by_date(**to_local(locals()))
+        if format == None:
+            format = self.FORMAT
+        return load.load_candle_map_by_date(cache=self.cache, **to_local(locals()))
+
+    # 按照日期分块迭代读取start~end日期的历史K线数据
+    def iter_candle_by_date(
+            self,
+            instType: str,
+            symbol: str,
+            start: Union[int, float, str, datetime.date],
+            end: Union[int, float, str, datetime.date],
+            base_dir: str = None,
+            timezone: str = None,
+            bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = None,
+            columns: list = [],
+            chunk_days: int = 1,
+            valid_interval: bool = True,
+            valid_start: bool = True,
+            valid_end: bool = True,
+            format: str = None,
+            mmap: bool = False,
+    ):
+        if base_dir == None:
+            base_dir = self.CANDLE_DATE_BASE_DIR
+        if timezone == None:
+            timezone = self.TIMEZONE
+        if bar == None:
+            bar = self.BAR
+        if format == None:
+            format = self.FORMAT
+        return load.iter_candle_by_date(cache=self.cache, **to_local(locals()))
+
+    # 按照日期分块迭代读取多个产品
+    def iter_candle_map_by_date(
+            self,
+            instType: str,
+            symbols: list,
+            start: Union[int, float, str, datetime.date],
+            end: Union[int, float, str, datetime.date],
+            base_dir: str = None,
+            timezone: str = None,
+            bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = None,
+            columns: list = [],
+            endswith: str = '',
+            contains: str = '',
+            chunk_days: int = 1,
+            valid_interval: bool = True,
+            valid_start: bool = True,
+            valid_end: bool = True,
+            format: str = None,
+            mmap: bool = False,
+    ):
+        if base_dir == None:
+            base_dir = self.CANDLE_DATE_BASE_DIR
+        if timezone == None:
+            timezone = self.TIMEZONE
+        if bar == None:
+            bar = self.BAR
+        if format == None:
+            format = self.FORMAT
+        return load.iter_candle_map_by_date(cache=self.cache, **to_local(locals()))
 
     # 通过文件地址读取Candle
     def load_candle_by_file(
@@ -147,6 +317,8 @@ class IO():
             timezone: str = None,
             bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = '1m',
             valid_interval: bool = True,
+            format: str = None,
+            mmap: bool = False,
     ):
         if base_dir == None:
             base_dir = self.CANDLE_FILE_BASE_DIR
@@ -154,7 +326,9 @@ class IO():
             timezone = self.TIMEZONE
         if bar == None:
             bar = self.BAR
-        return load.load_candle_by_file(**to_local(locals()))
+        if format == None:
+            format = self.FORMAT
+        return load.load_candle_by_file(cache=self.cache, **to_local(locals()))
 
     # 通过文件夹地址读取Candle_map
     def load_candle_map_by_file(
@@ -167,6 +341,8 @@ class IO():
             timezone: str = None,
             bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = '1m',
             valid_interval: bool = True,
+            format: str = None,
+            mmap: bool = False,
     ):
         if base_dir == None:
             base_dir = self.CANDLE_FILE_BASE_DIR
@@ -174,7 +350,9 @@ class IO():
             timezone = self.TIMEZONE
         if bar == None:
             bar = self.BAR
-        return load.load_candle_map_by_file(**to_local(locals()))
+        if format == None:
+            format = self.FORMAT
+        return load.load_candle_map_by_file(cache=self.cache, **to_local(locals()))
 
     # 按照日期保存Candle
     def save_candle_by_date(
@@ -193,6 +371,7 @@ class IO():
             valid_interval: bool = True,
             valid_start: bool = True,
             valid_end: bool = True,
+            format: str = None,
     ):
         if base_dir == None:
             base_dir = self.CANDLE_DATE_BASE_DIR
@@ -200,7 +379,34 @@ class IO():
             timezone = self.TIMEZONE
         if bar == None:
             bar = self.BAR
-        return save.save_candle_by_date(**to_local(locals()))
+        if format == None:
+            format = self.FORMAT
+        return save.save_candle_by_date(cache=self.cache, codec_options=self.codec_options, **to_local(locals()))
+
+    # 按照日期追加写入Candle（实时采集当天的数据）
+    def append_candle_by_date(
+            self,
+            candle: np.array,
+            instType: str,
+            symbol: str,
+            base_dir: str = None,
+            timezone: str = None,
+            bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = None,
+            valid_interval: bool = True,
+            valid_start: bool = True,
+            seal: bool = True,
+            fsync: bool = False,
+            format: str = None,
+    ):
+        if base_dir == None:
+            base_dir = self.CANDLE_DATE_BASE_DIR
+        if timezone == None:
+            timezone = self.TIMEZONE
+        if bar == None:
+            bar = self.BAR
+        if format == None:
+            format = self.FORMAT
+        return save.append_candle_by_date(cache=self.cache, codec_options=self.codec_options, **to_local(locals()))
 
     # 按照日期保存candle_map
     def save_candle_map_by_date(
@@ -219,6 +425,10 @@ class IO():
             valid_interval: bool = True,
             valid_start: bool = True,
             valid_end: bool = True,
+            format: str = None,
+            p_num: int = 1,
+            p_mode: Literal['process', 'thread'] = 'process',
+            skip_exception: bool = False,
     ):
         if base_dir == None:
             base_dir = self.CANDLE_DATE_BASE_DIR
@@ -226,7 +436,9 @@ class IO():
             timezone = self.TIMEZONE
         if bar == None:
             bar = self.BAR
-        return save.save_candle_map_by_date(**to_local(locals()))
+        if format == None:
+            format = self.FORMAT
+        return save.save_candle_map_by_date(cache=self.cache, codec_options=self.codec_options, **to_local(locals()))
 
     # 按照文件地址保存Candle
     def save_candle_by_file(
@@ -242,6 +454,7 @@ class IO():
             sort=True,
             drop_duplicate=True,
             valid_interval=True,
+            format: str = None,
     ):
         if base_dir == None:
             base_dir = self.CANDLE_FILE_BASE_DIR
@@ -249,7 +462,9 @@ class IO():
             timezone = self.TIMEZONE
         if bar == None:
             bar = self.BAR
-        return save.save_candle_by_file(**to_local(locals()))
+        if format == None:
+            format = self.FORMAT
+        return save.save_candle_by_file(cache=self.cache, codec_options=self.codec_options, **to_local(locals()))
 
     # 按照文件地址保存Candle_map
     def save_candle_map_by_file(
@@ -264,6 +479,10 @@ class IO():
             sort: bool = True,
             drop_duplicate: bool = True,
             valid_interval: bool = True,
+            format: str = None,
+            p_num: int = 1,
+            p_mode: Literal['process', 'thread'] = 'process',
+            skip_exception: bool = False,
     ):
         if base_dir == None:
             base_dir = self.CANDLE_FILE_BASE_DIR
@@ -271,7 +490,9 @@ class IO():
             timezone = self.TIMEZONE
         if bar == None:
             bar = self.BAR
-        return save.save_candle_map_by_file(**to_local(locals()))
+        if format == None:
+            format = self.FORMAT
+        return save.save_candle_map_by_file(cache=self.cache, codec_options=self.codec_options, **to_local(locals()))
 
     # 获取某一个天candle的路径
     def get_candle_date_path(
@@ -282,6 +503,7 @@ class IO():
             base_dir: str = None,
             timezone: str = None,
             bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = None,
+            format: str = None,
     ):
         if base_dir == None:
             base_dir = self.CANDLE_DATE_BASE_DIR
@@ -289,6 +511,8 @@ class IO():
             timezone = self.TIMEZONE
         if bar == None:
             bar = self.BAR
+        if format == None:
+            format = self.FORMAT
         return path.get_candle_date_path(**to_local(locals()))
 
     # 获取candle文件的地址（一般不以天切割，必须缓存数据与1d数据可以储存在一个文件中）
@@ -299,6 +523,7 @@ class IO():
             base_dir: str = None,
             timezone: str = None,
             bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = None,
+            format: str = None,
     ):
         if base_dir == None:
             base_dir = self.CANDLE_FILE_BASE_DIR
@@ -306,6 +531,8 @@ class IO():
             timezone = self.TIMEZONE
         if bar == None:
             bar = self.BAR
+        if format == None:
+            format = self.FORMAT
         return path.get_candle_file_path(**to_local(locals()))
 
     # 检查candle从start到end日期数据文件是否齐全（仅检查文件是否存在，并不验证文件的准确性）
@@ -318,6 +545,7 @@ class IO():
             base_dir: str = None,
             timezone: str = None,
             bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = None,
+            format: str = None,
     ):
         if base_dir == None:
             base_dir = self.CANDLE_DATE_BASE_DIR
@@ -325,6 +553,8 @@ class IO():
             timezone = self.TIMEZONE
         if bar == None:
             bar = self.BAR
+        if format == None:
+            format = self.FORMAT
         return path.check_candle_date_path(**to_local(locals()))
 
     # 检查candle文件是否存在（不验证数据的准确性）
@@ -335,6 +565,7 @@ class IO():
             base_dir: str = None,
             timezone: str = None,
             bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = None,
+            format: str = None,
     ):
         if base_dir == None:
             base_dir = self.CANDLE_FILE_BASE_DIR
@@ -342,4 +573,126 @@ class IO():
             timezone = self.TIMEZONE
         if bar == None:
             bar = self.BAR
+        if format == None:
+            format = self.FORMAT
         return path.check_candle_file_path(**to_local(locals()))
+
+    # 转换以日期为单位存储的数据格式
+    def convert_candle_by_date(
+            self,
+            instType: str,
+            base_dir: str = None,
+            symbols: list = [],
+            timezone: str = None,
+            bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = None,
+            from_format: str = 'csv',
+            to_format: str = 'npy',
+            replace: bool = False,
+            remove: bool = False,
+    ):
+        if base_dir == None:
+            base_dir = self.CANDLE_DATE_BASE_DIR
+        if timezone == None:
+            timezone = self.TIMEZONE
+        if bar == None:
+            bar = self.BAR
+        return convert.convert_candle_by_date(codec_options=self.codec_options, **to_local(locals()))
+
+    # 转换以文件为单位存储的数据格式
+    def convert_candle_by_file(
+            self,
+            instType: str,
+            base_dir: str = None,
+            symbols: list = [],
+            timezone: str = None,
+            bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = None,
+            from_format: str = 'csv',
+            to_format: str = 'npy',
+            replace: bool = False,
+            remove: bool = False,
+    ):
+        if base_dir == None:
+            base_dir = self.CANDLE_FILE_BASE_DIR
+        if timezone == None:
+            timezone = self.TIMEZONE
+        if bar == None:
+            bar = self.BAR
+        return convert.convert_candle_by_file(codec_options=self.codec_options, **to_local(locals()))
+
+    # 将以日期为单位存储的单日文件合并为按月或按年的分段文件
+    def compact_candle_by_date(
+            self,
+            instType: str,
+            base_dir: str = None,
+            symbols: list = [],
+            timezone: str = None,
+            bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = None,
+            format: str = None,
+            period: Literal['month', 'year'] = 'month',
+            end: Union[int, float, str, datetime.date] = None,
+            remove: bool = True,
+    ):
+        if base_dir == None:
+            base_dir = self.CANDLE_DATE_BASE_DIR
+        if timezone == None:
+            timezone = self.TIMEZONE
+        if bar == None:
+            bar = self.BAR
+        if format == None:
+            format = self.FORMAT
+        return compact.compact_candle_by_date(**to_local(locals()))
+
+    # 扫描数据文件夹，重建数据集清单
+    def build_manifest(
+            self,
+            instType: str,
+            base_dir: str = None,
+            timezone: str = None,
+            bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = None,
+            format: str = None,
+    ):
+        if base_dir == None:
+            base_dir = self.CANDLE_DATE_BASE_DIR
+        if timezone == None:
+            timezone = self.TIMEZONE
+        if bar == None:
+            bar = self.BAR
+        if format == None:
+            format = self.FORMAT
+        return manifest.build_manifest(**to_local(locals()))
+
+    # 检查单日文件与数据集清单记录是否一致
+    def check_manifest(
+            self,
+            instType: str,
+            base_dir: str = None,
+            timezone: str = None,
+            bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = None,
+            format: str = None,
+            symbols: list = [],
+    ):
+        if base_dir == None:
+            base_dir = self.CANDLE_DATE_BASE_DIR
+        if timezone == None:
+            timezone = self.TIMEZONE
+        if bar == None:
+            bar = self.BAR
+        if format == None:
+            format = self.FORMAT
+        return manifest.check_manifest(**to_local(locals()))
+
+    # 压缩数据集清单，每个(format, symbol, date)只保留最后一条记录
+    def compact_manifest(
+            self,
+            instType: str,
+            base_dir: str = None,
+            timezone: str = None,
+            bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = None,
+    ):
+        if base_dir == None:
+            base_dir = self.CANDLE_DATE_BASE_DIR
+        if timezone == None:
+            timezone = self.TIMEZONE
+        if bar == None:
+            bar = self.BAR
+        return manifest.compact_manifest(**to_local(locals()))
@@ -14,9 +14,12 @@ BINANCE_CANDLE_FILE_BASE_DIR = os.path.join(CANDLE_BASE_DIR, __BINANCE_FILE_DIRN
 BINANCE_TIMEZONE = settings['BINANCE_TIMEZONE'][0]
 # 默认时间粒度
 BINANCE_DEFAULT_BAR = settings['BINANCE_DEFAULT_BAR'][0]
+# 默认存储格式（兼容没有该配置项的旧配置文件）
+BINANCE_DEFAULT_FORMAT = settings.get('BINANCE_DEFAULT_FORMAT', ['csv'])[0]
 
 class BinanceLite(IO):
     CANDLE_DATE_BASE_DIR = BINANCE_CANDLE_DATE_BASE_DIR
     CANDLE_FILE_BASE_DIR = BINANCE_CANDLE_FILE_BASE_DIR
     TIMEZONE = BINANCE_TIMEZONE
     BAR = BINANCE_DEFAULT_BAR
+    FORMAT = BINANCE_DEFAULT_FORMAT
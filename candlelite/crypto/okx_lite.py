@@ -14,6 +14,8 @@ OKX_CANDLE_FILE_BASE_DIR = os.path.join(CANDLE_BASE_DIR, __OKX_FILE_DIRNAME)
 OKX_TIMEZONE = settings['OKX_TIMEZONE'][0]
 # 默认时间粒度
 OKX_DEFAULT_BAR = settings['OKX_DEFAULT_BAR'][0]
+# 默认存储格式（兼容没有该配置项的旧配置文件）
+OKX_DEFAULT_FORMAT = settings.get('OKX_DEFAULT_FORMAT', ['csv'])[0]
 
 
 class OkxLite(IO):
@@ -21,3 +23,4 @@ class OkxLite(IO):
     CANDLE_FILE_BASE_DIR = OKX_CANDLE_FILE_BASE_DIR
     TIMEZONE = OKX_TIMEZONE
     BAR = OKX_DEFAULT_BAR
+    FORMAT = OKX_DEFAULT_FORMAT
@@ -1,3 +1,15 @@
 from candlelite.io import load
 from candlelite.io import path
 from candlelite.io import save
+from candlelite.io import storage
+from candlelite.io import codec
+from candlelite.io import manifest
+from candlelite.io import segment
+from candlelite.io import convert
+from candlelite.io import compact
+from candlelite.io import synthetic
+from candlelite.io import cache
+from candlelite.io import shm
+from candlelite.io import view
+from candlelite.io import parallel
+from candlelite.io import trace
@@ -0,0 +1,190 @@
+'''
+进程内的单日数据缓存（按照占用字节数淘汰的LRU）
+
+缓存以文件路径为键，记录文件的(mtime, size)，文件被修改后旧数据自动失效
+缓存的数组被设置为只读，读取函数在合并数据时会复制，调用者拿到的candle不与缓存共享内存
+
+CandleCache         缓存对象
+read_candle         通过缓存读取candle文件
+read_candles        通过缓存批量读取多个candle文件
+invalidate          保存文件后使缓存失效
+'''
+
+from collections import OrderedDict
+import os
+import threading
+import numpy as np
+from candlelite.io import storage as _storage
+from candlelite import exception
+
+__all__ = ['CandleCache', 'read_candle', 'read_candles', 'invalidate']
+
+
+class CandleCache():
+    def __init__(self, max_bytes: int = 1024 * 1024 * 1024):
+        '''
+        :param max_bytes: 缓存数据的最大字节数，超过时淘汰最久未使用的数据
+        '''
+        if max_bytes <= 0:
+            raise exception.ParamException(
+                func='CandleCache',
+                msg='max_bytes={max_bytes}, max_bytes must > 0'.format(max_bytes=max_bytes),
+            )
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # {path: (mtime_ns, size, candle)}
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    # 查询缓存，文件的mtime或size变化时视为未命中
+    def get(self, path: str, stat: os.stat_result = None):
+        '''
+        :param path: 文件路径
+        :param stat: 文件状态，None表示重新获取
+        :return: 缓存的candle或者None
+        '''
+        if stat == None:
+            stat = os.stat(path)
+        with self._lock:
+            item = self._data.get(path)
+            if item != None and item[0] == stat.st_mtime_ns and item[1] == stat.st_size:
+                self._data.move_to_end(path)
+                self.hits += 1
+                return item[2]
+            self.misses += 1
+            return None
+
+    # 写入缓存，超过字节上限时淘汰最久未使用的数据
+    def put(self, path: str, candle: np.ndarray, stat: os.stat_result = None) -> None:
+        '''
+        :param path: 文件路径
+        :param candle: 文件中读取的candle
+        :param stat: 读取之前获取的文件状态，None表示重新获取
+        '''
+        if stat == None:
+            stat = os.stat(path)
+        # 单个数据超过上限不缓存
+        if candle.nbytes > self.max_bytes:
+            return None
+        candle.flags.writeable = False
+        with self._lock:
+            self._pop(path)
+            self._data[path] = (stat.st_mtime_ns, stat.st_size, candle)
+            self.bytes += candle.nbytes
+            while self.bytes > self.max_bytes:
+                _, (_, _, evicted) = self._data.popitem(last=False)
+                self.bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def _pop(self, path: str) -> None:
+        item = self._data.pop(path, None)
+        if item != None:
+            self.bytes -= item[2].nbytes
+
+    # 删除某个文件的缓存
+    def invalidate(self, path: str) -> None:
+        with self._lock:
+            self._pop(path)
+
+    # 清空缓存与统计
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    # 缓存统计
+    def stats(self) -> dict:
+        '''
+        :return:
+            {
+                'hits': 命中次数,
+                'misses': 未命中次数,
+                'hit_rate': 命中率,
+                'evictions': 淘汰次数,
+                'entries': 缓存的文件数量,
+                'bytes': 缓存数据的字节数,
+                'max_bytes': 字节上限,
+            }
+        '''
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._data),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+
+# 通过缓存读取candle文件
+def read_candle(
+        path: str,
+        format: str = None,
+        mmap: bool = False,
+        cache: CandleCache = None,
+        columns: list = None,
+) -> np.ndarray:
+    '''
+    :param path: 文件路径
+    :param format: 存储格式，None表示根据文件后缀推断
+    :param mmap: 是否以只读内存映射的方式读取，内存映射的数据不进入缓存
+    :param cache: 缓存对象，None表示不使用缓存
+    :param columns: 读取的列（非负整数，按照升序），None表示全部
+        使用缓存时缓存完整的数据，返回时再选取这些列
+    :return: 未经过去重排序的candle，来自缓存并且读取全部列时为只读数组
+    '''
+    if cache == None or mmap:
+        return _storage.read_candle(path=path, format=format, mmap=mmap, columns=columns)
+    stat = os.stat(path)
+    candle = cache.get(path, stat=stat)
+    if candle is None:
+        candle = _storage.read_candle(path=path, format=format)
+        cache.put(path, candle, stat=stat)
+    if columns != None:
+        candle = candle[:, columns]
+    return candle
+
+
+# 通过缓存批量读取多个candle文件，没有命中的文件共用一次读取设置
+def read_candles(
+        paths: list,
+        format: str = None,
+        mmap: bool = False,
+        cache: CandleCache = None,
+        columns: list = None,
+) -> list:
+    '''
+    :param paths: 文件路径列表
+    :param format: 存储格式，None表示根据文件后缀推断
+    :param mmap: 是否以只读内存映射的方式读取，内存映射的数据不进入缓存
+    :param cache: 缓存对象，None表示不使用缓存
+    :param columns: 读取的列（非负整数，按照升序），None表示全部
+    :return: 与paths顺序相同的candle列表
+    '''
+    if cache == None or mmap:
+        return _storage.read_candles(paths=paths, format=format, mmap=mmap, columns=columns)
+    stats = [os.stat(path) for path in paths]
+    candles = [cache.get(path, stat=stat) for path, stat in zip(paths, stats)]
+    miss_indexes = [i for i, candle in enumerate(candles) if candle is None]
+    miss_candles = _storage.read_candles(paths=[paths[i] for i in miss_indexes], format=format)
+    for i, candle in zip(miss_indexes, miss_candles):
+        cache.put(paths[i], candle, stat=stats[i])
+        candles[i] = candle
+    if columns != None:
+        candles = [candle[:, columns] for candle in candles]
+    return candles
+
+
+# 保存文件后使缓存失效
+def invalidate(path: str, cache: CandleCache = None) -> None:
+    if cache != None:
+        cache.invalidate(path)
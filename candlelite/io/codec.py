@@ -0,0 +1,248 @@
+'''
+压缩存储格式npc的编码与解码
+
+文件结构:
+    MAGIC(8字节) + 文件头长度(4字节，小端) + 文件头(JSON) + 压缩的数据块
+文件头记录解码需要的全部信息，读取时不依赖写入时的设置:
+    {
+        'codec': 压缩算法 zstd|gzip|none,
+        'shape': [行数, 列数],
+        'ts': 时间戳列的编码 delta|raw,
+        'dtype': 其他列的dtype <f8|<f4,
+        'min_ts': 第一行时间戳,
+        'max_ts': 最后一行时间戳,
+    }
+数据块按列存储:
+    时间戳列   delta: 第一个时间戳与之后的差值（int64），固定间隔的K线压缩后几乎不占空间
+              raw: 时间戳不是整数毫秒时按照float64存储
+    其他列     按列连续存储，float32模式下有精度损失
+每个数值按字节拆分重排（byte shuffle）后再压缩，相同位置的字节相邻，浮点数的压缩率更高
+
+zstd需要安装zstandard，没有安装时codec=auto使用标准库的gzip
+
+写入设置 {'codec': 压缩算法, 'level': 压缩等级, 'float32': 是否以float32存储} 随每次写入传递（IO实例的codec_options），
+没有进程级的全局设置；重写已有文件（追加、合并分段）时沿用原文件头中的压缩算法与dtype
+
+DEFAULT_OPTIONS     默认写入设置
+check_options       补全并验证写入设置
+read_options        已有文件的写入设置（根据文件头）
+encode              candle -> 文件内容
+decode              文件内容 -> candle
+read_header         只读取文件头
+'''
+
+import gzip
+import json
+import struct
+import numpy as np
+from candlelite import exception
+
+__all__ = ['CODECS', 'DEFAULT_OPTIONS', 'check_options', 'read_options', 'encode', 'decode', 'read_header']
+
+MAGIC = b'\x93CLNPC\x01\x00'
+# 压缩算法
+#   auto: 安装了zstandard时使用zstd，否则使用gzip
+#   zstd / gzip / none
+CODECS = ['auto', 'zstd', 'gzip', 'none']
+
+# 默认写入设置
+#   codec:   压缩算法
+#   level:   压缩等级，None表示压缩算法的默认等级
+#   float32: 除时间戳以外的列是否以float32存储（有精度损失）
+DEFAULT_OPTIONS = {'codec': 'auto', 'level': None, 'float32': False}
+
+
+# 导入zstandard，没有安装时返回None
+def _import_zstd():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+# 补全并验证写入设置
+def check_options(options: dict = None, func: str = 'encode') -> dict:
+    '''
+    :param options: 写入设置，缺少的键使用DEFAULT_OPTIONS，None表示默认设置
+    :param func: 抛出异常时的函数名称
+    :return: {'codec': 压缩算法, 'level': 压缩等级, 'float32': 是否以float32存储}
+    '''
+    options = dict(DEFAULT_OPTIONS, **(options or {}))
+    unknown = set(options.keys()) - set(DEFAULT_OPTIONS.keys())
+    if unknown:
+        raise exception.ParamException(
+            func=func,
+            msg='codec_options={options}, unknown keys {unknown}'.format(options=options, unknown=sorted(unknown)),
+        )
+    if options['codec'] not in CODECS:
+        raise exception.ParamException(
+            func=func,
+            msg='codec={codec}, codec must in {codecs}'.format(codec=options['codec'], codecs=CODECS),
+        )
+    if options['codec'] == 'zstd' and _import_zstd() == None:
+        raise exception.ParamException(
+            func=func,
+            msg='codec=zstd, zstandard is not installed',
+        )
+    options['float32'] = bool(options['float32'])
+    return options
+
+
+# 已有文件的写入设置，重写文件时沿用原来的压缩算法与dtype
+def read_options(path: str) -> dict:
+    '''
+    :param path: 文件路径
+    :return: {'codec': 压缩算法, 'level': None, 'float32': 是否以float32存储}
+    '''
+    header = read_header(path)
+    return {'codec': header['codec'], 'level': None, 'float32': np.dtype(header['dtype']) == np.dtype('<f4')}
+
+
+# 压缩
+def _compress(data: bytes, codec: str, level: int) -> bytes:
+    if codec == 'zstd':
+        zstandard = _import_zstd()
+        return zstandard.ZstdCompressor(level=3 if level == None else level).compress(data)
+    elif codec == 'gzip':
+        return gzip.compress(data, compresslevel=6 if level == None else level, mtime=0)
+    return data
+
+
+# 解压
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == 'zstd':
+        zstandard = _import_zstd()
+        if zstandard == None:
+            raise exception.ExecuteException(
+                func='decode',
+                msg='codec=zstd, zstandard is not installed',
+            )
+        return zstandard.ZstdDecompressor().decompress(data)
+    elif codec == 'gzip':
+        return gzip.decompress(data)
+    elif codec == 'none':
+        return data
+    raise exception.ExecuteException(
+        func='decode',
+        msg='codec={codec}, codec must in {codecs}'.format(codec=codec, codecs=CODECS[1:]),
+    )
+
+
+# 按字节拆分重排
+def _shuffle(array: np.ndarray) -> bytes:
+    array = np.ascontiguousarray(array).reshape(-1)
+    return array.view(np.uint8).reshape(-1, array.itemsize).T.tobytes()
+
+
+# 还原按字节拆分重排的数据中的一段，planes为(itemsize, count)的字节平面
+def _unshuffle(planes: np.ndarray, dtype: str, start: int, size: int) -> np.ndarray:
+    return np.ascontiguousarray(planes[:, start:start + size].T).view(dtype).reshape(-1)
+
+
+# candle -> 文件内容
+def encode(candle: np.ndarray, options: dict = None) -> bytes:
+    '''
+    :param candle: 历史K线数据
+    :param options: 写入设置 {'codec', 'level', 'float32'}，None表示DEFAULT_OPTIONS
+    :return: 文件内容
+    '''
+    options = check_options(options, func='encode')
+    candle = np.asarray(candle, dtype=np.float64)
+    if candle.ndim != 2:
+        raise exception.ParamException(
+            func='encode',
+            msg='candle.ndim={ndim}, candle must be 2-dimensional'.format(ndim=candle.ndim),
+        )
+    rows, cols = candle.shape
+    codec = options['codec']
+    if codec == 'auto':
+        codec = 'zstd' if _import_zstd() != None else 'gzip'
+    dtype = np.dtype('<f4') if options['float32'] else np.dtype('<f8')
+    ts = candle[:, 0] if cols else np.zeros(0)
+    # 整数毫秒时间戳使用差值编码
+    if np.isfinite(ts).all() and (np.abs(ts) < 2 ** 53).all() and (ts == np.round(ts)).all():
+        ts_encoding = 'delta'
+        ts_int = ts.astype('<i8')
+        ts_data = _shuffle(np.diff(ts_int, prepend=np.zeros(1, dtype='<i8')))
+    else:
+        ts_encoding = 'raw'
+        ts_data = _shuffle(ts.astype('<f8'))
+    values_data = _shuffle(candle[:, 1:].T.astype(dtype)) if cols > 1 else b''
+    header = json.dumps({
+        'codec': codec,
+        'shape': [rows, cols],
+        'ts': ts_encoding,
+        'dtype': dtype.str,
+        'min_ts': float(ts[0]) if rows and cols else None,
+        'max_ts': float(ts[-1]) if rows and cols else None,
+    }).encode('UTF-8')
+    return MAGIC + struct.pack('<I', len(header)) + header + _compress(
+        ts_data + values_data,
+        codec=codec,
+        level=options['level'],
+    )
+
+
+# 解析文件头，返回(文件头, 数据块的起始位置)
+def _parse_header(content: bytes) -> tuple:
+    if content[:len(MAGIC)] != MAGIC:
+        raise exception.ExecuteException(
+            func='decode',
+            msg='content is not npc format',
+        )
+    start = len(MAGIC) + 4
+    (length,) = struct.unpack('<I', content[len(MAGIC):start])
+    return json.loads(content[start:start + length].decode('UTF-8')), start + length
+
+
+# 文件内容 -> candle
+def decode(content: bytes, columns: list = None, rows: tuple = None) -> np.ndarray:
+    '''
+    :param content: 文件内容
+    :param columns: 读取的列（非负整数，按照升序），None表示全部
+    :param rows: 读取的行范围(start, end)，None表示全部
+    :return: float64的candle，只解码需要的列与行
+    '''
+    header, offset = _parse_header(content)
+    total, cols = header['shape']
+    data = _decompress(content[offset:], codec=header['codec'])
+    if columns == None:
+        columns = list(range(cols))
+    start, end = slice(*rows).indices(total)[:2] if rows != None else (0, total)
+    size = max(end - start, 0)
+    candle = np.empty((size, len(columns)), dtype=np.float64)
+    if not size:
+        return candle
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    ts_planes = buffer[:total * 8].reshape(8, total)
+    dtype = np.dtype(header['dtype'])
+    # 其他列整块按字节重排，每列在字节平面中连续
+    values_planes = buffer[total * 8:].reshape(dtype.itemsize, total * (cols - 1))
+    for i, column in enumerate(columns):
+        if column >= cols:
+            raise IndexError('index {column} is out of bounds for axis 1 with size {cols}'.format(
+                column=column, cols=cols
+            ))
+        if column != 0:
+            candle[:, i] = _unshuffle(values_planes, dtype=dtype.str, start=(column - 1) * total + start, size=size)
+        elif header['ts'] == 'delta':
+            # 差值编码需要从第一行开始累加
+            candle[:, i] = np.cumsum(_unshuffle(ts_planes, dtype='<i8', start=0, size=end))[start:]
+        else:
+            candle[:, i] = _unshuffle(ts_planes, dtype='<f8', start=start, size=size)
+    return candle
+
+
+# 只读取文件头，不解压数据
+def read_header(path: str) -> dict:
+    '''
+    :param path: 文件路径
+    :return: 文件头
+    '''
+    with open(path, 'rb') as f:
+        prefix = f.read(len(MAGIC) + 4)
+        if prefix[:len(MAGIC)] != MAGIC:
+            return _parse_header(prefix)[0]
+        (length,) = struct.unpack('<I', prefix[len(MAGIC):])
+        return _parse_header(prefix + f.read(length))[0]
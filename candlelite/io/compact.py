@@ -0,0 +1,231 @@
+'''
+将以日期为单位存储的单日文件合并为按月或按年的分段文件（见segment）
+
+合并后读取函数自动从分段中读取，最近的日期仍然是单日文件，可以继续保存与追加写入
+'''
+
+from typing import Literal, Union
+import os
+import re
+import datetime
+import numpy as np
+from paux import date as _date
+from candlelite.io import storage as _storage
+from candlelite.io import codec as _codec
+from candlelite.io import manifest as _manifest
+from candlelite.io import segment as _segment
+
+__all__ = ['compact_candle_by_date']
+
+
+# 合并单日文件为分段文件
+def compact_candle_by_date(
+        instType: str,
+        base_dir: str,
+        symbols: list = [],
+        timezone: str = None,
+        bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = '1m',
+        format: str = 'csv',
+        period: Literal['month', 'year'] = 'month',
+        end: Union[int, float, str, datetime.date] = None,
+        remove: bool = True,
+) -> dict:
+    '''
+    :param instType: 产品类别
+    :param base_dir: 数据文件夹
+    :param symbols: 产品名称列表，空列表表示全部
+    :param timezone: 时区
+    :param bar: 时间粒度
+    :param format: 存储格式
+    :param period: 分段的时间跨度 month|year
+    :param end: 只合并end所在分段之前的分段，None表示今天（当月或当年的数据保持为单日文件）
+    :param remove: 合并后是否删除单日文件
+    :return: {symbol: [分段数据文件路径]}
+
+    已有的分段会与新的单日文件合并，同一天以单日文件为准
+    清单中仍在追加写入的日期（追加写入并且没有sealed）不合并
+    按年合并时，同一年按月合并的分段也会合并进来
+    npc分段沿用原文件的压缩算法，原文件都是float32时才以float32存储，合并不会降低精度
+    合并结果会追加到数据集清单中
+    '''
+    period = _segment._check_period(period, func='compact_candle_by_date')
+    if end == None:
+        end = datetime.datetime.now()
+    end_key = _segment.get_period_key(
+        _date.to_fmt(date=end, timezone=timezone, fmt='%Y-%m-%d'),
+        period=period,
+    )
+    manifest_kwargs = dict(instType=instType, base_dir=base_dir, timezone=timezone, bar=bar)
+    dirpath = os.path.dirname(_manifest.get_manifest_path(**manifest_kwargs))
+    result = {}
+    if not os.path.isdir(dirpath):
+        return result
+    day_paths = _get_day_paths(
+        dirpath=dirpath,
+        symbols=set(symbols),
+        format=format,
+        period=period,
+        end_key=end_key,
+        manifest=_manifest.read_manifest(format=format, **manifest_kwargs),
+    )
+    # 按年合并时，只有按月合并的分段的年份也需要合并
+    if period == 'year':
+        for month in _segment.get_segment_keys(dirpath):
+            key = _segment.get_period_key(month + '-01', period=period)
+            if len(month) != 7 or key >= end_key:
+                continue
+            for symbol in _segment.get_segment_symbols(dirpath=dirpath, format=format, key=month):
+                if not symbols or symbol in symbols:
+                    day_paths.setdefault(symbol, {}).setdefault(key, {})
+    records = []
+    try:
+        for symbol, key_paths in sorted(day_paths.items()):
+            for key, date_paths in sorted(key_paths.items()):
+                path = _compact_segment(
+                    dirpath=dirpath,
+                    symbol=symbol,
+                    key=key,
+                    period=period,
+                    format=format,
+                    date_paths=date_paths,
+                    remove=remove,
+                    records=records,
+                )
+                result.setdefault(symbol, []).append(path)
+    finally:
+        _manifest.update_manifest(records=records, **manifest_kwargs)
+    return result
+
+
+# 遍历数据集文件夹，得到需要合并的单日文件 {symbol: {key: {date: path}}}
+def _get_day_paths(
+        dirpath: str,
+        symbols: set,
+        format: str,
+        period: str,
+        end_key: str,
+        manifest: Union[dict, None],
+) -> dict:
+    '''
+    :param manifest: 清单 {symbol: {date: record}}，None表示清单未初始化
+    '''
+    suffix = _storage.get_suffix(format)
+    day_paths = {}
+    for month_entry in os.scandir(dirpath):
+        if not month_entry.is_dir() or not re.match(r'\d{4}-\d{2}$', month_entry.name):
+            continue
+        if _segment.get_period_key(month_entry.name + '-01', period=period) >= end_key:
+            continue
+        for date_entry in os.scandir(month_entry.path):
+            if not date_entry.is_dir():
+                continue
+            key = _segment.get_period_key(date_entry.name, period=period)
+            for file_entry in os.scandir(date_entry.path):
+                if not file_entry.name.endswith(suffix):
+                    continue
+                symbol = file_entry.name[:-len(suffix)]
+                if symbols and symbol not in symbols:
+                    continue
+                # 仍在追加写入的日期
+                if manifest != None:
+                    record = manifest.get(symbol, {}).get(date_entry.name)
+                    if record != None and _manifest.is_open_record(record):
+                        continue
+                day_paths.setdefault(symbol, {}).setdefault(key, {})[date_entry.name] = file_entry.path
+    return day_paths
+
+
+# 合并一个产品的一个分段
+def _compact_segment(
+        dirpath: str,
+        symbol: str,
+        key: str,
+        period: str,
+        format: str,
+        date_paths: dict,
+        remove: bool,
+        records: list,
+) -> str:
+    # 已有分段中的数据 {date: candle}
+    date_candles = {}
+    old_index_paths = []
+    source_paths = []
+    keys = [key]
+    if period == 'year':
+        keys += ['{year}-{month:02d}'.format(year=key, month=month) for month in range(1, 13)]
+    for old_key in keys:
+        index_path = _segment.get_index_path(dirpath=dirpath, symbol=symbol, key=old_key, format=format)
+        index = _segment.read_index(index_path)
+        if index == None:
+            continue
+        source_paths.append(os.path.join(os.path.dirname(index_path), index['file']))
+        candle = _storage.read_candle(path=source_paths[-1], format=format)
+        for date, (start, end) in index['dates'].items():
+            date_candles[date] = candle[start:end]
+        if old_key != key:
+            old_index_paths.append(index_path)
+    # 单日文件覆盖分段中的同一天
+    for date, path in date_paths.items():
+        date_candles[date] = _storage.read_candle(path=path, format=format)
+    dates = sorted(date_candles.keys())
+    candles = [date_candles[date] for date in dates]
+    offsets = np.concatenate([[0], np.cumsum([candle.shape[0] for candle in candles])]).astype(int)
+    segment_path = _segment.write_segment(
+        candle=np.concatenate(candles),
+        dates={date: [int(offsets[i]), int(offsets[i + 1])] for i, date in enumerate(dates)},
+        dirpath=dirpath,
+        symbol=symbol,
+        key=key,
+        format=format,
+        codec_options=_get_codec_options(paths=source_paths + list(date_paths.values()), format=format),
+    )
+    for i, date in enumerate(dates):
+        candle = candles[i]
+        record = _manifest.get_summary_record(
+            path=segment_path,
+            symbol=symbol,
+            date=date,
+            format=format,
+            summary={
+                'rows': int(candle.shape[0]),
+                'min_ts': float(candle[0, 0]) if candle.shape[0] else None,
+                'max_ts': float(candle[-1, 0]) if candle.shape[0] else None,
+            },
+        )
+        record['segment'] = os.path.relpath(segment_path, dirpath)
+        records.append(record)
+    # 按年合并后删除同一年按月合并的分段
+    for index_path in old_index_paths:
+        index = _segment.read_index(index_path)
+        os.remove(index_path)
+        old_path = os.path.join(os.path.dirname(index_path), index['file'])
+        if os.path.isfile(old_path):
+            os.remove(old_path)
+        _remove_empty_dirs(os.path.dirname(index_path), stop=_segment.get_segment_dirpath(dirpath))
+    if remove:
+        for path in date_paths.values():
+            os.remove(path)
+            _remove_empty_dirs(os.path.dirname(path), stop=dirpath)
+    return segment_path
+
+
+# 合并后的npc分段的写入设置：压缩算法取第一个原文件，任一原文件为float64时保持float64
+def _get_codec_options(paths: list, format: str) -> Union[dict, None]:
+    if format != 'npc' or not paths:
+        return None
+    options = [_codec.read_options(path) for path in paths]
+    return {
+        'codec': options[0]['codec'],
+        'level': None,
+        'float32': all(option['float32'] for option in options),
+    }
+
+
+# 删除空文件夹，直到stop
+def _remove_empty_dirs(dirpath: str, stop: str) -> None:
+    while os.path.abspath(dirpath) != os.path.abspath(stop):
+        try:
+            os.rmdir(dirpath)
+        except OSError:
+            return None
+        dirpath = os.path.dirname(dirpath)
@@ -0,0 +1,211 @@
+from typing import Literal
+import os
+import re
+from candlelite.io import path as _path
+from candlelite.io import storage as _storage
+from candlelite.io import manifest as _manifest
+
+__all__ = ['convert_candle_by_date', 'convert_candle_by_file']
+
+
+# 转换单个文件的存储格式
+def _convert_path(
+        from_path: str,
+        to_path: str,
+        from_format: str,
+        to_format: str,
+        replace: bool,
+        remove: bool,
+        codec_options: dict = None,
+):
+    '''
+    :return:
+        candle  完成转换，返回写入的candle
+        None    已存在目标文件并且不覆盖，跳过
+    '''
+    if not replace and os.path.isfile(to_path):
+        return None
+    candle = _storage.read_candle(path=from_path, format=from_format)
+    _storage.write_candle(candle=candle, path=to_path, format=to_format, codec_options=codec_options)
+    if remove:
+        os.remove(from_path)
+    return candle
+
+
+# 转换以日期为单位存储的数据格式，新格式文件与原文件保存在同一目录下
+def convert_candle_by_date(
+        instType: str,
+        base_dir: str,
+        symbols: list = [],
+        timezone: str = None,
+        bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = '1m',
+        from_format: str = 'csv',
+        to_format: str = 'npy',
+        replace: bool = False,
+        remove: bool = False,
+        codec_options: dict = None,
+) -> list:
+    '''
+    :param instType: 产品类别
+    :param base_dir: 数据文件夹
+    :param symbols: 产品名称列表，空列表表示全部
+    :param timezone: 时区
+    :param bar: 时间粒度
+    :param from_format: 原存储格式
+    :param to_format: 目标存储格式
+    :param replace: 目标文件存在时是否覆盖
+    :param remove: 转换完成后是否删除原文件
+    :param codec_options: 目标存储格式为npc时的写入设置 {'codec', 'level', 'float32'}，None表示默认设置
+    :return: 转换完成的目标文件路径列表
+
+    转换结果会追加到数据集清单中
+    如果原存储格式的清单已经初始化并且转换了全部产品，目标存储格式的清单也会被初始化
+    '''
+    manifest_kwargs = dict(instType=instType, base_dir=base_dir, timezone=timezone, bar=bar)
+    from_manifest = _manifest.read_manifest(format=from_format, **manifest_kwargs)
+    dirpath = os.path.dirname(_manifest.get_manifest_path(**manifest_kwargs))
+    to_paths = []
+    if not os.path.isdir(dirpath):
+        return to_paths
+    records = []
+    try:
+        _convert_date_tree(
+            dirpath=dirpath,
+            symbols=set(symbols),
+            from_format=from_format,
+            to_format=to_format,
+            replace=replace,
+            remove=remove,
+            to_paths=to_paths,
+            records=records,
+            codec_options=codec_options,
+        )
+        # 初始化记录在文件记录之前，未初始化的存储格式的文件记录会被跳过
+        if from_manifest != None and not symbols:
+            records.insert(0, {'init': to_format})
+    finally:
+        _manifest.update_manifest(records=records, **manifest_kwargs)
+    return to_paths
+
+
+# 遍历以日期为单位存储的文件夹，转换数据格式
+def _convert_date_tree(
+        dirpath: str,
+        symbols: set,
+        from_format: str,
+        to_format: str,
+        replace: bool,
+        remove: bool,
+        to_paths: list,
+        records: list,
+        codec_options: dict,
+) -> None:
+    from_suffix = _storage.get_suffix(from_format)
+    to_suffix = _storage.get_suffix(to_format)
+    # 年-月/年-月-日/产品名称.后缀
+    for month_entry in sorted(os.scandir(dirpath), key=lambda entry: entry.name):
+        if not month_entry.is_dir() or not re.match(r'\d{4}-\d{2}$', month_entry.name):
+            continue
+        for date_entry in sorted(os.scandir(month_entry.path), key=lambda entry: entry.name):
+            if not date_entry.is_dir():
+                continue
+            for file_entry in os.scandir(date_entry.path):
+                if not file_entry.name.endswith(from_suffix):
+                    continue
+                symbol = file_entry.name[:-len(from_suffix)]
+                if symbols and symbol not in symbols:
+                    continue
+                to_path = os.path.join(date_entry.path, symbol + to_suffix)
+                candle = _convert_path(
+                    from_path=file_entry.path,
+                    to_path=to_path,
+                    from_format=from_format,
+                    to_format=to_format,
+                    replace=replace,
+                    remove=remove,
+                    codec_options=codec_options,
+                )
+                if candle is None:
+                    # 已存在的目标文件也写入记录，初始化后的清单才是完整的
+                    records.append(
+                        _manifest.get_summary_record(
+                            path=to_path,
+                            symbol=symbol,
+                            date=date_entry.name,
+                            format=to_format,
+                            summary=_storage.read_summary(path=to_path, format=to_format),
+                        )
+                    )
+                    continue
+                to_paths.append(to_path)
+                records.append(
+                    _manifest.get_record(
+                        candle=candle, path=to_path, symbol=symbol, date=date_entry.name, format=to_format
+                    )
+                )
+                if remove:
+                    records.append(
+                        {'symbol': symbol, 'date': date_entry.name, 'format': from_format, 'delete': True}
+                    )
+
+
+# 转换以文件为单位存储的数据格式，新格式文件与原文件保存在同一目录下
+def convert_candle_by_file(
+        instType: str,
+        base_dir: str,
+        symbols: list = [],
+        timezone: str = None,
+        bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = '1m',
+        from_format: str = 'csv',
+        to_format: str = 'npy',
+        replace: bool = False,
+        remove: bool = False,
+        codec_options: dict = None,
+) -> list:
+    '''
+    :param instType: 产品类别
+    :param base_dir: 数据文件夹
+    :param symbols: 产品名称列表，空列表表示全部
+    :param timezone: 时区
+    :param bar: 时间粒度
+    :param from_format: 原存储格式
+    :param to_format: 目标存储格式
+    :param replace: 目标文件存在时是否覆盖
+    :param remove: 转换完成后是否删除原文件
+    :param codec_options: 目标存储格式为npc时的写入设置 {'codec', 'level', 'float32'}，None表示默认设置
+    :return: 转换完成的目标文件路径列表
+    '''
+    from_suffix = _storage.get_suffix(from_format)
+    symbols = set(symbols)
+    dirpath = os.path.join(
+        base_dir,
+        _path._get_file_dirname(instType=instType, timezone=timezone, bar=bar),
+    )
+    to_paths = []
+    if not os.path.isdir(dirpath):
+        return to_paths
+    for file_entry in sorted(os.scandir(dirpath), key=lambda entry: entry.name):
+        if not file_entry.name.endswith(from_suffix):
+            continue
+        symbol = file_entry.name[:-len(from_suffix)]
+        if symbols and symbol not in symbols:
+            continue
+        to_path = _path.get_candle_file_path(
+            instType=instType,
+            symbol=symbol,
+            base_dir=base_dir,
+            timezone=timezone,
+            bar=bar,
+            format=to_format,
+        )
+        if _convert_path(
+                from_path=file_entry.path,
+                to_path=to_path,
+                from_format=from_format,
+                to_format=to_format,
+                replace=replace,
+                remove=remove,
+                codec_options=codec_options,
+        ) is not None:
+            to_paths.append(to_path)
+    return to_paths
@@ -1,62 +1,86 @@
-from typing import Union, Literal
+from typing import Union, Literal, Iterator
 import os
 import numpy as np
 import pandas as pd
 import datetime
 from paux import param as _param
-from paux import process as _process
 from paux import date as _date
 from candlelite.calculate import transform as _transform
 from candlelite.calculate import valid as _valid
 from candlelite.calculate import interval as _interval
 from candlelite.io import path as _path
+from candlelite.io import segment as _segment
+from candlelite.io import manifest as _manifest
+from candlelite.io import storage as _storage
+from candlelite.io import cache as _cache
+from candlelite.io import shm as _shm
+from candlelite.io import parallel as _parallel
+from candlelite.io import trace as _trace
 from candlelite import exception
 
 __all__ = [
     'load_candle_by_date',
+    'iter_candle_by_date',
+    'iter_candle_map_by_date',
     'load_candle_by_file',
     'load_candle_map_by_date',
     'load_candle_map_by_file',
 ]
 
 
-# 读取从start~end日期的历史K线数据
-def load_candle_by_date(
+# 检查分块天数
+def _check_chunk_days(chunk_days: int, func: str) -> int:
+    if chunk_days < 1:
+        raise exception.ParamException(
+            func=func,
+            msg='chunk_days={chunk_days}, chunk_days must >= 1'.format(chunk_days=chunk_days),
+        )
+    return int(chunk_days)
+
+
+# 下推到读取函数的列，时间戳总是读取用于验证
+def _get_read_columns(columns: list) -> tuple:
+    '''
+    :param columns: 保留字段
+    :return: (读取的列, 读取后保留字段的位置)
+        读取的列为None表示读取全部列（没有保留字段，或者保留字段包含负数索引等无法下推的情况）
+    '''
+    if not columns or not all(isinstance(column, (int, np.integer)) and column >= 0 for column in columns):
+        return None, columns
+    read_columns = sorted(set([0] + [int(column) for column in columns]))
+    return read_columns, [read_columns.index(column) for column in columns]
+
+
+# 选取保留字段，读取后的列已经是保留字段时不复制
+def _select_columns(candle: np.ndarray, columns: list) -> np.ndarray:
+    if not columns or list(columns) == list(range(candle.shape[1])):
+        return candle
+    return candle[:, columns]
+
+
+# 检查文件是否齐全，返回日期序列
+def _get_date_range(
         instType: str,
         symbol: str,
         start: Union[int, float, str, datetime.date],
         end: Union[int, float, str, datetime.date],
         base_dir: str,
-        timezone: str = None,
-        bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = '1m',
-        columns: list = [],
-        valid_interval: bool = True,
-        valid_start: bool = True,
-        valid_end: bool = True,
-) -> np.ndarray:
-    '''
-    :param instType: 产品类型
-    :param symbol: 产品名称
-    :param start: 起始时间
-    :param end: 终止时间
-    :param base_dir: 数据文件夹
-    :param timezone: 时区
-    :param bar: 时间粒度
-    :parma columns: 保留字段，保留candle中的哪些列，空列表表示全部
-    :param valid_interval: 是否验证数据时间间隔
-    :param valid_start: 是否验证数据起始时间
-    :param valid_end: 是否验证数据终止时间
-    '''
+        timezone: str,
+        bar: str,
+        format: str,
+) -> list:
     # 文件是否存在
-    check_result = _path.check_candle_date_path(
-        instType=instType,
-        symbol=symbol,
-        start=start,
-        end=end,
-        timezone=timezone,
-        bar=bar,
-        base_dir=base_dir,
-    )
+    with _trace.span('check_path', symbol=symbol):
+        check_result = _path.check_candle_date_path(
+            instType=instType,
+            symbol=symbol,
+            start=start,
+            end=end,
+            timezone=timezone,
+            bar=bar,
+            base_dir=base_dir,
+            format=format,
+        )
     if not check_result['code']:
         raise exception.CandleFileNotExist(
             symbol=symbol,
@@ -65,11 +89,139 @@ def load_candle_by_date(
 
         )
     # 日期序列
-    date_range = _date.get_range_dates(
+    return _date.get_range_dates(
         start=start,
         end=end,
         timezone=timezone,
     )
+
+
+# 清单已初始化时只查询清单，仍在追加写入的日期检查文件是否存在（完整检查见manifest.check_manifest）
+def _check_manifest_files(
+        instType: str,
+        symbol: str,
+        dates: list,
+        paths: list,
+        base_dir: str,
+        timezone: str,
+        bar: str,
+        format: str,
+) -> None:
+    manifest = _manifest.read_manifest(
+        instType=instType, base_dir=base_dir, timezone=timezone, bar=bar, format=format
+    )
+    if manifest == None:
+        return None
+    symbol_dates = manifest.get(symbol, {})
+    for date, path in zip(dates, paths):
+        record = symbol_dates.get(date)
+        if record == None or not _manifest.is_open_record(record):
+            continue
+        if not os.path.isfile(path):
+            raise exception.CandleFileNotExist(symbol=symbol, date=date, path=path)
+
+
+# 迭代读取时跨分块保留的完整分段数量
+SEGMENT_CACHE_SIZE = 2
+
+
+# 查找合并到分段中的日期 {i: 分段与行范围}，同一天以单日文件为准
+def _find_segments(
+        instType: str,
+        symbol: str,
+        dates: list,
+        paths: list,
+        base_dir: str,
+        timezone: str,
+        bar: str,
+        format: str,
+) -> dict:
+    segments = {}
+    dirpath = os.path.join(base_dir, _path._get_date_dirname(instType=instType, timezone=timezone, bar=bar))
+    if not os.path.isdir(_segment.get_segment_dirpath(dirpath)):
+        return segments
+    with _trace.span('find_segment', symbol=symbol):
+        for i, date in enumerate(dates):
+            if os.path.isfile(paths[i]):
+                continue
+            segment = _path.find_candle_date_segment(
+                instType=instType,
+                symbol=symbol,
+                date=date,
+                timezone=timezone,
+                bar=bar,
+                base_dir=base_dir,
+                format=format,
+            )
+            if segment != None:
+                segments[i] = segment
+    return segments
+
+
+# 读取分段中的日期，返回{i: candle}
+def _read_segment_candles(
+        segments: dict,
+        format: str,
+        mmap: bool,
+        cache: _cache.CandleCache,
+        columns: list,
+        segment_cache: dict,
+) -> dict:
+    '''
+    :param segments: {i: 分段与行范围}
+    :param segment_cache: 完整分段的缓存 {(path, columns): candle}，None表示只读取需要的行
+
+    每个分段只读取一次，读取方式：
+        使用cache时缓存完整的分段
+        npy通过内存映射只复制需要的行
+        csv与npc提供segment_cache时（迭代读取）读取完整的分段并跨分块保留，否则只解析需要的行
+    '''
+    groups = {}
+    for i, segment in segments.items():
+        groups.setdefault(segment['path'], []).append(i)
+    candles = {}
+    for path, indexes in groups.items():
+        start = min(segments[i]['start'] for i in indexes)
+        end = max(segments[i]['end'] for i in indexes)
+        key = (path, tuple(columns) if columns != None else None)
+        if cache != None and not mmap:
+            candle, offset = _cache.read_candle(path=path, format=format, cache=cache, columns=columns), 0
+        elif segment_cache != None and format != 'npy':
+            if key not in segment_cache.keys():
+                while len(segment_cache) >= SEGMENT_CACHE_SIZE:
+                    segment_cache.pop(next(iter(segment_cache)))
+                segment_cache[key] = _storage.read_candle(path=path, format=format, mmap=mmap, columns=columns)
+                # 保留的分段与调用者不共享内存
+                segment_cache[key].flags.writeable = False
+            candle, offset = segment_cache[key], 0
+        else:
+            candle = _storage.read_candle(path=path, format=format, mmap=mmap, columns=columns, rows=(start, end))
+            offset = start
+        for i in indexes:
+            candles[i] = candle[segments[i]['start'] - offset:segments[i]['end'] - offset]
+    return candles
+
+
+# 读取多个日期的文件并合并
+def _read_date_candle(
+        instType: str,
+        symbol: str,
+        dates: list,
+        base_dir: str,
+        timezone: str,
+        bar: str,
+        format: str,
+        mmap: bool,
+        cache: _cache.CandleCache,
+        columns: list = None,
+        segment_cache: dict = None,
+        retry: bool = True,
+) -> np.ndarray:
+    '''
+    :param columns: 读取的列（非负整数，按照升序，包含时间戳），None表示全部
+    :param segment_cache: 完整分段的缓存，迭代读取时跨分块保留，None表示不保留
+    :param retry: 分段在读取期间被重写时是否重新读取索引
+    '''
     # 文件路径
     paths = [
         _path.get_candle_date_path(
@@ -79,13 +231,96 @@ def load_candle_by_date(
             timezone=timezone,
             bar=bar,
             base_dir=base_dir,
+            format=format,
         )
-        for date in date_range
+        for date in dates
     ]
-    # 读取->DataFrame
-    dfs = [pd.read_csv(path) for path in paths]
+    segments = _find_segments(
+        instType=instType,
+        symbol=symbol,
+        dates=dates,
+        paths=paths,
+        base_dir=base_dir,
+        timezone=timezone,
+        bar=bar,
+        format=format,
+    )
+    # 分段在查找之后被重写时旧的数据文件已经删除，重新读取索引
+    try:
+        segment_candles = _read_segment_candles(
+            segments=segments,
+            format=format,
+            mmap=mmap,
+            cache=cache,
+            columns=columns,
+            segment_cache=segment_cache,
+        )
+    except FileNotFoundError:
+        if not retry:
+            raise
+        return _read_date_candle(
+            instType=instType,
+            symbol=symbol,
+            dates=dates,
+            base_dir=base_dir,
+            timezone=timezone,
+            bar=bar,
+            format=format,
+            mmap=mmap,
+            cache=cache,
+            columns=columns,
+            segment_cache=segment_cache,
+            retry=False,
+        )
+    file_indexes = [i for i in range(len(paths)) if i not in segments.keys()]
+    with _trace.span('check_path', symbol=symbol):
+        _check_manifest_files(
+            instType=instType,
+            symbol=symbol,
+            dates=[dates[i] for i in file_indexes],
+            paths=[paths[i] for i in file_indexes],
+            base_dir=base_dir,
+            timezone=timezone,
+            bar=bar,
+            format=format,
+        )
+    # 读取->Array
+    candles = [None] * len(paths)
+    file_candles = _cache.read_candles(
+        paths=[paths[i] for i in file_indexes], format=format, mmap=mmap, cache=cache, columns=columns
+    )
+    for i, candle in zip(file_indexes, file_candles):
+        candles[i] = candle
+    for i, candle in segment_candles.items():
+        candles[i] = candle
     # 合并数据->Candle
-    candle = _transform.concat_candle(candles=dfs, drop_duplicate=True, sort=True)
+    with _trace.span('concat', symbol=symbol) as record:
+        candle = _transform.concat_candle(candles=candles, drop_duplicate=True, sort=True)
+        # 已经排序的单日数据不产生复制，不与缓存共享内存
+        if not mmap and not candle.flags.writeable:
+            candle = candle.copy()
+        if record != None:
+            record['rows'] = int(candle.shape[0])
+    return candle
+
+
+# 验证按照日期读取的candle，验证失败抛出异常
+@_trace.traced('valid')
+def _valid_date_candle(
+        candle: np.ndarray,
+        symbol: str,
+        start_date: Union[datetime.date, None],
+        end_date: Union[datetime.date, None],
+        timezone: str,
+        bar: str,
+        valid_interval: bool,
+        last_ts: Union[int, float] = None,
+) -> None:
+    '''
+    :param start_date: 验证起始时间的日期，None表示不验证
+    :param end_date: 验证终止时间的日期，None表示不验证
+    :param last_ts: 上一个分块最后的时间戳，验证interval时同时验证衔接
+    '''
     # 验证interval
     if valid_interval:
         valid_interval_result = _valid.valid_interval(candle=candle, bar=bar)
@@ -94,9 +329,18 @@ def load_candle_by_date(
                 symbol=symbol,
                 msg=valid_interval_result['msg']
             )
+        if last_ts != None and candle[0, 0] - last_ts != _interval.get_interval(bar):
+            msg = '[valid candle interval error]: correct_interval={correct_interval} error_interval={error_interval}'.format(
+                correct_interval=_interval.get_interval(bar),
+                error_interval=[candle[0, 0] - last_ts],
+            )
+            raise exception.CandleIntervalError(
+                symbol=symbol,
+                msg=msg,
+            )
     # 验证start
-    if valid_start:
-        start_ts = _date.to_ts(date=date_range[0], timezone=timezone)
+    if start_date != None:
+        start_ts = _date.to_ts(date=start_date, timezone=timezone)
         valid_start_result = _valid.valid_start(candle=candle, start=start_ts, timezone=timezone)
         if not valid_start_result['code']:
             raise exception.CandleStartError(
@@ -104,8 +348,8 @@ def load_candle_by_date(
                 msg=valid_start_result['msg'],
             )
     # 验证end
-    if valid_end:
-        end_ts = _date.tomorrow(date=date_range[-1], timezone=timezone).timestamp() * 1000 - _interval.get_interval(bar)
+    if end_date != None:
+        end_ts = _date.tomorrow(date=end_date, timezone=timezone).timestamp() * 1000 - _interval.get_interval(bar)
         # end_ts = _date.to_ts(date=date_range[-1], timezone=timezone) + 1000 * 60 * 60 * 24 - _interval.get_interval(bar)
         valid_end_result = _valid.valid_end(candle=candle, end=end_ts, timezone=timezone)
         if not valid_end_result['code']:
@@ -113,12 +357,234 @@ def load_candle_by_date(
                 symbol=symbol,
                 msg=valid_end_result['msg'],
             )
-    if columns:
-        candle = candle[:, columns]
+
+
+# 读取从start~end日期的历史K线数据
+@_trace.traced('load_candle_by_date')
+def load_candle_by_date(
+        instType: str,
+        symbol: str,
+        start: Union[int, float, str, datetime.date],
+        end: Union[int, float, str, datetime.date],
+        base_dir: str,
+        timezone: str = None,
+        bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = '1m',
+        columns: list = [],
+        valid_interval: bool = True,
+        valid_start: bool = True,
+        valid_end: bool = True,
+        format: str = 'csv',
+        mmap: bool = False,
+        cache: _cache.CandleCache = None,
+) -> np.ndarray:
+    '''
+    :param instType: 产品类型
+    :param symbol: 产品名称
+    :param start: 起始时间
+    :param end: 终止时间
+    :param base_dir: 数据文件夹
+    :param timezone: 时区
+    :param bar: 时间粒度
+    :parma columns: 保留字段，保留candle中的哪些列，空列表表示全部，读取文件时只解析这些列与时间戳
+    :param valid_interval: 是否验证数据时间间隔
+    :param valid_start: 是否验证数据起始时间
+    :param valid_end: 是否验证数据终止时间
+    :param format: 存储格式 csv|npy|npc
+    :param mmap: 是否以内存映射的方式读取（仅支持npy格式）
+        单日数据直接返回只读的np.memmap，多日数据只在合并时复制一次
+    :param cache: 单日数据缓存，None表示不使用缓存（mmap=True时不使用缓存）
+    '''
+    date_range = _get_date_range(
+        instType=instType,
+        symbol=symbol,
+        start=start,
+        end=end,
+        base_dir=base_dir,
+        timezone=timezone,
+        bar=bar,
+        format=format,
+    )
+    read_columns, columns = _get_read_columns(columns)
+    candle = _read_date_candle(
+        instType=instType,
+        symbol=symbol,
+        dates=date_range,
+        base_dir=base_dir,
+        timezone=timezone,
+        bar=bar,
+        format=format,
+        mmap=mmap,
+        cache=cache,
+        columns=read_columns,
+    )
+    _valid_date_candle(
+        candle=candle,
+        symbol=symbol,
+        start_date=date_range[0] if valid_start else None,
+        end_date=date_range[-1] if valid_end else None,
+        timezone=timezone,
+        bar=bar,
+        valid_interval=valid_interval,
+    )
+    candle = _select_columns(candle, columns)
 
     return candle
 
 
+# 按照日期分块迭代读取start~end日期的历史K线数据
+def iter_candle_by_date(
+        instType: str,
+        symbol: str,
+        start: Union[int, float, str, datetime.date],
+        end: Union[int, float, str, datetime.date],
+        base_dir: str,
+        timezone: str = None,
+        bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = '1m',
+        columns: list = [],
+        chunk_days: int = 1,
+        valid_interval: bool = True,
+        valid_start: bool = True,
+        valid_end: bool = True,
+        format: str = 'csv',
+        mmap: bool = False,
+        cache: _cache.CandleCache = None,
+) -> Iterator[np.ndarray]:
+    '''
+    :param instType: 产品类型
+    :param symbol: 产品名称
+    :param start: 起始时间
+    :param end: 终止时间
+    :param base_dir: 数据文件夹
+    :param timezone: 时区
+    :param bar: 时间粒度
+    :parma columns: 保留字段，保留candle中的哪些列，空列表表示全部，读取文件时只解析这些列与时间戳
+    :param chunk_days: 每个分块包含的天数
+    :param valid_interval: 是否验证数据时间间隔（包括分块内部以及与上一个分块的衔接）
+    :param valid_start: 是否验证第一个分块的起始时间
+    :param valid_end: 是否验证最后一个分块的终止时间
+    :param format: 存储格式 csv|npy|npc
+    :param mmap: 是否以内存映射的方式读取（仅支持npy格式）
+    :param cache: 单日数据缓存，None表示不使用缓存
+    :return: 按照时间顺序返回每个分块candle的生成器
+
+    同一时间只读取一个分块，内存占用与start~end的长度无关
+    全部分块验证通过时，与load_candle_by_date的验证结果相同
+    '''
+    chunk_days = _check_chunk_days(chunk_days, func='iter_candle_by_date')
+    date_range = _get_date_range(
+        instType=instType,
+        symbol=symbol,
+        start=start,
+        end=end,
+        base_dir=base_dir,
+        timezone=timezone,
+        bar=bar,
+        format=format,
+    )
+    read_columns, columns = _get_read_columns(columns)
+    last_ts = None
+    # 同一分段的多个分块只读取一次分段
+    segment_cache = {}
+    for i in range(0, len(date_range), chunk_days):
+        dates = date_range[i:i + chunk_days]
+        # 追踪时每个分块记录一次，不包含调用者处理分块的时间
+        with _trace.span('iter_candle_by_date', symbol=symbol) as record:
+            candle = _read_date_candle(
+                instType=instType,
+                symbol=symbol,
+                dates=dates,
+                base_dir=base_dir,
+                timezone=timezone,
+                bar=bar,
+                format=format,
+                mmap=mmap,
+                cache=cache,
+                columns=read_columns,
+                segment_cache=segment_cache,
+            )
+            _valid_date_candle(
+                candle=candle,
+                symbol=symbol,
+                start_date=dates[0] if valid_start and i == 0 else None,
+                end_date=dates[-1] if valid_end and i + chunk_days >= len(date_range) else None,
+                timezone=timezone,
+                bar=bar,
+                valid_interval=valid_interval,
+                last_ts=last_ts,
+            )
+            if record != None:
+                record['rows'] = int(candle.shape[0])
+        if candle.shape[0]:
+            last_ts = candle[-1, 0]
+        yield _select_columns(candle, columns)
+
+
+# 按照日期分块迭代读取多个产品，每个分块返回{symbol: candle}
+def iter_candle_map_by_date(
+        instType: str,
+        symbols: list,
+        start: Union[int, float, str, datetime.date],
+        end: Union[int, float, str, datetime.date],
+        base_dir: str,
+        timezone: str = None,
+        bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = '1m',
+        columns: list = [],
+        endswith: str = '',
+        contains: str = '',
+        chunk_days: int = 1,
+        valid_interval: bool = True,
+        valid_start: bool = True,
+        valid_end: bool = True,
+        format: str = 'csv',
+        mmap: bool = False,
+        cache: _cache.CandleCache = None,
+) -> Iterator[dict]:
+    '''
+    :param symbols: 产品名称列表，空列表表示start~end日期中每一天都有数据的产品
+    :param endswith: 产品名称需以此结尾
+    :param contains: 产品名称需包含此内容
+    :param chunk_days: 每个分块包含的天数
+    其他参数与iter_candle_by_date相同
+    :return: 按照时间顺序返回每个分块candle_map的生成器，candle_map按照产品名称排序
+    '''
+    if not symbols:
+        with _trace.span('get_symbols'):
+            symbols = _path.get_symbols_by_date(
+                instType=instType,
+                start=start,
+                end=end,
+                base_dir=base_dir,
+                timezone=timezone,
+                bar=bar,
+                format=format,
+                endswith=endswith,
+                contains=contains,
+            )
+    symbols = sorted(symbols)
+    iterators = [
+        iter_candle_by_date(
+            instType=instType,
+            symbol=symbol,
+            start=start,
+            end=end,
+            base_dir=base_dir,
+            timezone=timezone,
+            bar=bar,
+            columns=columns,
+            chunk_days=chunk_days,
+            valid_interval=valid_interval,
+            valid_start=valid_start,
+            valid_end=valid_end,
+            format=format,
+            mmap=mmap,
+            cache=cache,
+        )
+        for symbol in symbols
+    ]
+    for candles in zip(*iterators):
+        yield dict(zip(symbols, candles))
+
+
 # 按照日期读取candle_map
 def load_candle_map_by_date(
         instType: str,
@@ -132,9 +598,14 @@ def load_candle_map_by_date(
         endswith: str = '',
         contains: str = '',
         p_num: int = 1,
+        p_mode: Literal['process', 'thread'] = 'process',
+        shared_memory: bool = False,
         valid_interval: bool = True,
         valid_start: bool = True,
         valid_end: bool = True,
+        format: str = 'csv',
+        mmap: bool = False,
+        cache: _cache.CandleCache = None,
 ) -> dict:
     '''
     :param instType: 产品类型
@@ -144,41 +615,38 @@ def load_candle_map_by_date(
     :param base_dir: 数据文件夹
     :param timezone: 时区
     :param bar: 时间粒度
-    :parma columns: 保留字段，保留candle中的哪些列，空列表表示全部
+    :parma columns: 保留字段，保留candle中的哪些列，空列表表示全部，读取文件时只解析这些列与时间戳
     :param endswith: 产品名称需以此结尾
     :param contains: 产品名称需包含此内容
     :param valid_interval: 是否验证数据时间间隔
     :param valid_start: 是否验证数据起始时间
     :param valid_end: 是否验证数据终止时间
+    :param format: 存储格式 csv|npy|npc
+    :param mmap: 是否以内存映射的方式读取（仅支持npy格式）
+    :param p_num: 并行数量，<=1时在当前线程中顺序读取
+    :param p_mode: 并行方式 process|thread
+        process: 多进程读取
+        thread: 线程池读取，可以与cache一起使用
+    :param shared_memory: p_mode=process时子进程是否通过共享内存传回candle（需要Python3.8+）
+        True    主进程直接映射子进程写入的共享内存，不经过序列化复制
+        False   candle经过序列化传回主进程
+    :param cache: 单日数据缓存，p_num>1并且p_mode=process时不使用
     '''
+    _parallel.check_p_mode(p_mode, func='load_candle_map_by_date')
     # 如果没有产品的名字，获取产品类型数据中，有start_date到end_date中有完整数据的symbol
     if not symbols:
-        dates = _date.get_range_dates(start=start, end=end, timezone=timezone)
-        symbols = set()
-        for date in dates:
-            date_dirpath = os.path.dirname(
-                _path.get_candle_date_path(
-                    base_dir=base_dir,
-                    instType=instType,
-                    timezone=timezone,
-                    date=date,
-                    bar=bar,
-                    symbol=''
-                )
+        with _trace.span('get_symbols'):
+            symbols = _path.get_symbols_by_date(
+                instType=instType,
+                start=start,
+                end=end,
+                base_dir=base_dir,
+                timezone=timezone,
+                bar=bar,
+                format=format,
+                endswith=endswith,
+                contains=contains,
             )
-            this_symbols = []
-            for filename in os.listdir(date_dirpath):
-                symbol = filename.rsplit('.', maxsplit=1)[0]
-                if endswith and not symbol.endswith(endswith):
-                    continue
-                if contains and not contains in symbol:
-                    continue
-                else:
-                    this_symbols.append(symbol)
-            if not symbols:
-                symbols = set(this_symbols)
-            else:
-                symbols = symbols & set(this_symbols)
     symbols = list(symbols)
 
     candle_map = {}
@@ -198,14 +666,28 @@ def load_candle_map_by_date(
                     valid_interval=valid_interval,
                     valid_start=valid_start,
                     valid_end=valid_end,
+                    format=format,
+                    mmap=mmap,
                 )
             )
-        results = _process.pool_worker(
-            params=params,
-            p_num=p_num,
-            func=load_candle_by_date,
-            skip_exception=False,
-        )
+        if p_mode == 'thread':
+            results = _parallel.thread_worker(
+                params=[dict(param, cache=cache) for param in params],
+                p_num=p_num,
+                func=load_candle_by_date,
+            )
+        elif shared_memory:
+            results = _shm.pool_worker(
+                params=params,
+                p_num=p_num,
+                shm_func=load_candle_by_date,
+            )
+        else:
+            results = _trace.pool_worker(
+                params=params,
+                p_num=p_num,
+                func=load_candle_by_date,
+            )
         for i, candle in enumerate(results):
             if _param.isnull(candle):
                 continue
@@ -226,6 +708,9 @@ def load_candle_map_by_date(
                 valid_interval=valid_interval,
                 valid_start=valid_start,
                 valid_end=valid_end,
+                format=format,
+                mmap=mmap,
+                cache=cache,
             )
     # candle_map排序
     candle_map_sorted = {}
@@ -245,6 +730,9 @@ def load_candle_all(
         end: Union[int, float, str, datetime.date] = None,
         timezone: str = None,
         bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = '1m',
+        format: str = 'csv',
+        mmap: bool = False,
+        cache: _cache.CandleCache = None,
 ):
     candle_dates_result = _path.get_candle_dates(
         instType=instType,
@@ -254,6 +742,7 @@ def load_candle_all(
         base_dir=base_dir,
         timezone=timezone,
         bar=bar,
+        format=format,
     )
 
     if candle_dates_result['code'] != True:
@@ -270,6 +759,9 @@ def load_candle_all(
         timezone=timezone,
         bar=bar,
         columns=columns,
+        format=format,
+        mmap=mmap,
+        cache=cache,
     )
     return candle
 
@@ -285,16 +777,30 @@ def load_candle_map_all(
         end: Union[int, float, str, datetime.date] = None,
         timezone: str = None,
         p_num: int = 1,
+        p_mode: Literal['process', 'thread'] = 'process',
+        shared_memory: bool = False,
         columns: list = [],
         bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = '1m',
+        format: str = 'csv',
+        mmap: bool = False,
+        cache: _cache.CandleCache = None,
 ):
+    '''
+    :param p_num: 并行数量，<=1时在当前线程中顺序读取
+    :param p_mode: 并行方式 process|thread
+    :param shared_memory: p_mode=process时子进程是否通过共享内存传回candle（需要Python3.8+）
+    :param cache: 单日数据缓存，p_num>1并且p_mode=process时不使用
+    '''
+    _parallel.check_p_mode(p_mode, func='load_candle_map_all')
     if not symbols:
-        symbols = _path.get_symbols_all(
-            instType=instType,
-            base_dir=base_dir,
-            timezone=timezone,
-            bar=bar,
-        )
+        with _trace.span('get_symbols'):
+            symbols = _path.get_symbols_all(
+                instType=instType,
+                base_dir=base_dir,
+                timezone=timezone,
+                bar=bar,
+                format=format,
+            )
         # 过滤endswith与contains
         symbols = [symbol for symbol in symbols if symbol.endswith(endswith) and contains in symbol]
 
@@ -312,14 +818,28 @@ def load_candle_map_all(
                     columns=columns,
                     start=start,
                     end=end,
+                    format=format,
+                    mmap=mmap,
                 )
             )
-        results = _process.pool_worker(
-            params=params,
-            p_num=p_num,
-            func=load_candle_all,
-            skip_exception=False,
-        )
+        if p_mode == 'thread':
+            results = _parallel.thread_worker(
+                params=[dict(param, cache=cache) for param in params],
+                p_num=p_num,
+                func=load_candle_all,
+            )
+        elif shared_memory:
+            results = _shm.pool_worker(
+                params=params,
+                p_num=p_num,
+                shm_func=load_candle_all,
+            )
+        else:
+            results = _trace.pool_worker(
+                params=params,
+                p_num=p_num,
+                func=load_candle_all,
+            )
         for i, candle in enumerate(results):
             if _param.isnull(candle):
                 continue
@@ -338,6 +858,9 @@ def load_candle_map_all(
                 timezone=timezone,
                 bar=bar,
                 columns=columns,
+                format=format,
+                mmap=mmap,
+                cache=cache,
             )
             if not candle.shape[0]:
                 continue
@@ -346,6 +869,7 @@ def load_candle_map_all(
 
 
 # 通过文件地址读取Candle
+@_trace.traced('load_candle_by_file')
 def load_candle_by_file(
         instType: str,
         symbol: str,
@@ -355,10 +879,14 @@ def load_candle_by_file(
         timezone: str = None,
         bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = '1m',
         valid_interval: bool = True,
+        format: str = 'csv',
+        mmap: bool = False,
+        cache: _cache.CandleCache = None,
 ):
     '''
-    如果有path路径，按照path路径读取文件
-    如果没有path路径，按照base_dir、symbol、instType、bar和timezone计算产品路径
+    mmap=True时以只读内存映射的方式读取（仅支持npy格式），数据已排序且没有重复时不产生复制
+    如果有path路径，按照path路径读取文件，存储格式根据文件后缀推断
+    如果没有path路径，按照base_dir、symbol、instType、bar、timezone和format计算产品路径
     '''
     # 路径
     if path == None:
@@ -368,21 +896,28 @@ def load_candle_by_file(
             bar=bar,
             timezone=timezone,
             base_dir=base_dir,
+            format=format,
         )
+    else:
+        format = _storage.get_format(path)
     # 读取
-    df = pd.read_csv(path)
-    candle = _transform.to_candle(candle=df, drop_duplicate=True, sort=True)
+    read_columns, columns = _get_read_columns(columns)
+    candle = _cache.read_candle(path=path, format=format, mmap=mmap, cache=cache, columns=read_columns)
+    with _trace.span('to_candle'):
+        candle = _transform.to_candle(candle=candle, drop_duplicate=True, sort=True)
+        # 已经排序的数据不产生复制，不与缓存共享内存
+        if not mmap and not candle.flags.writeable:
+            candle = candle.copy()
     # 验证interval
     if valid_interval:
-        valid_interval_result = _valid.valid_interval(candle=candle, bar=bar)
+        with _trace.span('valid'):
+            valid_interval_result = _valid.valid_interval(candle=candle, bar=bar)
         if not valid_interval_result['code']:
             raise exception.CandleIntervalError(
                 symbol=symbol,
                 msg=valid_interval_result['msg']
             )
-    if columns:
-        candle = candle[:, columns]
-    return candle
+    return _select_columns(candle, columns)
 
 
 # 通过文件夹地址读取Candle_map
@@ -395,6 +930,9 @@ def load_candle_map_by_file(
         timezone: str = None,
         bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = '1m',
         valid_interval: bool = True,
+        format: str = 'csv',
+        mmap: bool = False,
+        cache: _cache.CandleCache = None,
 ):
     # 路径
     if path == None:
@@ -411,7 +949,10 @@ def load_candle_map_by_file(
     if not symbols:
         filenames = os.listdir(path)
         symbols = []
+        suffix = _storage.get_suffix(format)
         for filename in filenames:
+            if not filename.endswith(suffix):
+                continue
             symbol = filename.rsplit('.', maxsplit=1)[0]
             symbols.append(symbol)
     # 读取数据
@@ -424,7 +965,10 @@ def load_candle_map_by_file(
             timezone=timezone,
             bar=bar,
             columns=columns,
-            valid_interval=valid_interval
+            valid_interval=valid_interval,
+            format=format,
+            mmap=mmap,
+            cache=cache,
         )
         candle_map[symbol] = candle
     # candle_map排序
@@ -0,0 +1,506 @@
+'''
+以日期为单位存储的数据集清单（instType-timezone-bar 文件夹下的 manifest.jsonl）
+
+清单为追加写入的JSON行文件，每行是一条记录:
+    初始化记录   {"init": "csv"}
+        表示该存储格式的清单已经完整，路径函数可以只查询清单，不再逐日检查文件
+    文件记录    {"symbol": ..., "date": "2023-01-01", "format": "csv",
+                 "rows": ..., "min_ts": ..., "max_ts": ..., "size": ..., "mtime": ...}
+                追加写入的文件增加 "append": true，只在新建单日文件与当天数据完整时写入记录，
+                未完整的日期（open）记录中的行数、时间戳与文件状态可能已经过期，
+                当天数据完整并通过验证后增加 "sealed": true
+                合并到分段中的日期增加 "segment": 分段数据文件相对数据集文件夹的路径
+    删除记录    {"symbol": ..., "date": "2023-01-01", "format": "csv", "delete": true}
+相同(format, symbol, date)的记录以最后一条为准
+只有已经初始化的存储格式追加文件记录，保存函数写入数据集中还没有文件的存储格式时直接初始化，
+已有文件的存储格式需要用build_manifest建立清单
+读取函数只检查仍在追加写入的日期的文件是否存在，check_manifest比较全部单日文件的size与mtime，
+文件在库外被修改、替换或删除后需要用build_manifest重建清单
+
+get_manifest_path   清单文件路径
+read_manifest       读取某存储格式的清单 {symbol: {date: record}}，清单未初始化返回None
+update_manifest     追加记录，跳过未初始化的存储格式
+init_manifest       数据集中还没有该存储格式的文件时初始化清单
+check_manifest      检查单日文件与清单记录是否一致
+check_record        文件状态是否与记录一致
+is_open_record      是否为仍在追加写入的日期的记录
+get_record          根据写入的candle与文件生成记录
+get_summary_record  根据文件的行数与首尾时间戳生成记录
+build_manifest      扫描数据文件夹，重建某存储格式的清单
+compact_manifest    压缩清单，每个(format, symbol, date)只保留最后一条记录
+'''
+
+from typing import Literal, Union
+import os
+import re
+import json
+import numpy as np
+from candlelite.io import path as _path
+from candlelite.io import storage as _storage
+from candlelite.io import segment as _segment
+from candlelite.io import trace as _trace
+
+__all__ = [
+    'get_manifest_path',
+    'read_manifest',
+    'update_manifest',
+    'init_manifest',
+    'check_manifest',
+    'check_record',
+    'is_open_record',
+    'get_record',
+    'get_summary_record',
+    'build_manifest',
+    'compact_manifest',
+]
+
+MANIFEST_FILENAME = 'manifest.jsonl'
+ENCODING = 'UTF-8'
+
+# 已经确认存在数据文件的(清单文件路径, 存储格式)
+_FORMAT_FILES_CACHE = set()
+
+# 进程内的清单缓存 {manifest_path: {'ino':..., 'offset':..., 'data': {format: {'init': bool, 'symbols': {}}}}}
+_MANIFEST_CACHE = {}
+
+
+# 清单文件路径
+def get_manifest_path(
+        instType: str,
+        base_dir: str,
+        timezone: str = None,
+        bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = '1m',
+) -> str:
+    '''
+    :param instType: 产品类别
+    :param base_dir: 数据文件夹
+    :param timezone: 时区
+    :param bar: 时间粒度
+    :return: 清单文件路径
+    '''
+    return os.path.join(
+        base_dir,
+        _path._get_date_dirname(instType=instType, timezone=timezone, bar=bar),
+        MANIFEST_FILENAME,
+    )
+
+
+# 将记录合并到解析后的清单中
+def _apply_records(data: dict, records: list) -> None:
+    for record in records:
+        if 'init' in record.keys():
+            data.setdefault(record['init'], {'init': False, 'symbols': {}})['init'] = True
+            continue
+        format_data = data.setdefault(record['format'], {'init': False, 'symbols': {}})
+        symbol_data = format_data['symbols'].setdefault(record['symbol'], {})
+        if record.get('delete'):
+            symbol_data.pop(record['date'], None)
+        else:
+            symbol_data[record['date']] = record
+
+
+# 解析JSON行，忽略并发写入时不完整的末尾行
+def _parse_lines(content: str) -> list:
+    records = []
+    for line in content.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            continue
+    return records
+
+
+# 读取清单全部存储格式的数据（增量解析追加的部分）
+def _read_manifest_data(manifest_path: str) -> dict:
+    try:
+        stat = os.stat(manifest_path)
+    except FileNotFoundError:
+        _MANIFEST_CACHE.pop(manifest_path, None)
+        return {}
+    cache = _MANIFEST_CACHE.get(manifest_path)
+    # 文件被重建（inode变化）或者被截断，重新解析
+    if not cache or cache['ino'] != stat.st_ino or cache['offset'] > stat.st_size:
+        cache = {'ino': stat.st_ino, 'offset': 0, 'data': {}}
+        _MANIFEST_CACHE[manifest_path] = cache
+    if cache['offset'] < stat.st_size:
+        with open(manifest_path, 'rb') as f:
+            f.seek(cache['offset'])
+            content = f.read()
+        # 只解析到最后一个完整行
+        end = content.rfind(b'\n') + 1
+        _apply_records(cache['data'], _parse_lines(content[:end].decode(ENCODING)))
+        cache['offset'] += end
+    return cache['data']
+
+
+# 读取某存储格式的清单
+def read_manifest(
+        instType: str,
+        base_dir: str,
+        timezone: str = None,
+        bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = '1m',
+        format: str = 'csv',
+) -> Union[dict, None]:
+    '''
+    :param instType: 产品类别
+    :param base_dir: 数据文件夹
+    :param timezone: 时区
+    :param bar: 时间粒度
+    :param format: 存储格式
+    :return:
+        {symbol: {date: record}}
+        None    没有清单或者该存储格式的清单未初始化
+    '''
+    manifest_path = get_manifest_path(instType=instType, base_dir=base_dir, timezone=timezone, bar=bar)
+    format_data = _read_manifest_data(manifest_path).get(format)
+    if not format_data or not format_data['init']:
+        return None
+    return format_data['symbols']
+
+
+# 追加记录
+def update_manifest(
+        records: list,
+        instType: str,
+        base_dir: str,
+        timezone: str = None,
+        bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = '1m',
+) -> None:
+    '''
+    :param records: 记录列表
+    :param instType: 产品类别
+    :param base_dir: 数据文件夹
+    :param timezone: 时区
+    :param bar: 时间粒度
+
+    所有记录在一次write中追加，多个进程同时写入时不会交错
+    未初始化的存储格式的文件记录会被跳过（同一批记录中先初始化的除外）
+    '''
+    manifest_path = get_manifest_path(instType=instType, base_dir=base_dir, timezone=timezone, bar=bar)
+    init_formats = set(
+        format for format, format_data in _read_manifest_data(manifest_path).items() if format_data['init']
+    )
+    init_records = []
+    for record in records:
+        if 'init' in record.keys():
+            init_formats.add(record['init'])
+        elif record['format'] not in init_formats:
+            continue
+        init_records.append(record)
+    records = init_records
+    if not records:
+        return None
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    content = ''.join(json.dumps(record) + '\n' for record in records)
+    with _trace.span('manifest') as record:
+        with open(manifest_path, 'a', encoding=ENCODING) as f:
+            f.write(content)
+        if record != None:
+            record['files'] = 1
+            record['bytes'] = len(content.encode(ENCODING))
+            record['rows'] = len(records)
+
+
+# 数据集文件夹中是否有该存储格式的单日文件或者分段，找到第一个文件即返回
+def _has_format_files(dirpath: str, format: str) -> bool:
+    suffix = _storage.get_suffix(format)
+    if not os.path.isdir(dirpath):
+        return False
+    for month_entry in os.scandir(dirpath):
+        if not month_entry.is_dir() or not re.match(r'\d{4}-\d{2}$', month_entry.name):
+            continue
+        for date_entry in os.scandir(month_entry.path):
+            if not date_entry.is_dir():
+                continue
+            for file_entry in os.scandir(date_entry.path):
+                if file_entry.name.endswith(suffix):
+                    return True
+    for key in _segment.get_segment_keys(dirpath):
+        if _segment.get_segment_symbols(dirpath=dirpath, format=format, key=key):
+            return True
+    return False
+
+
+# 数据集中还没有该存储格式的文件时初始化清单，在写入第一个文件之前调用
+def init_manifest(
+        instType: str,
+        base_dir: str,
+        timezone: str = None,
+        bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = '1m',
+        format: str = 'csv',
+) -> list:
+    '''
+    :param instType: 产品类别
+    :param base_dir: 数据文件夹
+    :param timezone: 时区
+    :param bar: 时间粒度
+    :param format: 存储格式
+    :return: 清单是否已经初始化该存储格式，已有文件但未初始化时返回False（需要用build_manifest建立清单）
+
+    初始化记录在写入文件之前追加，其他进程看到新文件时清单已经初始化，它们的文件记录不会被跳过
+    已有文件的结果在进程内缓存，未初始化的数据集每次保存不会重复扫描
+    '''
+    manifest_path = get_manifest_path(instType=instType, base_dir=base_dir, timezone=timezone, bar=bar)
+    format_data = _read_manifest_data(manifest_path).get(format)
+    if format_data and format_data['init']:
+        return True
+    if (manifest_path, format) in _FORMAT_FILES_CACHE:
+        return False
+    if _has_format_files(dirpath=os.path.dirname(manifest_path), format=format):
+        _FORMAT_FILES_CACHE.add((manifest_path, format))
+        return False
+    update_manifest(
+        records=[{'init': format}], instType=instType, base_dir=base_dir, timezone=timezone, bar=bar
+    )
+    return True
+
+
+# 检查单日文件与清单记录是否一致
+def check_manifest(
+        instType: str,
+        base_dir: str,
+        timezone: str = None,
+        bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = '1m',
+        format: str = 'csv',
+        symbols: list = [],
+) -> dict:
+    '''
+    :param instType: 产品类别
+    :param base_dir: 数据文件夹
+    :param timezone: 时区
+    :param bar: 时间粒度
+    :param format: 存储格式
+    :param symbols: 产品名称列表，空列表表示全部
+    :return:
+        {
+            'code': 是否一致,
+            'data': [{'symbol':..., 'date':..., 'path':..., 'reason': 'missing'|'modified'}, ...],
+            'msg': '',
+        }
+
+    逐个比较单日文件的size与mtime（合并到分段中的日期不检查），不一致时需要用build_manifest重建清单
+    '''
+    result = {'code': True, 'data': [], 'msg': ''}
+    manifest = read_manifest(instType=instType, base_dir=base_dir, timezone=timezone, bar=bar, format=format)
+    if manifest == None:
+        result['code'] = False
+        result['msg'] = '清单未初始化'
+        return result
+    for symbol, symbol_dates in sorted(manifest.items()):
+        if symbols and symbol not in symbols:
+            continue
+        for date, record in sorted(symbol_dates.items()):
+            if 'segment' in record.keys():
+                continue
+            path = _path.get_candle_date_path(
+                instType=instType,
+                symbol=symbol,
+                date=date,
+                timezone=timezone,
+                bar=bar,
+                base_dir=base_dir,
+                format=format,
+            )
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                result['data'].append({'symbol': symbol, 'date': date, 'path': path, 'reason': 'missing'})
+                continue
+            if not check_record(record=record, stat=stat):
+                result['data'].append({'symbol': symbol, 'date': date, 'path': path, 'reason': 'modified'})
+    if result['data']:
+        result['code'] = False
+    return result
+
+
+# 文件状态是否与记录一致（文件在库外被修改或替换后不一致），仍在追加写入的日期不比较
+def check_record(record: dict, stat: os.stat_result) -> bool:
+    '''
+    :param record: 文件记录
+    :param stat: 文件状态 os.stat(path)
+    '''
+    if is_open_record(record):
+        return True
+    return stat.st_size == record['size'] and stat.st_mtime == record['mtime']
+
+
+# 是否为仍在追加写入的日期的记录（追加写入并且没有sealed），记录中的行数、时间戳与文件状态可能已经过期
+def is_open_record(record: dict) -> bool:
+    return bool(record.get('append')) and not record.get('sealed')
+
+
+# 根据写入的candle与文件生成记录
+def get_record(
+        candle: np.ndarray,
+        path: str,
+        symbol: str,
+        date: str,
+        format: str,
+) -> dict:
+    '''
+    :param candle: 写入文件的candle
+    :param path: 文件路径
+    :param symbol: 产品名称
+    :param date: 日期 %Y-%m-%d
+    :param format: 存储格式
+    '''
+    rows = int(candle.shape[0])
+    return get_summary_record(
+        path=path,
+        symbol=symbol,
+        date=date,
+        format=format,
+        summary={
+            'rows': rows,
+            'min_ts': float(candle[0, 0]) if rows else None,
+            'max_ts': float(candle[-1, 0]) if rows else None,
+        },
+    )
+
+
+# 根据文件的行数与首尾时间戳生成记录（追加写入时不需要完整的candle）
+def get_summary_record(
+        path: str,
+        symbol: str,
+        date: str,
+        format: str,
+        summary: dict,
+) -> dict:
+    '''
+    :param path: 文件路径
+    :param symbol: 产品名称
+    :param date: 日期 %Y-%m-%d
+    :param format: 存储格式
+    :param summary: {'rows': 行数, 'min_ts': 第一行时间戳, 'max_ts': 最后一行时间戳}
+    '''
+    stat = os.stat(path)
+    return {
+        'symbol': symbol,
+        'date': date,
+        'format': format,
+        'rows': summary['rows'],
+        'min_ts': summary['min_ts'],
+        'max_ts': summary['max_ts'],
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+    }
+
+
+# 扫描数据文件夹，重建某存储格式的清单
+def build_manifest(
+        instType: str,
+        base_dir: str,
+        timezone: str = None,
+        bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = '1m',
+        format: str = 'csv',
+) -> dict:
+    '''
+    :param instType: 产品类别
+    :param base_dir: 数据文件夹
+    :param timezone: 时区
+    :param bar: 时间粒度
+    :param format: 存储格式
+    :return: {symbol: {date: record}}
+
+    其他存储格式的记录会保留，新清单先写入临时文件再替换
+    '''
+    suffix = _storage.get_suffix(format)
+    manifest_path = get_manifest_path(instType=instType, base_dir=base_dir, timezone=timezone, bar=bar)
+    dirpath = os.path.dirname(manifest_path)
+    records = [{'init': format}]
+    if os.path.isdir(dirpath):
+        for month_entry in sorted(os.scandir(dirpath), key=lambda entry: entry.name):
+            if not month_entry.is_dir() or not re.match(r'\d{4}-\d{2}$', month_entry.name):
+                continue
+            for date_entry in sorted(os.scandir(month_entry.path), key=lambda entry: entry.name):
+                if not date_entry.is_dir():
+                    continue
+                for file_entry in sorted(os.scandir(date_entry.path), key=lambda entry: entry.name):
+                    if not file_entry.name.endswith(suffix):
+                        continue
+                    candle = _storage.read_candle(
+                        path=file_entry.path,
+                        format=format,
+                        mmap=format == 'npy',
+                    )
+                    records.append(
+                        get_record(
+                            candle=candle,
+                            path=file_entry.path,
+                            symbol=file_entry.name[:-len(suffix)],
+                            date=date_entry.name,
+                            format=format,
+                        )
+                    )
+    # 合并到分段中的日期，同一天以单日文件为准
+    day_keys = set((record['symbol'], record['date']) for record in records[1:])
+    for key in _segment.get_segment_keys(dirpath):
+        for symbol in sorted(_segment.get_segment_symbols(dirpath=dirpath, format=format, key=key)):
+            index_path = _segment.get_index_path(dirpath=dirpath, symbol=symbol, key=key, format=format)
+            index = _segment.read_index(index_path)
+            path = os.path.join(os.path.dirname(index_path), index['file'])
+            candle = _storage.read_candle(path=path, format=format, mmap=format == 'npy')
+            for date, (start, end) in sorted(index['dates'].items()):
+                if (symbol, date) in day_keys:
+                    continue
+                record = get_record(candle=candle[start:end], path=path, symbol=symbol, date=date, format=format)
+                record['segment'] = os.path.relpath(path, dirpath)
+                records.append(record)
+    # 保留其他存储格式的记录
+    data = _read_manifest_data(manifest_path)
+    other_records = []
+    for other_format, format_data in data.items():
+        if other_format == format:
+            continue
+        if format_data['init']:
+            other_records.append({'init': other_format})
+        for symbol_data in format_data['symbols'].values():
+            other_records += list(symbol_data.values())
+    _write_manifest(manifest_path=manifest_path, records=other_records + records)
+    return read_manifest(instType=instType, base_dir=base_dir, timezone=timezone, bar=bar, format=format)
+
+
+# 写入完整的清单，先写入临时文件再替换
+def _write_manifest(manifest_path: str, records: list) -> None:
+    dirpath = os.path.dirname(manifest_path)
+    if not os.path.isdir(dirpath):
+        os.makedirs(dirpath)
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w', encoding=ENCODING) as f:
+        f.write(''.join(json.dumps(record) + '\n' for record in records))
+        _storage._fsync_file(f)
+    os.replace(tmp_path, manifest_path)
+    _storage._fsync_dir(dirpath)
+
+
+# 压缩清单，每个(format, symbol, date)只保留最后一条记录
+def compact_manifest(
+        instType: str,
+        base_dir: str,
+        timezone: str = None,
+        bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = '1m',
+) -> int:
+    '''
+    :param instType: 产品类别
+    :param base_dir: 数据文件夹
+    :param timezone: 时区
+    :param bar: 时间粒度
+    :return: 压缩后的记录数
+
+    删除记录与被覆盖的记录不再保留，新清单先写入临时文件再替换
+    压缩期间其他进程追加的记录会丢失，应在没有写入时执行
+    '''
+    manifest_path = get_manifest_path(instType=instType, base_dir=base_dir, timezone=timezone, bar=bar)
+    if not os.path.isfile(manifest_path):
+        return 0
+    records = []
+    for format, format_data in _read_manifest_data(manifest_path).items():
+        if format_data['init']:
+            records.append({'init': format})
+        for symbol_data in format_data['symbols'].values():
+            records += list(symbol_data.values())
+    _write_manifest(manifest_path=manifest_path, records=records)
+    return len(records)
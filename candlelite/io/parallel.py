@@ -0,0 +1,66 @@
+'''
+多产品读写的并行方式
+
+P_MODES         支持的并行方式
+check_p_mode    检查并行方式
+thread_worker   在线程池中执行函数
+report_worker   执行函数并以结果字典的形式返回，异常不会抛出
+'''
+
+from concurrent.futures import ThreadPoolExecutor
+import traceback
+from candlelite import exception
+
+__all__ = ['P_MODES', 'check_p_mode', 'thread_worker', 'report_worker']
+
+# 并行方式
+#   process: 多进程，适合解析与验证占用CPU的场景，结果需要序列化传回主进程
+#   thread: 单进程内的线程池，文件读写与解析（释放GIL的部分）并行，没有进程启动与结果序列化的开销
+P_MODES = ['process', 'thread']
+
+
+# 检查并行方式
+def check_p_mode(p_mode: str, func: str) -> None:
+    if p_mode not in P_MODES:
+        raise exception.ParamException(
+            func=func,
+            msg='p_mode={p_mode}, p_mode must in {p_modes}'.format(p_mode=p_mode, p_modes=P_MODES),
+        )
+
+
+# 在线程池中执行函数，结果按照params的顺序返回，出现异常时抛出
+def thread_worker(params: list, p_num: int, func) -> list:
+    with ThreadPoolExecutor(max_workers=p_num) as executor:
+        futures = [executor.submit(func, **param) for param in params]
+        try:
+            return [future.result() for future in futures]
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+
+# 执行函数并以结果字典的形式返回，异常不会抛出（多进程中异常对象不一定能够序列化）
+def report_worker(report_func, **kwargs) -> dict:
+    '''
+    :param report_func: 执行函数
+    :param kwargs: 执行函数的参数
+    :return:
+        {
+            'code': True|False,     # True 执行成功 False 出现异常
+            'data': ...,            # 执行函数的返回值，出现异常时为None
+            'msg': '...',           # 出现异常时记录异常类型与信息
+        }
+    '''
+    try:
+        return {'code': True, 'data': report_func(**kwargs), 'msg': ''}
+    except Exception as e:
+        return {
+            'code': False,
+            'data': None,
+            'msg': '{name}: {error}\n{trace}'.format(
+                name=type(e).__name__,
+                error=e,
+                trace=traceback.format_exc(),
+            ),
+        }
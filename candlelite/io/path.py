@@ -3,13 +3,16 @@ import os
 import re
 import datetime
 from paux import date as _date
-from paux import file as _file
+from candlelite.io import storage as _storage
+from candlelite.io import manifest as _manifest
+from candlelite.io import segment as _segment
 
 __all__ = [
     'get_candle_date_path',  # 获取某一个天candle的路径
     'get_candle_file_path',  # 获取candle文件的地址（一般不以天切割，必须缓存数据与1d数据可以储存在一个文件中）
     'check_candle_date_path',  # 检查candle文件是否存在（不验证数据的准确性）
     'check_candle_file_path',  # 检查candle从start到end日期数据文件是否齐全（仅检查文件是否存在，并不验证文件的准确性）
+    'find_candle_date_segment',  # 查询某一天合并后所在的分段文件与行范围
 ]
 
 
@@ -57,6 +60,7 @@ def get_candle_date_path(
         base_dir: str,
         timezone: str = None,
         bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = '1m',
+        format: str = 'csv',
 ):
     '''
     :param instType: 产品类别
@@ -65,6 +69,7 @@ def get_candle_date_path(
     :param base_dir: 数据文件夹
     :param timezone: 时区
     :param bar: 时间粒度
+    :param format: 存储格式 csv|npy|npc
     :return: 某产品在指定日期的candle数据路径
     '''
     FMT = '%Y-%m-%d'
@@ -74,11 +79,41 @@ def get_candle_date_path(
         _get_date_dirname(instType=instType, timezone=timezone, bar=bar),
         date_str[0:7],
         date_str,
-        '%s.csv' % symbol
+        symbol + _storage.get_suffix(format)
     )
     return filepath
 
 
+# 查询某一天合并后所在的分段文件与行范围（见segment）
+def find_candle_date_segment(
+        instType: str,
+        symbol: str,
+        date: datetime.date,
+        base_dir: str,
+        timezone: str = None,
+        bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = '1m',
+        format: str = 'csv',
+):
+    '''
+    :param instType: 产品类别
+    :param symbol: 产品名称
+    :param date: 日期
+    :param base_dir: 数据文件夹
+    :param timezone: 时区
+    :param bar: 时间粒度
+    :param format: 存储格式 csv|npy|npc
+    :return:
+        {'path': 分段数据文件路径, 'start': 起始行, 'end': 终止行（不包含）}
+        None    这一天没有被合并
+    '''
+    return _segment.find_segment(
+        dirpath=os.path.join(base_dir, _get_date_dirname(instType=instType, timezone=timezone, bar=bar)),
+        symbol=symbol,
+        date=_date.to_fmt(date=date, timezone=timezone, fmt='%Y-%m-%d'),
+        format=format,
+    )
+
+
 # 获取candle文件的地址（一般不以天切割，必须缓存数据与1d数据可以储存在一个文件中）
 def get_candle_file_path(
         instType: str,
@@ -86,6 +121,7 @@ def get_candle_file_path(
         base_dir: str,
         timezone: str = None,
         bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = '1m',
+        format: str = 'csv',
 ):
     '''
     :param instType: 产品类别
@@ -93,13 +129,14 @@ def get_candle_file_path(
     :param base_dir: 数据文件夹
     :param timezone: 时区
     :param bar: 时间粒度
+    :param format: 存储格式 csv|npy|npc
     :return: candle文件的路径
     '''
-    FMT = '{symbol}.csv'
+    FMT = '{symbol}{suffix}'
     filepath = os.path.join(
         base_dir,
         _get_file_dirname(instType=instType, timezone=timezone, bar=bar),
-        FMT.format(symbol=symbol)
+        FMT.format(symbol=symbol, suffix=_storage.get_suffix(format))
     )
     return filepath
 
@@ -111,6 +148,7 @@ def check_candle_file_path(
         base_dir: str,
         timezone: str = None,
         bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = '1m',
+        format: str = 'csv',
 ):
     '''
     :param instType: 产品类别
@@ -118,6 +156,7 @@ def check_candle_file_path(
     :param base_dir: 数据文件夹
     :param timezone: 时区
     :param bar: 时间粒度
+    :param format: 存储格式 csv|npy|npc
     :return:
         True    有文件
         False   无文件
@@ -127,7 +166,8 @@ def check_candle_file_path(
         symbol=symbol,
         base_dir=base_dir,
         timezone=timezone,
-        bar=bar
+        bar=bar,
+        format=format,
     )
     result = {
         'code': os.path.isfile(path),
@@ -146,6 +186,7 @@ def check_candle_date_path(
         base_dir: str = '',
         timezone: str = None,
         bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = '1m',
+        format: str = 'csv',
 ):
     '''
     :param instType: 产品类别
@@ -155,27 +196,48 @@ def check_candle_date_path(
     :param base_dir: 数据文件夹
     :param timezone: 时区
     :param bar: 时间粒度
+    :param format: 存储格式 csv|npy|npc
     :return:
         code:
             True    数据齐全
             False   数据不全
+
+    数据集清单已初始化时只查询清单，否则逐日检查文件是否存在
     '''
     dates = _date.get_range_dates(start=start, end=end, timezone=timezone)
     result = {'code': True, 'data': [], 'msg': ''}  # data保存不存在数据的日期与路径
+    manifest = _manifest.read_manifest(
+        instType=instType, base_dir=base_dir, timezone=timezone, bar=bar, format=format
+    )
+    if manifest != None:
+        symbol_dates = manifest.get(symbol, {})
+    else:
+        has_segment = os.path.isdir(_segment.get_segment_dirpath(
+            os.path.join(base_dir, _get_date_dirname(instType=instType, timezone=timezone, bar=bar))
+        ))
 
     for date in sorted(dates, reverse=True):
+        if manifest != None and date in symbol_dates:
+            continue
         path = get_candle_date_path(
             instType=instType, symbol=symbol, date=date,
-            timezone=timezone, base_dir=base_dir, bar=bar
+            timezone=timezone, base_dir=base_dir, bar=bar, format=format
+        )
+        if manifest == None and os.path.isfile(path):
+            continue
+        # 合并到分段中的日期
+        if manifest == None and has_segment and find_candle_date_segment(
+                instType=instType, symbol=symbol, date=date,
+                timezone=timezone, base_dir=base_dir, bar=bar, format=format
+        ) != None:
+            continue
+        result['code'] = False
+        result['data'].append(
+            {
+                'date': date,
+                'path': path,
+            }
         )
-        if not os.path.isfile(path):
-            result['code'] = False
-            result['data'].append(
-                {
-                    'date': date,
-                    'path': path,
-                }
-            )
     return result
 
 
@@ -188,6 +250,7 @@ def get_candle_dates(
         base_dir: str = '',
         timezone: str = None,
         bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = '1m',
+        format: str = 'csv',
 ):
     '''
     :param instType: 产品类别
@@ -195,10 +258,13 @@ def get_candle_dates(
     :param base_dir: 数据文件夹
     :param timezone: 时区
     :param bar: 时间粒度
+    :param format: 存储格式 csv|npy|npc
     :return:
         code:
             True    数据齐全
             False   数据不全
+
+    数据集清单已初始化时只查询清单，否则扫描文件夹并逐日检查文件是否存在
     '''
     result = {
         'code': True,
@@ -209,6 +275,67 @@ def get_candle_dates(
         },
         'msg': ''
     }
+    manifest = _manifest.read_manifest(
+        instType=instType, base_dir=base_dir, timezone=timezone, bar=bar, format=format
+    )
+    if manifest != None:
+        candle_dates = _get_candle_dates_by_manifest(
+            manifest=manifest, symbol=symbol, start=start, end=end, timezone=timezone
+        )
+    else:
+        candle_dates = _get_candle_dates_by_scan(
+            instType=instType, symbol=symbol, start=start, end=end,
+            base_dir=base_dir, timezone=timezone, bar=bar, format=format,
+        )
+    if candle_dates == None:
+        result['code'] = False
+        result['msg'] = '无数据'
+        return result
+    if candle_dates:
+        result['data']['start'] = candle_dates[0]
+        result['data']['end'] = candle_dates[-1]
+        candle_dates_set = set(candle_dates)
+        range_dates = _date.get_range_dates(start=candle_dates[0], end=candle_dates[-1], timezone=timezone)
+        for range_date in range_dates:
+            if range_date not in candle_dates_set:
+                result['data']['non'].append(range_date)
+                result['code'] = False
+        return result
+    else:
+        return result  # 没有数据，但是code=True start=None，end=None
+
+
+# 通过数据集清单获取start~end中有数据的日期，数据集没有数据返回None
+def _get_candle_dates_by_manifest(
+        manifest: dict,
+        symbol: str,
+        start=None,
+        end=None,
+        timezone: str = None,
+):
+    if not any(manifest.values()):
+        return None
+    FMT = '%Y-%m-%d'
+    start_str = _date.to_fmt(date=start, timezone=timezone, fmt=FMT) if start else None
+    end_str = _date.to_fmt(date=end, timezone=timezone, fmt=FMT) if end else None
+    candle_dates = [
+        date for date in sorted(manifest.get(symbol, {}).keys())
+        if (not start_str or date >= start_str) and (not end_str or date <= end_str)
+    ]
+    return candle_dates
+
+
+# 通过扫描文件夹获取start~end中有数据的日期，数据集没有数据返回None
+def _get_candle_dates_by_scan(
+        instType: str,
+        symbol: str,
+        start=None,
+        end=None,
+        base_dir: str = '',
+        timezone: str = None,
+        bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = '1m',
+        format: str = 'csv',
+):
     # 月份的文件夹地址
     month_dirpath = os.path.join(
         base_dir,
@@ -220,11 +347,11 @@ def get_candle_dates(
         if (os.path.isdir(os.path.join(month_dirpath, fn)))
            and (re.match('\d{4}-\d{2}', fn))
     ]
-    year_months = sorted(year_months)
+    # 合并到分段中的年-月
+    segment_months = _segment.get_segment_months(month_dirpath)
+    year_months = sorted(set(year_months) | set(segment_months))
     if not year_months:
-        result['code'] = False
-        result['msg'] = '无数据'
-        return result
+        return None
     if not start:
         # 起始日期
         start = year_months[0] + '-01'
@@ -242,22 +369,39 @@ def get_candle_dates(
     for date in dates:
         path = get_candle_date_path(
             instType=instType, symbol=symbol, date=date,
-            timezone=timezone, base_dir=base_dir, bar=bar
+            timezone=timezone, base_dir=base_dir, bar=bar, format=format
         )
 
         if os.path.isfile(path):
             candle_dates.append(date)
-    if candle_dates:
-        result['data']['start'] = candle_dates[0]
-        result['data']['end'] = candle_dates[-1]
-        range_dates = _date.get_range_dates(start=candle_dates[0], end=candle_dates[-1], timezone=timezone)
-        for range_date in range_dates:
-            if range_date not in candle_dates:
-                result['data']['non'].append(range_date)
-                result['code'] = False
-        return result
-    else:
-        return result  # 没有数据，但是code=True start=None，end=None
+        elif segment_months and find_candle_date_segment(
+                instType=instType, symbol=symbol, date=date,
+                timezone=timezone, base_dir=base_dir, bar=bar, format=format
+        ) != None:
+            candle_dates.append(date)
+    return candle_dates
+
+
+# 日期文件夹中的产品名称缓存 {date_dirpath: {suffix: (mtime_ns, symbols)}}
+_DATE_SYMBOLS_CACHE = {}
+
+
+# 获取日期文件夹中的产品名称，文件夹未修改时使用缓存
+def _get_date_dir_symbols(date_dirpath: str, suffix: str) -> frozenset:
+    try:
+        mtime_ns = os.stat(date_dirpath).st_mtime_ns
+    except FileNotFoundError:
+        return frozenset()
+    cache = _DATE_SYMBOLS_CACHE.setdefault(date_dirpath, {})
+    if suffix in cache.keys() and cache[suffix][0] == mtime_ns:
+        return cache[suffix][1]
+    with os.scandir(date_dirpath) as entries:
+        symbols = frozenset(
+            entry.name[:-len(suffix)] for entry in entries
+            if entry.name.endswith(suffix)
+        )
+    cache[suffix] = (mtime_ns, symbols)
+    return symbols
 
 
 # 获取全部的产品名称
@@ -266,15 +410,98 @@ def get_symbols_all(
         base_dir: str = '',
         timezone: str = None,
         bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = '1m',
+        format: str = 'csv',
 ):
-    filenames = _file.get_deep_filenames(
-        dirpath=os.path.join(
-            base_dir,
-            _get_date_dirname(instType=instType, timezone=timezone, bar=bar),
-        )
+    '''
+    数据集清单已初始化时只查询清单，否则用os.scandir扫描日期文件夹（未修改的日期文件夹使用缓存）
+    '''
+    manifest = _manifest.read_manifest(
+        instType=instType, base_dir=base_dir, timezone=timezone, bar=bar, format=format
+    )
+    if manifest != None:
+        return sorted(symbol for symbol, symbol_dates in manifest.items() if symbol_dates)
+    month_dirpath = os.path.join(
+        base_dir,
+        _get_date_dirname(instType=instType, timezone=timezone, bar=bar),
+    )
+    suffix = _storage.get_suffix(format)
+    symbols = set()
+    with os.scandir(month_dirpath) as month_entries:
+        for month_entry in month_entries:
+            if not month_entry.is_dir() or not re.match(r'\d{4}-\d{2}$', month_entry.name):
+                continue
+            with os.scandir(month_entry.path) as date_entries:
+                for date_entry in date_entries:
+                    if date_entry.is_dir():
+                        symbols |= _get_date_dir_symbols(date_entry.path, suffix)
+    # 合并到分段中的产品
+    symbols |= _segment.get_segment_symbols(dirpath=month_dirpath, format=format)
+    return sorted(symbols)
+
+
+# 获取start~end日期中每一天都有数据的产品名称
+def get_symbols_by_date(
+        instType: str,
+        start: Union[int, float, str, datetime.date],
+        end: Union[int, float, str, datetime.date],
+        base_dir: str = '',
+        timezone: str = None,
+        bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = '1m',
+        format: str = 'csv',
+        endswith: str = '',
+        contains: str = '',
+) -> list:
+    '''
+    :param instType: 产品类别
+    :param start: 起始日期
+    :param end: 终止日期（包含）
+    :param base_dir: 数据文件夹
+    :param timezone: 时区
+    :param bar: 时间粒度
+    :param format: 存储格式 csv|npy|npc
+    :param endswith: 产品名称需以此结尾
+    :param contains: 产品名称需包含此内容
+    :return: 排序后的产品名称列表
+
+    数据集清单已初始化时只查询清单，否则用os.scandir扫描日期文件夹（未修改的日期文件夹使用缓存）
+    '''
+    dates = _date.get_range_dates(start=start, end=end, timezone=timezone)
+    manifest = _manifest.read_manifest(
+        instType=instType, base_dir=base_dir, timezone=timezone, bar=bar, format=format
+    )
+    if manifest != None:
+        symbols = [
+            symbol for symbol, symbol_dates in manifest.items()
+            if all(date in symbol_dates for date in dates)
+        ]
+    else:
+        suffix = _storage.get_suffix(format)
+        dataset_dirpath = os.path.join(base_dir, _get_date_dirname(instType=instType, timezone=timezone, bar=bar))
+        has_segment = os.path.isdir(_segment.get_segment_dirpath(dataset_dirpath))
+        symbols = None
+        for date in dates:
+            date_dirpath = os.path.dirname(
+                get_candle_date_path(
+                    instType=instType, symbol='', date=date,
+                    timezone=timezone, base_dir=base_dir, bar=bar, format=format
+                )
+            )
+            date_symbols = _get_date_dir_symbols(date_dirpath, suffix)
+            # 合并到分段中的产品
+            if has_segment:
+                date_symbols = date_symbols | _segment.get_segment_symbols(
+                    dirpath=dataset_dirpath,
+                    format=format,
+                    date=_date.to_fmt(date=date, timezone=timezone, fmt='%Y-%m-%d'),
+                )
+            symbols = date_symbols if symbols == None else symbols & date_symbols
+            if not symbols:
+                break
+        symbols = symbols or []
+    return sorted(
+        symbol for symbol in symbols
+        if symbol.endswith(endswith) and contains in symbol
     )
-    filenames = [fn.rsplit('.', maxsplit=1)[0] for fn in list(set(filenames)) if fn.endswith('.csv')]
-    return filenames
 
 
 if __name__ == '__main__':
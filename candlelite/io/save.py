@@ -1,6 +1,5 @@
 import os
 import numpy as np
-import pandas as pd
 import datetime
 from typing import Union, Literal
 from candlelite.calculate import transform as _transform
@@ -9,11 +8,24 @@ from candlelite.calculate import interval as _interval
 from paux import date as _date
 from candlelite import exception
 from candlelite.io import path as _path
+from candlelite.io import storage as _storage
+from candlelite.io import codec as _codec
+from candlelite.io import manifest as _manifest
+from candlelite.io import cache as _cache
+from candlelite.io import parallel as _parallel
+from candlelite.io import trace as _trace
 
-__all__ = ['save_candle_map_by_date', 'save_candle_map_by_file', 'save_candle_by_file', 'save_candle_by_date']
+__all__ = [
+    'save_candle_map_by_date',
+    'save_candle_map_by_file',
+    'save_candle_by_file',
+    'save_candle_by_date',
+    'append_candle_by_date',
+]
 
 
 # 按照日期保存Candle
+@_trace.traced('save_candle_by_date')
 def save_candle_by_date(
         candle: np.array,
         instType: str,
@@ -29,70 +41,294 @@ def save_candle_by_date(
         valid_interval: bool = True,
         valid_start: bool = True,
         valid_end: bool = True,
+        format: str = 'csv',
+        codec_options: dict = None,
+        cache: _cache.CandleCache = None,
 ):
     '''
     边按照日期写入，边进行valid，如果valid报告错误，之前的数据可以成功写入，后面的数据则不会继续写入
+    写入的文件会追加到数据集清单中，并从cache中删除
+    每个文件先写入临时文件再替换，中途失败时不会留下不完整的文件
+    codec_options为npc的写入设置 {'codec', 'level', 'float32'}，None表示默认设置
+    :return: 写入的文件路径列表
     '''
 
     # 去重排序
     if drop_duplicate or sort:
-        candle = _transform.to_candle(candle, drop_duplicate=True, sort=True)
+        with _trace.span('to_candle'):
+            candle = _transform.to_candle(candle, drop_duplicate=True, sort=True)
     # 验证数据
     date_range = _date.get_range_dates(start=start, end=end, timezone=timezone)
-    for date in date_range:
-        # 路径
-        path = _path.get_candle_date_path(
-            instType=instType,
-            symbol=symbol,
-            date=date,
-            bar=bar,
-            timezone=timezone,
-            base_dir=base_dir
-        )
-        # 不覆盖并且有文件，跳过
-        if not replace and os.path.isfile(path):
-            continue
-        start_ts = _date.to_ts(date=date, timezone=timezone)
-        end_ts = _date.tomorrow(date=date, timezone=timezone).timestamp() * 1000 - _interval.get_interval(bar)
-        # end_ts = start_ts + 1000 * 60 * 60 * 24 - _interval.get_interval(bar=bar)
-
-        candle_date = candle[
-            (candle[:, 0] >= start_ts) & (candle[:, 0] <= end_ts)
-            ]
-
-        # 验证interval
-        if valid_interval:
-            valid_interval_result = _valid.valid_interval(candle=candle_date, bar=bar)
-            if not valid_interval_result['code']:
-                raise exception.CandleIntervalError(
+    interval = _interval.get_interval(bar)
+    # 每天的起始时间戳，最后一个元素为终止日期的下一天
+    day_ts = np.array(
+        [_date.to_ts(date=date, timezone=timezone) for date in date_range] +
+        [_date.tomorrow(date=date_range[-1], timezone=timezone).timestamp() * 1000],
+        dtype=np.float64,
+    )
+    start_tss = day_ts[:-1]
+    end_tss = day_ts[1:] - interval
+    # 每天在candle中的行范围，排序后的candle只需要二分查找一次
+    ts = np.asarray(candle[:, 0], dtype=np.float64)
+    if (np.diff(ts) >= 0).all():
+        start_indexes = np.searchsorted(ts, start_tss, side='left')
+        end_indexes = np.searchsorted(ts, end_tss, side='right')
+    else:
+        start_indexes = end_indexes = None
+    # 清单记录，写入失败时已经写入的文件也会被记录
+    manifest_kwargs = dict(instType=instType, base_dir=base_dir, timezone=timezone, bar=bar)
+    records = []
+    paths = []
+    # 数据集中还没有该存储格式的文件时直接初始化清单
+    _manifest.init_manifest(format=format, **manifest_kwargs)
+    try:
+        for i, date in enumerate(date_range):
+            # 路径
+            path = _path.get_candle_date_path(
+                instType=instType,
+                symbol=symbol,
+                date=date,
+                bar=bar,
+                timezone=timezone,
+                base_dir=base_dir,
+                format=format,
+            )
+            # 不覆盖并且有文件（包括合并到分段中的日期），跳过
+            if not replace and (os.path.isfile(path) or _path.find_candle_date_segment(
+                    instType=instType,
                     symbol=symbol,
-                    msg=valid_interval_result['msg']
-                )
-        # 验证start
-        if valid_start:
-            start_ts = _date.to_ts(date=date, timezone=timezone)
-            valid_start_result = _valid.valid_start(candle=candle_date, start=start_ts, timezone=timezone)
-            if not valid_start_result['code']:
-                raise exception.CandleStartError(
+                    date=date,
+                    bar=bar,
+                    timezone=timezone,
+                    base_dir=base_dir,
+                    format=format,
+            ) != None):
+                continue
+            start_ts = start_tss[i]
+            end_ts = end_tss[i]
+            if start_indexes is not None:
+                candle_date = candle[start_indexes[i]:end_indexes[i]]
+            # 没有排序的candle
+            else:
+                candle_date = candle[(ts >= start_ts) & (ts <= end_ts)]
+
+            with _trace.span('valid') as record:
+                if record != None:
+                    record['rows'] = int(candle_date.shape[0])
+                # 验证interval
+                if valid_interval:
+                    valid_interval_result = _valid.valid_interval(candle=candle_date, interval=interval)
+                    if not valid_interval_result['code']:
+                        raise exception.CandleIntervalError(
+                            symbol=symbol,
+                            msg=valid_interval_result['msg']
+                        )
+                # 验证start
+                if valid_start:
+                    valid_start_result = _valid.valid_start(candle=candle_date, start=start_ts, timezone=timezone)
+                    if not valid_start_result['code']:
+                        raise exception.CandleStartError(
+                            symbol=symbol,
+                            msg=valid_start_result['msg'],
+                        )
+                # 验证end
+                if valid_end:
+                    valid_end_result = _valid.valid_end(candle=candle_date, end=end_ts, timezone=timezone)
+                    if not valid_end_result['code']:
+                        raise exception.CandleEndError(
+                            symbol=symbol,
+                            msg=valid_end_result['msg'],
+                        )
+
+            dirpath = os.path.dirname(path)
+            os.makedirs(dirpath, exist_ok=True)
+            _storage.write_candle(candle=candle_date, path=path, format=format, codec_options=codec_options)
+            _cache.invalidate(path=path, cache=cache)
+            paths.append(path)
+            records.append(
+                _manifest.get_record(candle=candle_date, path=path, symbol=symbol, date=date, format=format)
+            )
+    finally:
+        _manifest.update_manifest(records=records, **manifest_kwargs)
+    return paths
+
+
+# 按照日期追加写入Candle（实时采集当天的数据）
+@_trace.traced('append_candle_by_date')
+def append_candle_by_date(
+        candle: np.array,
+        instType: str,
+        symbol: str,
+        base_dir: str,
+        timezone: str = None,
+        bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = '1m',
+        valid_interval: bool = True,
+        valid_start: bool = True,
+        seal: bool = True,
+        fsync: bool = False,
+        format: str = 'csv',
+        codec_options: dict = None,
+        cache: _cache.CandleCache = None,
+) -> dict:
+    '''
+    :param candle: 新的K线数据，可以跨越多个日期
+    :param instType: 产品类型
+    :param symbol: 产品名称
+    :param base_dir: 数据文件夹
+    :param timezone: 时区
+    :param bar: 时间粒度
+    :param valid_interval: 是否验证新数据的时间间隔以及与文件最后一根K线的衔接
+    :param valid_start: 文件不存在时，是否验证新数据从当天的起点开始
+    :param seal: 当天最后一根K线写入后，是否读取整天的数据完整验证一次，并在清单中记录sealed
+    :param fsync: 写入后是否调用os.fsync
+    :param format: 存储格式 csv|npy|npc
+    :param codec_options: 新建npc文件的写入设置 {'codec', 'level', 'float32'}，已有文件沿用原来的设置
+    :param cache: 单日数据缓存，追加的文件会从缓存中删除
+    :return: {date: 追加的行数}
+
+    新数据按照日期分组，每组只读取该日期文件的行数与首尾时间戳，不重写已有的数据
+    时间戳不大于文件最后一根K线的数据视为已经写入，直接跳过，因此已经完整的日期不会再被修改
+    只在新建单日文件与当天数据完整时向清单追加记录，中间的追加不写入清单
+    '''
+    result = {}
+    if not len(candle):
+        return result
+    candle = _transform.to_candle(candle, drop_duplicate=True, sort=True)
+    interval = _interval.get_interval(bar)
+    dates = _date.get_range_dates(start=candle[0, 0], end=candle[-1, 0], timezone=timezone)
+    day_ts = [_date.to_ts(date=date, timezone=timezone) for date in dates]
+    candle_dates = np.split(candle, np.searchsorted(candle[:, 0], day_ts[1:], side='left'))
+    manifest_kwargs = dict(instType=instType, base_dir=base_dir, timezone=timezone, bar=bar)
+    records = []
+    # 数据集中还没有该存储格式的文件时直接初始化清单
+    _manifest.init_manifest(format=format, **manifest_kwargs)
+    try:
+        for date, start_ts, candle_date in zip(dates, day_ts, candle_dates):
+            result[date] = 0
+            path = _path.get_candle_date_path(
+                instType=instType,
+                symbol=symbol,
+                date=date,
+                bar=bar,
+                timezone=timezone,
+                base_dir=base_dir,
+                format=format,
+            )
+            segment = None
+            if not os.path.isfile(path):
+                segment = _path.find_candle_date_segment(
+                    instType=instType,
                     symbol=symbol,
-                    msg=valid_start_result['msg'],
+                    date=date,
+                    bar=bar,
+                    timezone=timezone,
+                    base_dir=base_dir,
+                    format=format,
                 )
-        # 验证end
-        if valid_end:
-            # end_ts = _date.to_ts(date=date, timezone=timezone) + 1000 * 60 * 60 * 24 - _interval.get_interval( bar)
-            end_ts = _date.tomorrow(date=date, timezone=timezone).timestamp() * 1000 - _interval.get_interval(bar)
-            valid_end_result = _valid.valid_end(candle=candle_date, end=end_ts, timezone=timezone)
-            if not valid_end_result['code']:
-                raise exception.CandleEndError(
+                # 合并到分段中的日期先还原为单日文件（沿用分段的写入设置），再追加写入
+                if segment != None:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    _storage.write_candle(
+                        candle=_storage.read_candle(path=segment['path'], format=format)[segment['start']:segment['end']],
+                        path=path,
+                        format=format,
+                        codec_options=_codec.read_options(segment['path']) if format == 'npc' else None,
+                    )
+            # 新建或者从分段还原的单日文件需要写入清单
+            created = segment != None or not os.path.isfile(path)
+            if os.path.isfile(path):
+                summary = _storage.read_summary(path=path, format=format, rows=False)
+            else:
+                summary = {'rows': 0, 'min_ts': None, 'max_ts': None}
+            # 跳过已经写入的数据
+            if summary['max_ts'] != None:
+                candle_date = candle_date[candle_date[:, 0] > summary['max_ts']]
+            if not candle_date.shape[0]:
+                continue
+            # 验证interval，包括与文件最后一根K线的衔接
+            if valid_interval:
+                ts = candle_date[:, 0]
+                if summary['max_ts'] != None:
+                    ts = np.concatenate([[summary['max_ts']], ts])
+                valid_interval_result = _valid.valid_interval(candle=ts.reshape(-1, 1), interval=interval)
+                if not valid_interval_result['code']:
+                    raise exception.CandleIntervalError(
+                        symbol=symbol,
+                        msg=valid_interval_result['msg']
+                    )
+            # 验证start
+            if valid_start and summary['max_ts'] == None:
+                valid_start_result = _valid.valid_start(candle=candle_date, start=start_ts, timezone=timezone)
+                if not valid_start_result['code']:
+                    raise exception.CandleStartError(
+                        symbol=symbol,
+                        msg=valid_start_result['msg'],
+                    )
+            dirpath = os.path.dirname(path)
+            os.makedirs(dirpath, exist_ok=True)
+            _storage.append_candle(
+                candle=candle_date, path=path, format=format, fsync=fsync, codec_options=codec_options
+            )
+            _cache.invalidate(path=path, cache=cache)
+            result[date] = candle_date.shape[0]
+            end_ts = _date.tomorrow(date=date, timezone=timezone).timestamp() * 1000 - interval
+            completed = candle_date[-1, 0] == end_ts
+            # 只在新建单日文件与当天数据完整时写入清单
+            if not created and not completed:
+                continue
+            record = _manifest.get_summary_record(
+                path=path,
+                symbol=symbol,
+                date=date,
+                format=format,
+                summary=_storage.read_summary(path=path, format=format),
+            )
+            record['append'] = True
+            # 当天的数据完整，完整验证一次
+            if seal and completed:
+                _valid_sealed_candle(
+                    candle=_storage.read_candle(path=path, format=format),
                     symbol=symbol,
-                    msg=valid_end_result['msg'],
+                    start_ts=start_ts,
+                    end_ts=end_ts,
+                    timezone=timezone,
+                    bar=bar,
                 )
+                record['sealed'] = True
+            records.append(record)
+    finally:
+        _manifest.update_manifest(records=records, **manifest_kwargs)
+    return result
 
-        dirpath = os.path.dirname(path)
-        if not os.path.isdir(dirpath):
-            os.makedirs(dirpath)
-        df_date = pd.DataFrame(candle_date)
-        df_date.to_csv(path, index=False)
+
+# 完整验证追加写入完成的单日数据
+@_trace.traced('valid')
+def _valid_sealed_candle(
+        candle: np.ndarray,
+        symbol: str,
+        start_ts: Union[int, float],
+        end_ts: Union[int, float],
+        timezone: str,
+        bar: str,
+) -> None:
+    valid_interval_result = _valid.valid_interval(candle=candle, bar=bar)
+    if not valid_interval_result['code']:
+        raise exception.CandleIntervalError(
+            symbol=symbol,
+            msg=valid_interval_result['msg']
+        )
+    valid_start_result = _valid.valid_start(candle=candle, start=start_ts, timezone=timezone)
+    if not valid_start_result['code']:
+        raise exception.CandleStartError(
+            symbol=symbol,
+            msg=valid_start_result['msg'],
+        )
+    valid_end_result = _valid.valid_end(candle=candle, end=end_ts, timezone=timezone)
+    if not valid_end_result['code']:
+        raise exception.CandleEndError(
+            symbol=symbol,
+            msg=valid_end_result['msg'],
+        )
 
 
 # 按照日期保存candle_map
@@ -111,18 +347,31 @@ def save_candle_map_by_date(
         valid_interval: bool = True,
         valid_start: bool = True,
         valid_end: bool = True,
-):
+        format: str = 'csv',
+        codec_options: dict = None,
+        p_num: int = 1,
+        p_mode: Literal['process', 'thread'] = 'process',
+        skip_exception: bool = False,
+        cache: _cache.CandleCache = None,
+) -> dict:
     '''
-    如果写入的时候出现了错误，报错之前写入成功，报错后面的则不能正常写入
+    :param p_num: 并行数量，<=1时顺序写入
+    :param p_mode: 并行方式 process|thread
+    :param skip_exception: 某个产品写入失败时是否继续
+        True    记录在返回结果中，继续写入其他产品
+        False   抛出异常（顺序与线程写入时抛出原异常，线程写入时未开始的产品不再写入；多进程写入完成后抛出ExecuteException）
+    :param cache: 单日数据缓存，写入的文件会从缓存中删除（多进程写入时不使用）
+    :return: {symbol: {'code': True|False, 'data': 写入的文件路径列表, 'msg': 失败原因}}
+
+    每个文件先写入临时文件再替换，某个产品写入失败时，已经写入的文件都是完整的，并且已经记录在数据集清单中
     '''
-    if not symbols:
-        symbols = [symbol for symbol in candle_map.keys()]
-    for symbol in symbols:
-        candle = candle_map[symbol]
-        save_candle_by_date(
+    return _save_map(
+        func=save_candle_by_date,
+        func_name='save_candle_map_by_date',
+        candle_map=candle_map,
+        symbols=symbols,
+        kwargs=dict(
             instType=instType,
-            symbol=symbol,
-            candle=candle,
             start=start,
             end=end,
             bar=bar,
@@ -134,10 +383,67 @@ def save_candle_map_by_date(
             valid_interval=valid_interval,
             valid_start=valid_start,
             valid_end=valid_end,
+            format=format,
+            codec_options=codec_options,
+        ),
+        p_num=p_num,
+        p_mode=p_mode,
+        skip_exception=skip_exception,
+        cache=cache,
+    )
+
+
+# 按照产品写入candle_map，返回每个产品的结果
+def _save_map(
+        func,
+        func_name: str,
+        candle_map: dict,
+        symbols: list,
+        kwargs: dict,
+        p_num: int,
+        p_mode: str,
+        skip_exception: bool,
+        cache: _cache.CandleCache,
+) -> dict:
+    _parallel.check_p_mode(p_mode, func=func_name)
+    if not symbols:
+        symbols = [symbol for symbol in candle_map.keys()]
+    params = [dict(kwargs, symbol=symbol, candle=candle_map[symbol]) for symbol in symbols]
+    if p_num > 1 and p_mode == 'process':
+        results = _trace.pool_worker(
+            params=[dict(param, report_func=func) for param in params],
+            p_num=p_num,
+            func=_parallel.report_worker,
         )
+    # 顺序写入或者线程写入，不跳过异常时直接抛出原异常
+    elif not skip_exception:
+        params = [dict(param, cache=cache) for param in params]
+        if p_num > 1:
+            datas = _parallel.thread_worker(params=params, p_num=p_num, func=func)
+        else:
+            datas = [func(**param) for param in params]
+        results = [{'code': True, 'data': data, 'msg': ''} for data in datas]
+    else:
+        params = [dict(param, cache=cache, report_func=func) for param in params]
+        if p_num > 1:
+            results = _parallel.thread_worker(params=params, p_num=p_num, func=_parallel.report_worker)
+        else:
+            results = [_parallel.report_worker(**param) for param in params]
+    report = {}
+    for symbol, result in zip(symbols, results):
+        # 子进程异常退出，没有返回结果
+        if result == None:
+            result = {'code': False, 'data': None, 'msg': 'no result returned from the worker process'}
+        report[symbol] = result
+    errors = ['{symbol}: {msg}'.format(symbol=symbol, msg=result['msg'])
+              for symbol, result in report.items() if not result['code']]
+    if errors and not skip_exception:
+        raise exception.ExecuteException(func=func_name, msg='\n'.join(errors))
+    return report
 
 
 # 按照文件地址保存Candle
+@_trace.traced('save_candle_by_file')
 def save_candle_by_file(
         candle: np.array,
         instType: str,
@@ -150,6 +456,9 @@ def save_candle_by_file(
         sort=True,
         drop_duplicate=True,
         valid_interval=True,
+        format: str = 'csv',
+        codec_options: dict = None,
+        cache: _cache.CandleCache = None,
 ):
     # 得到路径
     if path == None:
@@ -159,14 +468,18 @@ def save_candle_by_file(
             bar=bar,
             timezone=timezone,
             base_dir=base_dir,
+            format=format,
         )
+    else:
+        format = _storage.get_format(path)
     # 不覆盖并且有文件，跳过
     if not replace and os.path.isfile(path):
         return None
 
     # 验证interval
     if valid_interval:
-        valid_interval_result = _valid.valid_interval(candle=candle, bar=bar)
+        with _trace.span('valid'):
+            valid_interval_result = _valid.valid_interval(candle=candle, bar=bar)
         if not valid_interval_result['code']:
             raise exception.CandleIntervalError(
                 symbol=symbol,
@@ -175,18 +488,19 @@ def save_candle_by_file(
 
     # 排序去重
     if sort or valid_interval:
-        candle = _transform.to_candle(
-            candle=candle,
-            drop_duplicate=drop_duplicate,
-            sort=sort
-        )
+        with _trace.span('to_candle'):
+            candle = _transform.to_candle(
+                candle=candle,
+                drop_duplicate=drop_duplicate,
+                sort=sort
+            )
     # 文件夹与路径
     dirpath = os.path.dirname(path)
-    if not os.path.isdir(dirpath):
-        os.makedirs(dirpath)
-    df = pd.DataFrame(candle)
+    os.makedirs(dirpath, exist_ok=True)
     # 写入文件
-    df.to_csv(path, index=False)
+    _storage.write_candle(candle=candle, path=path, format=format, codec_options=codec_options)
+    _cache.invalidate(path=path, cache=cache)
+    return path
 
 
 # 按照文件地址保存Candle_map
@@ -201,17 +515,27 @@ def save_candle_map_by_file(
         sort: bool = True,
         drop_duplicate: bool = True,
         valid_interval: bool = True,
-):
-    # symbols
-    if not symbols:
-        symbols = [symbol for symbol in candle_map.keys()]
-
-    for symbol in symbols:
-        candle = candle_map[symbol]
-        save_candle_by_file(
-            candle=candle,
+        format: str = 'csv',
+        codec_options: dict = None,
+        p_num: int = 1,
+        p_mode: Literal['process', 'thread'] = 'process',
+        skip_exception: bool = False,
+        cache: _cache.CandleCache = None,
+) -> dict:
+    '''
+    :param p_num: 并行数量，<=1时顺序写入
+    :param p_mode: 并行方式 process|thread
+    :param skip_exception: 某个产品写入失败时是否继续，与save_candle_map_by_date相同
+    :param cache: 单日数据缓存，写入的文件会从缓存中删除（多进程写入时不使用）
+    :return: {symbol: {'code': True|False, 'data': 写入的文件路径（不覆盖已有文件时为None）, 'msg': 失败原因}}
+    '''
+    return _save_map(
+        func=save_candle_by_file,
+        func_name='save_candle_map_by_file',
+        candle_map=candle_map,
+        symbols=symbols,
+        kwargs=dict(
             instType=instType,
-            symbol=symbol,
             path=None,
             base_dir=base_dir,
             timezone=timezone,
@@ -220,4 +544,11 @@ def save_candle_map_by_file(
             sort=sort,
             drop_duplicate=drop_duplicate,
             valid_interval=valid_interval,
-        )
+            format=format,
+            codec_options=codec_options,
+        ),
+        p_num=p_num,
+        p_mode=p_mode,
+        skip_exception=skip_exception,
+        cache=cache,
+    )
@@ -0,0 +1,248 @@
+'''
+以日期为单位存储的数据按月或按年合并后的分段文件
+
+分段文件保存在数据集文件夹的SEGMENT目录下:
+    SEGMENT/年-月/产品名称.后缀.index.json        按月合并的日期索引
+    SEGMENT/年/产品名称.后缀.index.json           按年合并的日期索引
+    SEGMENT/年-月/产品名称.版本.后缀              分段数据，每次合并写入新的版本
+日期索引是分段的入口，记录数据文件的名称与每天的行范围:
+    {"format": "npy", "file": "BTC-USDT.1700000000000000000.npy", "dates": {"2023-01-01": [0, 1440], ...}}
+数据文件写入完成后再原子替换索引，读取方总是读到一致的索引与数据
+替换索引后删除旧版本的数据文件，持有旧索引的读取方打开数据文件失败（FileNotFoundError）时重新读取索引
+
+同一天同时存在单日文件与分段时以单日文件为准（合并之后重新保存的数据）
+
+get_segment_dirpath     分段目录
+get_period_key          日期所属分段的名称
+get_index_path          分段索引的路径
+read_index              读取分段索引（未修改的索引使用缓存）
+find_segment            查询某一天所在的分段与行范围
+get_segment_keys        全部分段的名称
+get_segment_symbols     分段中的产品名称
+get_segment_months      分段覆盖的年-月
+write_segment           写入分段数据与索引
+'''
+
+from typing import Union
+import os
+import re
+import json
+import time
+from candlelite.io import storage as _storage
+from candlelite import exception
+
+__all__ = [
+    'PERIODS',
+    'get_segment_dirpath',
+    'get_period_key',
+    'get_index_path',
+    'read_index',
+    'find_segment',
+    'get_segment_keys',
+    'get_segment_symbols',
+    'get_segment_months',
+    'write_segment',
+]
+
+SEGMENT_DIRNAME = 'SEGMENT'
+INDEX_SUFFIX = '.index.json'
+ENCODING = 'UTF-8'
+# 分段的时间跨度
+PERIODS = ['month', 'year']
+
+# 分段索引缓存 {index_path: ((st_ino, mtime_ns), index)}
+_INDEX_CACHE = {}
+
+
+# 检查分段的时间跨度
+def _check_period(period: str, func: str) -> str:
+    if period not in PERIODS:
+        raise exception.ParamException(
+            func=func,
+            msg='period={period}, period must in {periods}'.format(period=period, periods=PERIODS),
+        )
+    return period
+
+
+# 分段目录
+def get_segment_dirpath(dirpath: str) -> str:
+    '''
+    :param dirpath: 以日期为单位存储的数据集文件夹
+    '''
+    return os.path.join(dirpath, SEGMENT_DIRNAME)
+
+
+# 日期所属分段的名称
+def get_period_key(date: str, period: str = 'month') -> str:
+    '''
+    :param date: 日期 %Y-%m-%d
+    :param period: 分段的时间跨度 month|year
+    :return: 按月为 年-月，按年为 年
+    '''
+    period = _check_period(period, func='get_period_key')
+    return date[0:7] if period == 'month' else date[0:4]
+
+
+# 分段索引的路径
+def get_index_path(dirpath: str, symbol: str, key: str, format: str) -> str:
+    '''
+    :param dirpath: 以日期为单位存储的数据集文件夹
+    :param symbol: 产品名称
+    :param key: 分段的名称
+    :param format: 存储格式
+    '''
+    return os.path.join(get_segment_dirpath(dirpath), key, symbol + _storage.get_suffix(format) + INDEX_SUFFIX)
+
+
+# 读取分段索引，没有索引返回None
+def read_index(index_path: str) -> Union[dict, None]:
+    '''
+    :param index_path: 分段索引的路径
+    :return: {'format': 存储格式, 'file': 数据文件名称, 'dates': {date: [起始行, 终止行]}}
+    '''
+    try:
+        stat = os.stat(index_path)
+    except FileNotFoundError:
+        _INDEX_CACHE.pop(index_path, None)
+        return None
+    # 索引通过替换写入，inode或者mtime变化时重新读取
+    version = (stat.st_ino, stat.st_mtime_ns)
+    cache = _INDEX_CACHE.get(index_path)
+    if cache != None and cache[0] == version:
+        return cache[1]
+    with open(index_path, 'r', encoding=ENCODING) as f:
+        index = json.load(f)
+    _INDEX_CACHE[index_path] = (version, index)
+    return index
+
+
+# 查询某一天所在的分段与行范围
+def find_segment(dirpath: str, symbol: str, date: str, format: str) -> Union[dict, None]:
+    '''
+    :param dirpath: 以日期为单位存储的数据集文件夹
+    :param symbol: 产品名称
+    :param date: 日期 %Y-%m-%d
+    :param format: 存储格式
+    :return:
+        {'path': 分段数据文件路径, 'start': 起始行, 'end': 终止行（不包含）}
+        None    没有合并这一天
+    '''
+    for period in PERIODS:
+        index_path = get_index_path(dirpath=dirpath, symbol=symbol, key=get_period_key(date, period), format=format)
+        index = read_index(index_path)
+        if index != None and date in index['dates']:
+            start, end = index['dates'][date]
+            return {
+                'path': os.path.join(os.path.dirname(index_path), index['file']),
+                'start': start,
+                'end': end,
+            }
+    return None
+
+
+# 全部分段的名称
+def get_segment_keys(dirpath: str) -> list:
+    '''
+    :param dirpath: 以日期为单位存储的数据集文件夹
+    :return: 排序后的分段名称列表（年-月 或者 年）
+    '''
+    segment_dirpath = get_segment_dirpath(dirpath)
+    if not os.path.isdir(segment_dirpath):
+        return []
+    return sorted(key for key in os.listdir(segment_dirpath) if re.match(r'\d{4}(-\d{2})?$', key))
+
+
+# 分段中的产品名称
+def get_segment_symbols(dirpath: str, format: str, date: str = None, key: str = None) -> set:
+    '''
+    :param dirpath: 以日期为单位存储的数据集文件夹
+    :param format: 存储格式
+    :param date: 日期 %Y-%m-%d，只返回分段中包含这一天的产品名称
+    :param key: 分段的名称，只返回这个分段中的产品名称
+    date与key都为None时返回全部分段中的产品名称
+    '''
+    suffix = _storage.get_suffix(format) + INDEX_SUFFIX
+    if key != None:
+        keys = [key]
+    elif date != None:
+        keys = [get_period_key(date, period) for period in PERIODS]
+    else:
+        keys = get_segment_keys(dirpath)
+    symbols = set()
+    for key in keys:
+        key_dirpath = os.path.join(get_segment_dirpath(dirpath), key)
+        if not os.path.isdir(key_dirpath):
+            continue
+        for name in os.listdir(key_dirpath):
+            if not name.endswith(suffix):
+                continue
+            symbol = name[:-len(suffix)]
+            if date == None:
+                symbols.add(symbol)
+                continue
+            index = read_index(os.path.join(key_dirpath, name))
+            if index != None and date in index['dates']:
+                symbols.add(symbol)
+    return symbols
+
+
+# 分段覆盖的年-月
+def get_segment_months(dirpath: str) -> list:
+    '''
+    :param dirpath: 以日期为单位存储的数据集文件夹
+    :return: 排序后的 年-月 列表，按年的分段展开为12个月
+    '''
+    months = set()
+    for key in get_segment_keys(dirpath):
+        if len(key) == 7:
+            months.add(key)
+        else:
+            months |= {'{year}-{month:02d}'.format(year=key, month=month) for month in range(1, 13)}
+    return sorted(months)
+
+
+# 写入分段数据与索引
+def write_segment(
+        candle,
+        dates: dict,
+        dirpath: str,
+        symbol: str,
+        key: str,
+        format: str,
+        codec_options: dict = None,
+) -> str:
+    '''
+    :param candle: 按照日期顺序合并的candle
+    :param dates: 每天的行范围 {date: [起始行, 终止行]}
+    :param dirpath: 以日期为单位存储的数据集文件夹
+    :param symbol: 产品名称
+    :param key: 分段的名称
+    :param format: 存储格式
+    :param codec_options: npc的写入设置，None表示默认设置
+    :return: 分段数据文件路径
+
+    先写入新版本的数据文件，再原子替换索引，最后删除旧版本的数据文件
+    '''
+    index_path = get_index_path(dirpath=dirpath, symbol=symbol, key=key, format=format)
+    key_dirpath = os.path.dirname(index_path)
+    os.makedirs(key_dirpath, exist_ok=True)
+    old_index = read_index(index_path)
+    filename = '{symbol}.{version}{suffix}'.format(
+        symbol=symbol,
+        version=time.time_ns(),
+        suffix=_storage.get_suffix(format),
+    )
+    path = os.path.join(key_dirpath, filename)
+    _storage.write_candle(candle=candle, path=path, format=format, codec_options=codec_options)
+    tmp_path = '{path}.{pid}.tmp'.format(path=index_path, pid=os.getpid())
+    with open(tmp_path, 'w', encoding=ENCODING) as f:
+        json.dump({'format': format, 'file': filename, 'dates': dates}, f)
+        _storage._fsync_file(f)
+    os.replace(tmp_path, index_path)
+    _storage._fsync_dir(key_dirpath)
+    # 持有旧索引的读取方在旧文件不存在时重新读取索引（load._read_date_candle）
+    if old_index != None and old_index['file'] != filename:
+        old_path = os.path.join(key_dirpath, old_index['file'])
+        if os.path.isfile(old_path):
+            os.remove(old_path)
+    return path
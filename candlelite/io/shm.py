@@ -0,0 +1,141 @@
+'''
+多进程读取时通过共享内存传回candle，主进程直接映射为ndarray，不经过序列化复制
+
+子进程把candle写入新建的共享内存块，只返回块的名称、shape与dtype
+主进程映射共享内存块后立即unlink，块的名称从系统中删除，映射在ndarray被回收时关闭
+共享内存块不被resource_tracker跟踪，名称由主进程按照每次调用的前缀与参数序号生成:
+    进程池中途出现异常时，已经完成的子进程的结果没有传回主进程，主进程按照名称释放本次调用的全部共享内存块
+
+multiprocessing.shared_memory需要Python3.8+，只在使用时导入
+Windows的共享内存在最后一个句柄关闭时释放，子进程无法先于主进程关闭，因此在Windows中仍然序列化传回
+
+pool_worker     在进程池中执行读取函数并映射全部结果，出现异常时释放本次调用的全部共享内存块
+worker          在子进程中执行读取函数，结果写入共享内存
+attach          在主进程中将共享内存映射为ndarray
+attach_all      映射全部结果，出现异常时释放剩余的共享内存块
+release         释放没有被映射的共享内存块
+'''
+
+import os
+import uuid
+import weakref
+import numpy as np
+from candlelite.io import trace as _trace
+
+__all__ = ['pool_worker', 'worker', 'attach', 'attach_all', 'release']
+
+
+# 是否为共享内存的描述信息
+def _is_shm_info(result) -> bool:
+    return isinstance(result, dict) and 'shm_name' in result.keys()
+
+
+# 本次调用每个参数对应的共享内存块名称（macOS限制名称不超过30个字符）
+def _get_names(size: int) -> list:
+    prefix = 'cl{token}'.format(token=uuid.uuid4().hex[:12])
+    return ['{prefix}_{i}'.format(prefix=prefix, i=i) for i in range(size)]
+
+
+# 新建不被子进程resource_tracker跟踪的共享内存块，子进程退出时不会被删除
+def _create(size: int, name: str = None):
+    from multiprocessing import shared_memory
+    try:
+        # Python3.13+
+        return shared_memory.SharedMemory(name=name, create=True, size=size, track=False)
+    except TypeError:
+        from multiprocessing import resource_tracker
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+# 在进程池中执行读取函数并映射全部结果，出现异常时释放本次调用的全部共享内存块
+def pool_worker(params: list, p_num: int, shm_func) -> list:
+    '''
+    :param params: 读取函数的参数序列 [dict, dict, ...]
+    :param p_num: 进程数
+    :param shm_func: 读取函数
+    :return: 与params顺序相同的结果，ndarray与共享内存块共用内存
+    '''
+    names = _get_names(len(params))
+    try:
+        results = _trace.pool_worker(
+            params=[dict(param, shm_func=shm_func, shm_name=name) for param, name in zip(params, names)],
+            p_num=p_num,
+            func=worker,
+        )
+        with _trace.span('shm_attach'):
+            return attach_all(results)
+    except BaseException:
+        # 已经映射的共享内存块名称已删除，release跳过
+        release([{'shm_name': name} for name in names])
+        raise
+
+
+# 在子进程中执行读取函数，结果写入共享内存
+def worker(shm_func, shm_name: str = None, **kwargs):
+    '''
+    :param shm_func: 读取函数
+    :param shm_name: 共享内存块名称，None表示随机生成
+    :param kwargs: 读取函数的参数
+    :return:
+        {'shm_name': 共享内存块名称, 'shape': candle.shape, 'dtype': candle.dtype.str}
+        空数据、非数值数组或者Windows中直接返回读取结果
+    '''
+    candle = shm_func(**kwargs)
+    if not isinstance(candle, np.ndarray) or candle.nbytes == 0 or candle.dtype.hasobject or os.name == 'nt':
+        return candle
+    shm = _create(size=candle.nbytes, name=shm_name)
+    try:
+        np.ndarray(candle.shape, dtype=candle.dtype, buffer=shm.buf)[...] = candle
+    except BaseException:
+        shm.close()
+        shm.unlink()
+        raise
+    # 子进程只关闭自己的映射，由主进程unlink
+    shm.close()
+    return {'shm_name': shm.name, 'shape': candle.shape, 'dtype': candle.dtype.str}
+
+
+# 在主进程中将共享内存映射为ndarray
+def attach(result):
+    '''
+    :param result: worker的返回结果
+    :return: 与共享内存块共用内存的ndarray，不是共享内存的结果原样返回
+    '''
+    if not _is_shm_info(result):
+        return result
+    from multiprocessing import shared_memory
+    shm = shared_memory.SharedMemory(name=result['shm_name'])
+    # 映射已经建立，删除名称后其他进程无法再打开，内存在映射关闭后归还系统
+    shm.unlink()
+    candle = np.ndarray(result['shape'], dtype=np.dtype(result['dtype']), buffer=shm.buf)
+    # ndarray被回收后关闭映射
+    weakref.finalize(candle, shm.close)
+    return candle
+
+
+# 映射全部结果，出现异常时释放剩余的共享内存块
+def attach_all(results: list) -> list:
+    candles = []
+    try:
+        for result in results:
+            candles.append(attach(result))
+    except BaseException:
+        release(results[len(candles):])
+        raise
+    return candles
+
+
+# 释放没有被映射的共享内存块（主进程出现异常时调用）
+def release(results: list) -> None:
+    from multiprocessing import shared_memory
+    for result in results:
+        if not _is_shm_info(result):
+            continue
+        try:
+            shm = shared_memory.SharedMemory(name=result['shm_name'])
+        except FileNotFoundError:
+            continue
+        shm.close()
+        shm.unlink()
@@ -0,0 +1,536 @@
+'''
+FORMATS         支持的存储格式
+get_suffix      存储格式对应的文件后缀
+get_format      根据文件路径推断存储格式
+read_candle     按照存储格式读取candle文件
+read_candles    按照存储格式批量读取多个candle文件
+write_candle    按照存储格式写入candle文件
+read_summary    读取文件的行数与首尾时间戳，不解析全部数据
+append_candle   在文件末尾追加candle
+set_csv_options 设置csv的读取引擎与写入格式
+get_csv_options 当前csv的读取引擎与写入格式
+'''
+
+from typing import Union
+import io
+import os
+import threading
+import numpy as np
+import pandas as pd
+from candlelite.io import codec as _codec
+from candlelite.io import trace as _trace
+from candlelite import exception
+
+__all__ = [
+    'FORMATS',
+    'CSV_ENGINES',
+    'get_suffix',
+    'get_format',
+    'read_candle',
+    'read_candles',
+    'write_candle',
+    'read_summary',
+    'append_candle',
+    'set_csv_options',
+    'get_csv_options',
+]
+
+# 支持的存储格式
+#   csv: 文本格式，兼容历史数据
+#   npy: numpy二进制格式，float64定长，文件头记录shape与dtype
+#   npc: 压缩的二进制格式，时间戳差值编码，压缩算法与精度记录在文件头中（见codec）
+FORMATS = ['csv', 'npy', 'npc']
+
+# csv读取引擎
+#   auto:    安装了pyarrow时使用pyarrow，否则使用c
+#   c:       pandas的c引擎
+#   pyarrow: pyarrow.csv（需要安装pyarrow）
+CSV_ENGINES = ['auto', 'c', 'pyarrow']
+
+# csv的读取引擎与写入格式
+#   engine:       读取引擎
+#   float_format: 写入浮点数的格式，None表示与repr相同的最短精确表示，例如'%.8f'表示固定8位小数（有精度损失）
+_CSV_OPTIONS = {'engine': 'auto', 'float_format': None}
+# 每次格式化写入的最大行数
+CSV_WRITE_ROWS = 100000
+
+
+# 检查存储格式
+def _check_format(format: str, func: str) -> str:
+    format = format.lower()
+    if format not in FORMATS:
+        raise exception.ParamException(
+            func=func,
+            msg='format={format}, format must in {formats}'.format(format=format, formats=FORMATS)
+        )
+    return format
+
+
+# 存储格式对应的文件后缀
+def get_suffix(format: str = 'csv') -> str:
+    '''
+    :param format: 存储格式
+    :return: 文件后缀，例如 .csv
+    '''
+    format = _check_format(format, func='get_suffix')
+    return '.' + format
+
+
+# 根据文件路径推断存储格式
+def get_format(path: str) -> str:
+    '''
+    :param path: 文件路径
+    :return: 存储格式
+    '''
+    format = os.path.splitext(path)[1][1:]
+    return _check_format(format, func='get_format')
+
+
+# 按照存储格式读取candle文件
+def read_candle(
+        path: str,
+        format: str = None,
+        mmap: bool = False,
+        columns: list = None,
+        rows: tuple = None,
+) -> np.ndarray:
+    '''
+    :param path: 文件路径
+    :param format: 存储格式，None表示根据文件后缀推断
+    :param mmap: 是否以只读内存映射的方式读取（仅支持npy格式）
+        True    返回np.memmap，多个进程读取同一文件时共享操作系统的页缓存
+        False   读取到新的内存中
+    :param columns: 读取的列（非负整数，按照升序），None表示全部
+        csv通过usecols只解析这些列，npy通过内存映射只复制这些列，npc解压后只解码这些列，返回的数组不是内存映射
+    :param rows: 读取的行范围(start, end)，None表示全部
+        csv跳过start之前的行并在end处停止解析，npy通过内存映射只复制这些行，npc解压后只解码这些行
+    :return: 未经过去重排序的candle
+    '''
+    if format == None:
+        format = get_format(path)
+    format = _check_format(format, func='read_candle')
+    if mmap and format != 'npy':
+        raise exception.ParamException(
+            func='read_candle',
+            msg='mmap is not supported for format={format}'.format(format=format),
+        )
+    with _trace.span('read') as record:
+        if format == 'csv':
+            candle = _get_csv_reader(columns=columns, rows=rows)(path)
+        elif format == 'npc':
+            with open(path, 'rb') as f:
+                candle = _codec.decode(f.read(), columns=columns, rows=rows)
+        elif rows != None:
+            candle = np.load(path, mmap_mode='r', allow_pickle=False)[slice(*rows)]
+            if columns != None:
+                candle = np.array(candle[:, columns])
+            elif not mmap:
+                candle = np.array(candle)
+        elif columns != None:
+            candle = np.array(np.load(path, mmap_mode='r', allow_pickle=False)[:, columns])
+        else:
+            candle = np.load(path, mmap_mode='r' if mmap else None, allow_pickle=False)
+        if record != None:
+            _record_file(record=record, path=path, candle=candle)
+    return candle
+
+
+# 记录读写一个文件的文件数量、字节数与行数
+def _record_file(record: dict, path: str, candle: np.ndarray) -> None:
+    record['files'] += 1
+    record['bytes'] += os.path.getsize(path)
+    record['rows'] += int(candle.shape[0])
+
+
+# 按照存储格式批量读取多个candle文件
+def read_candles(paths: list, format: str = None, mmap: bool = False, columns: list = None) -> list:
+    '''
+    :param paths: 文件路径列表
+    :param format: 存储格式，None表示根据第一个文件的后缀推断
+    :param mmap: 是否以只读内存映射的方式读取（仅支持npy格式）
+    :param columns: 读取的列（非负整数，按照升序），None表示全部
+    :return: 与paths顺序相同的candle列表
+
+    多个csv文件共用一次读取引擎与解析参数的设置
+    '''
+    if not paths:
+        return []
+    if format == None:
+        format = get_format(paths[0])
+    format = _check_format(format, func='read_candles')
+    if format == 'csv' and not mmap:
+        reader = _get_csv_reader(columns=columns)
+        candles = []
+        for path in paths:
+            with _trace.span('read') as record:
+                candles.append(reader(path))
+                if record != None:
+                    _record_file(record=record, path=path, candle=candles[-1])
+        return candles
+    return [read_candle(path=path, format=format, mmap=mmap, columns=columns) for path in paths]
+
+
+# 设置csv的读取引擎与写入格式
+def set_csv_options(engine: str = None, float_format: str = '') -> None:
+    '''
+    :param engine: 读取引擎 auto|c|pyarrow，None表示不修改
+    :param float_format: 写入浮点数的格式，例如'%.8f'，None表示最短精确表示，空字符串表示不修改
+    '''
+    if engine != None:
+        if engine not in CSV_ENGINES:
+            raise exception.ParamException(
+                func='set_csv_options',
+                msg='engine={engine}, engine must in {engines}'.format(engine=engine, engines=CSV_ENGINES)
+            )
+        if engine == 'pyarrow' and _import_pyarrow_csv() == None:
+            raise exception.ParamException(
+                func='set_csv_options',
+                msg='engine=pyarrow, pyarrow is not installed',
+            )
+        _CSV_OPTIONS['engine'] = engine
+    if float_format != '':
+        if float_format != None:
+            # 提前验证格式
+            float_format % 1.0
+        _CSV_OPTIONS['float_format'] = float_format
+
+
+# 当前csv的读取引擎与写入格式
+def get_csv_options() -> dict:
+    '''
+    :return: {'engine': 读取引擎, 'float_format': 写入浮点数的格式}
+    '''
+    return dict(_CSV_OPTIONS)
+
+
+# 导入pyarrow.csv，没有安装时返回None
+def _import_pyarrow_csv():
+    try:
+        from pyarrow import csv as pa_csv
+    except ImportError:
+        return None
+    return pa_csv
+
+
+# 读取csv文件的表头
+def _read_csv_header(path: str) -> list:
+    with open(path, 'r', encoding='UTF-8') as f:
+        return f.readline().rstrip('\r\n').split(',')
+
+
+# 生成csv读取函数，解析参数只设置一次，全部列按照float64解析
+def _get_csv_reader(columns: list = None, rows: tuple = None):
+    '''
+    :param columns: 读取的列（非负整数，按照升序），None表示全部
+    :param rows: 读取的行范围(start, end)，None表示全部
+    :return: reader(path) -> candle
+
+    显式的float64类型无法解析的文件（历史数据中的非数值列）回退到pandas的类型推断
+    '''
+    engine = _CSV_OPTIONS['engine']
+    pa_csv = _import_pyarrow_csv() if engine != 'c' else None
+    # 跳过表头之后start之前的行，只解析end-start行
+    row_kwargs = {}
+    if rows != None:
+        start, end = rows
+        row_kwargs = {'skiprows': range(1, start + 1), 'nrows': max(end - start, 0)}
+
+    def read_infer(path: str) -> np.ndarray:
+        return pd.read_csv(path, usecols=columns, **row_kwargs).to_numpy()
+
+    if pa_csv == None or rows != None:
+        def reader(path: str) -> np.ndarray:
+            try:
+                return pd.read_csv(path, usecols=columns, dtype=np.float64, engine='c', **row_kwargs).to_numpy()
+            except ValueError:
+                return read_infer(path)
+
+        return reader
+
+    import pyarrow as pa
+    # 相同表头共用解析参数
+    convert_options = {}
+
+    def reader(path: str) -> np.ndarray:
+        header = tuple(_read_csv_header(path))
+        if header not in convert_options.keys():
+            names = list(header) if columns == None else [header[column] for column in columns]
+            convert_options[header] = pa_csv.ConvertOptions(
+                column_types={name: pa.float64() for name in names},
+                include_columns=names,
+            )
+        try:
+            table = pa_csv.read_csv(path, convert_options=convert_options[header])
+        except ValueError:
+            return read_infer(path)
+        if not table.num_columns:
+            return np.zeros((table.num_rows, 0), dtype=np.float64)
+        return np.column_stack([table.column(i).to_numpy() for i in range(table.num_columns)])
+
+    return reader
+
+
+# 将candle格式化为csv文本行（不包括表头），与DataFrame.to_csv的输出相同
+def _iter_csv_lines(candle: np.ndarray):
+    '''
+    float_format为None时浮点数使用repr，与DataFrame.to_csv的默认输出相同
+    每次格式化CSV_WRITE_ROWS行，不经过DataFrame
+    '''
+    if candle.dtype.kind in 'iu':
+        value_format = '%d'
+    else:
+        value_format = _CSV_OPTIONS['float_format'] or '%r'
+    line_format = ','.join([value_format] * candle.shape[1]) + '\n'
+    for i in range(0, candle.shape[0], CSV_WRITE_ROWS):
+        part = candle[i:i + CSV_WRITE_ROWS]
+        yield (line_format * part.shape[0]) % tuple(part.ravel().tolist())
+
+
+# 写入csv文件，包含nan或者非数值的数据使用DataFrame.to_csv
+def _write_csv(candle: np.ndarray, f, header: bool) -> None:
+    candle = np.asarray(candle)
+    if candle.ndim != 2 or candle.dtype.kind not in 'iuf' or (candle.dtype.kind == 'f' and np.isnan(candle).any()):
+        pd.DataFrame(candle).to_csv(f, header=header, index=False, float_format=_CSV_OPTIONS['float_format'])
+        return None
+    if header:
+        f.write(','.join(str(i) for i in range(candle.shape[1])) + '\n')
+    for content in _iter_csv_lines(candle):
+        f.write(content)
+
+
+# 将已写入的文件内容落盘
+def _fsync_file(f) -> None:
+    f.flush()
+    os.fsync(f.fileno())
+
+
+# 将文件夹的目录项落盘，替换文件后调用，保证断电后替换仍然有效（不支持打开文件夹的系统跳过）
+def _fsync_dir(dirpath: str) -> None:
+    try:
+        fd = os.open(dirpath or '.', os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+# 按照存储格式写入candle文件
+def write_candle(candle: np.ndarray, path: str, format: str = None, codec_options: dict = None) -> None:
+    '''
+    :param candle: 历史K线数据
+    :param path: 文件路径
+    :param format: 存储格式，None表示根据文件后缀推断
+    :param codec_options: npc的写入设置 {'codec', 'level', 'float32'}，None表示默认设置（见codec）
+
+    写入是原子的: 文件要么是原来的内容，要么是完整的新内容
+    临时文件落盘后再替换，替换后目录项落盘，断电后同样不会留下空文件或者半个文件
+    '''
+    if format == None:
+        format = get_format(path)
+    format = _check_format(format, func='write_candle')
+    # 先写入同一文件夹下的临时文件再替换，写入中途失败时原文件保持不变，读取方不会读到一半的文件
+    tmp_path = '{path}.{pid}.{tid}.tmp'.format(path=path, pid=os.getpid(), tid=threading.get_ident())
+    with _trace.span('write') as record:
+        try:
+            if format == 'csv':
+                with open(tmp_path, 'w', newline='') as f:
+                    _write_csv(candle=candle, f=f, header=True)
+                    _fsync_file(f)
+            elif format == 'npc':
+                with open(tmp_path, 'wb') as f:
+                    f.write(_codec.encode(candle, options=codec_options))
+                    _fsync_file(f)
+            else:
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, np.ascontiguousarray(candle, dtype=np.float64), allow_pickle=False)
+                    _fsync_file(f)
+            os.replace(tmp_path, path)
+            _fsync_dir(os.path.dirname(path))
+        except BaseException:
+            if os.path.isfile(tmp_path):
+                os.remove(tmp_path)
+            raise
+        if record != None:
+            _record_file(record=record, path=path, candle=candle)
+
+
+# 读取文件的行数与首尾时间戳，不解析全部数据
+def read_summary(path: str, format: str = None, rows: bool = True) -> dict:
+    '''
+    :param path: 文件路径
+    :param format: 存储格式，None表示根据文件后缀推断
+    :param rows: 是否统计行数，False时csv文件只读取第一行数据与文件末尾，rows为None
+    :return: {'rows': 行数, 'min_ts': 第一行时间戳, 'max_ts': 最后一行时间戳}，没有数据时时间戳为None
+    '''
+    if format == None:
+        format = get_format(path)
+    format = _check_format(format, func='read_summary')
+    if format == 'csv':
+        return _read_csv_summary(path=path, rows=rows)
+    elif format == 'npc':
+        # 文件头记录了行数与首尾时间戳，不需要解压
+        header = _codec.read_header(path)
+        return {'rows': header['shape'][0], 'min_ts': header['min_ts'], 'max_ts': header['max_ts']}
+    else:
+        candle = np.load(path, mmap_mode='r', allow_pickle=False)
+        if candle.ndim != 2 or not candle.shape[0]:
+            return {'rows': 0, 'min_ts': None, 'max_ts': None}
+        return {
+            'rows': int(candle.shape[0]),
+            'min_ts': float(candle[0, 0]),
+            'max_ts': float(candle[-1, 0]),
+        }
+
+
+# 从文件末尾按块向前查找，返回最后一个非空行，没有找到返回None
+def _read_last_line(f, start: int, block_size: int = 4096) -> Union[bytes, None]:
+    end = f.seek(0, os.SEEK_END)
+    tail = b''
+    while end > start:
+        offset = max(start, end - block_size)
+        f.seek(offset)
+        tail = f.read(end - offset) + tail
+        end = offset
+        lines = tail.rstrip(b'\r\n').rsplit(b'\n', 1)
+        # 找到完整的最后一行（前面还有换行，或者已经到达起点）
+        if len(lines) == 2 or end <= start:
+            return lines[-1].rstrip(b'\r') or None
+    return None
+
+
+# csv文件的首尾时间戳只读取第一行数据与文件末尾，行数按块统计换行符
+def _read_csv_summary(path: str, rows: bool) -> dict:
+    with open(path, 'rb') as f:
+        # 第一行为表头
+        header = f.readline()
+        first = f.readline()
+        if not header.endswith(b'\n') or not first.strip():
+            return _read_csv_summary_full(path)
+        data_start = len(header)
+        last = _read_last_line(f, start=data_start)
+        count = None
+        if rows:
+            f.seek(data_start)
+            count = 0
+            content = b''
+            while True:
+                block = f.read(1024 * 1024)
+                if not block:
+                    break
+                # 空行，完整解析
+                if b'\n\n' in block or (content.endswith(b'\n') and block.startswith(b'\n')):
+                    return _read_csv_summary_full(path)
+                content = block
+                count += block.count(b'\n')
+            # 最后一行没有换行符
+            if content and not content.endswith(b'\n'):
+                count += 1
+    try:
+        return {
+            'rows': count,
+            'min_ts': float(first.split(b',', 1)[0]),
+            'max_ts': float(last.split(b',', 1)[0]),
+        }
+    # 格式不正确（例如空行），完整解析
+    except (ValueError, AttributeError):
+        return _read_csv_summary_full(path)
+
+
+# 完整读取csv文件统计行数与首尾时间戳
+def _read_csv_summary_full(path: str) -> dict:
+    with open(path, 'rb') as f:
+        content = f.read()
+    lines = [line for line in content.split(b'\n')[1:] if line.strip()]
+    if not lines:
+        return {'rows': 0, 'min_ts': None, 'max_ts': None}
+    return {
+        'rows': len(lines),
+        'min_ts': float(lines[0].split(b',', 1)[0]),
+        'max_ts': float(lines[-1].split(b',', 1)[0]),
+    }
+
+
+# 在npy文件末尾追加数据并原地修改文件头中的shape，文件头长度变化时返回False
+def _append_npy(candle: np.ndarray, path: str, fsync: bool) -> bool:
+    with open(path, 'r+b') as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+        if fortran_order or dtype != np.float64 or len(shape) != 2 or shape[1] != candle.shape[1]:
+            return False
+        header = io.BytesIO()
+        header_data = {
+            'descr': np.lib.format.dtype_to_descr(dtype),
+            'fortran_order': False,
+            'shape': (shape[0] + candle.shape[0], shape[1]),
+        }
+        if version == (1, 0):
+            np.lib.format.write_array_header_1_0(header, header_data)
+        else:
+            np.lib.format.write_array_header_2_0(header, header_data)
+        if header.tell() != offset:
+            return False
+        # 先写入数据再修改shape，中途失败时文件仍然是追加前的数据
+        f.seek(offset + shape[0] * shape[1] * dtype.itemsize)
+        f.write(np.ascontiguousarray(candle, dtype=np.float64).tobytes())
+        f.truncate()
+        f.flush()
+        if fsync:
+            os.fsync(f.fileno())
+        f.seek(0)
+        f.write(header.getvalue())
+        f.flush()
+        if fsync:
+            os.fsync(f.fileno())
+    return True
+
+
+# 在文件末尾追加candle，文件不存在时新建
+def append_candle(
+        candle: np.ndarray,
+        path: str,
+        format: str = None,
+        fsync: bool = False,
+        codec_options: dict = None,
+) -> None:
+    '''
+    :param candle: 追加的历史K线数据
+    :param path: 文件路径
+    :param format: 存储格式，None表示根据文件后缀推断
+    :param fsync: 写入后是否调用os.fsync，保证数据落盘
+    :param codec_options: 新建npc文件的写入设置，已有的npc文件沿用文件头中的压缩算法与dtype
+    '''
+    if format == None:
+        format = get_format(path)
+    format = _check_format(format, func='append_candle')
+    if format in ['csv', 'npy'] and os.path.isfile(path):
+        with _trace.span('append') as record:
+            size = os.path.getsize(path) if record != None else 0
+            if format == 'csv':
+                with open(path, 'a', newline='') as f:
+                    _write_csv(candle=candle, f=f, header=False)
+                    f.flush()
+                    if fsync:
+                        os.fsync(f.fileno())
+                appended = True
+            else:
+                appended = _append_npy(candle=candle, path=path, fsync=fsync)
+            if record != None and appended:
+                _record_file(record=record, path=path, candle=candle)
+                record['bytes'] -= size
+        if appended:
+            return None
+    # 新文件、npc文件，或者npy文件头长度变化时重写整个文件
+    if os.path.isfile(path):
+        if format == 'npc':
+            codec_options = _codec.read_options(path)
+        candle = np.concatenate([read_candle(path=path, format=format), candle])
+    # 重写的文件总是落盘（见write_candle）
+    write_candle(candle=candle, path=path, format=format, codec_options=codec_options)
@@ -0,0 +1,428 @@
+'''
+生成模拟的K线数据集，用于压力测试与验证测试
+
+数据为随机游走的OHLCV，通过save_candle_by_date与save_candle_by_file写入，目录结构与真实数据集相同
+相同的参数生成相同的数据，可以作为测试的固定数据
+
+以日期为单位生成时，每个产品的日期范围按chunk_days切分为多个任务并行生成与写入，内存只占用一个分块
+分块之间的价格通过布朗桥连接，每个分块的起止价格预先确定，分块可以独立生成而价格保持连续
+
+make_symbols            模拟的产品名称
+make_candle             生成随机游走的candle
+make_candle_by_date     生成以日期为单位存储的数据集
+make_candle_by_file     生成以文件为单位存储的数据集
+'''
+
+from typing import Union, Literal
+import os
+import zlib
+import datetime
+import numpy as np
+from paux import date as _date
+from paux import process as _process
+from candlelite.calculate import interval as _interval
+from candlelite import exception
+from candlelite.io import save as _save
+from candlelite.io import manifest as _manifest
+from candlelite.io import parallel as _parallel
+
+__all__ = [
+    'make_symbols',
+    'make_candle',
+    'make_candle_by_date',
+    'make_candle_by_file',
+]
+
+
+# 模拟的产品名称
+def make_symbols(n: int, quote: str = 'USDT') -> list:
+    '''
+    :param n: 产品数量
+    :param quote: 计价货币
+    :return: ['S0000-USDT', 'S0001-USDT', ...]
+    '''
+    return ['S{i:04d}-{quote}'.format(i=i, quote=quote) for i in range(n)]
+
+
+# 产品的随机数种子
+def _get_symbol_seed(symbol: str, seed: int) -> list:
+    return [seed, zlib.crc32(symbol.encode('UTF-8'))]
+
+
+# 日期范围的起止时间戳 [start_ts, end_ts)
+def _get_range_ts(start, end, timezone: str) -> tuple:
+    start_ts = _date.to_ts(date=start, timezone=timezone)
+    end_ts = _date.tomorrow(date=end, timezone=timezone).timestamp() * 1000
+    return start_ts, end_ts
+
+
+# 生成随机游走的candle
+def make_candle(
+        start: Union[int, float, str, datetime.date],
+        end: Union[int, float, str, datetime.date],
+        bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = '1m',
+        timezone: str = None,
+        seed: Union[int, list] = 0,
+        price: float = 100.0,
+        end_price: float = None,
+        volatility: float = 1e-3,
+        gap_rate: float = 0.0,
+        duplicate_rate: float = 0.0,
+) -> np.ndarray:
+    '''
+    :param start: 起始日期
+    :param end: 终止日期（包含）
+    :param bar: 时间粒度
+    :param timezone: 时区
+    :param seed: 随机数种子
+    :param price: 起始价格（第一根K线的开盘价）
+    :param end_price: 最后一根K线的收盘价，None表示不限制
+    :param volatility: 每根K线收盘价对数收益率的标准差
+    :param gap_rate: 每根K线被删除的概率（模拟缺失的数据）
+    :param duplicate_rate: 每根K线重复一次的概率（重复的行紧跟在原行之后，时间戳仍然有序）
+    :return: [ts, open, high, low, close, volume]
+    '''
+    interval = _interval.get_interval(bar)
+    start_ts, end_ts = _get_range_ts(start=start, end=end, timezone=timezone)
+    ts = np.arange(start_ts, end_ts, interval, dtype=np.float64)
+    rows = ts.shape[0]
+    rng = np.random.default_rng(seed)
+    walk = np.cumsum(rng.normal(scale=volatility, size=rows))
+    # 布朗桥：线性修正使最后的收盘价等于end_price
+    if end_price != None and rows:
+        walk += np.arange(1, rows + 1) / rows * (np.log(end_price / price) - walk[-1])
+    close = price * np.exp(walk)
+    open = np.empty(rows, dtype=np.float64)
+    open[:1] = price
+    open[1:] = close[:-1]
+    spread = np.abs(rng.normal(scale=volatility, size=rows)) * close
+    high = np.maximum(open, close) + spread
+    low = np.minimum(open, close) - spread
+    volume = rng.gamma(2.0, 50.0, size=rows)
+    candle = np.column_stack([ts, open, high, low, close, volume])
+    if gap_rate > 0:
+        candle = candle[rng.random(rows) >= gap_rate]
+    if duplicate_rate > 0:
+        candle = np.repeat(candle, np.where(rng.random(candle.shape[0]) < duplicate_rate, 2, 1), axis=0)
+    return candle
+
+
+# 将日期范围切分为分块，并确定每个分块的起止价格
+def _get_chunks(
+        symbol: str,
+        start,
+        end,
+        timezone: str,
+        bar: str,
+        seed: int,
+        price: float,
+        volatility: float,
+        chunk_days: int,
+) -> list:
+    dates = _date.get_range_dates(start=start, end=end, timezone=timezone)
+    chunk_days = max(int(chunk_days), 1)
+    interval = _interval.get_interval(bar)
+    chunks = [(dates[i], dates[min(i + chunk_days, len(dates)) - 1]) for i in range(0, len(dates), chunk_days)]
+    # 每个分块的K线数量
+    rows = []
+    for chunk_start, chunk_end in chunks:
+        start_ts, end_ts = _get_range_ts(start=chunk_start, end=chunk_end, timezone=timezone)
+        rows.append((end_ts - start_ts) / interval)
+    # 分块之间的对数价格变化与分块内的随机游走同分布
+    rng = np.random.default_rng(_get_symbol_seed(symbol, seed) + [0])
+    walk = np.concatenate([[0.0], np.cumsum(rng.normal(size=len(chunks)) * volatility * np.sqrt(rows))])
+    prices = price * np.exp(walk)
+    return [
+        {
+            'start': chunk_start,
+            'end': chunk_end,
+            'seed': _get_symbol_seed(symbol, seed) + [i + 1],
+            'price': float(prices[i]),
+            'end_price': float(prices[i + 1]),
+        }
+        for i, (chunk_start, chunk_end) in enumerate(chunks)
+    ]
+
+
+# 生成并写入一个产品的一个分块
+def _make_date_chunk(
+        instType: str,
+        symbol: str,
+        start: str,
+        end: str,
+        base_dir: str,
+        timezone: str,
+        bar: str,
+        format: str,
+        seed: list,
+        price: float,
+        end_price: float,
+        volatility: float,
+        gap_rate: float,
+        duplicate_rate: float,
+        replace: bool,
+) -> dict:
+    candle = make_candle(
+        start=start,
+        end=end,
+        bar=bar,
+        timezone=timezone,
+        seed=seed,
+        price=price,
+        end_price=end_price,
+        volatility=volatility,
+        gap_rate=gap_rate,
+        duplicate_rate=duplicate_rate,
+    )
+    # 注入了缺失或重复的数据时原样写入，不去重也不验证
+    clean = gap_rate <= 0 and duplicate_rate <= 0
+    paths = _save.save_candle_by_date(
+        candle=candle,
+        instType=instType,
+        symbol=symbol,
+        start=start,
+        end=end,
+        base_dir=base_dir,
+        timezone=timezone,
+        bar=bar,
+        replace=replace,
+        drop_duplicate=clean,
+        sort=clean,
+        valid_interval=clean,
+        valid_start=clean,
+        valid_end=clean,
+        format=format,
+    )
+    return {'files': len(paths), 'rows': int(candle.shape[0])}
+
+
+# 生成并写入一个产品的全部数据
+def _make_file(
+        instType: str,
+        symbol: str,
+        chunks: list,
+        base_dir: str,
+        timezone: str,
+        bar: str,
+        format: str,
+        volatility: float,
+        gap_rate: float,
+        duplicate_rate: float,
+        replace: bool,
+) -> dict:
+    candle = np.concatenate([
+        make_candle(
+            bar=bar,
+            timezone=timezone,
+            volatility=volatility,
+            gap_rate=gap_rate,
+            duplicate_rate=duplicate_rate,
+            **chunk
+        )
+        for chunk in chunks
+    ])
+    clean = gap_rate <= 0 and duplicate_rate <= 0
+    path = _save.save_candle_by_file(
+        candle=candle,
+        instType=instType,
+        symbol=symbol,
+        base_dir=base_dir,
+        timezone=timezone,
+        bar=bar,
+        replace=replace,
+        sort=clean,
+        drop_duplicate=clean,
+        valid_interval=clean,
+        format=format,
+    )
+    return {'files': 0 if path == None else 1, 'rows': int(candle.shape[0])}
+
+
+# 执行全部任务，按照产品汇总结果
+def _run_tasks(
+        func,
+        func_name: str,
+        params: list,
+        p_num: int,
+        p_mode: str,
+        skip_exception: bool,
+) -> dict:
+    _parallel.check_p_mode(p_mode, func=func_name)
+    params = [dict(param, report_func=func) for param in params]
+    if p_num > 1 and p_mode == 'process':
+        results = _process.pool_worker(params=params, p_num=p_num, func=_parallel.report_worker, skip_exception=False)
+    elif p_num > 1:
+        results = _parallel.thread_worker(params=params, p_num=p_num, func=_parallel.report_worker)
+    else:
+        results = [_parallel.report_worker(**param) for param in params]
+    report = {}
+    for param, result in zip(params, results):
+        # 子进程异常退出，没有返回结果
+        if result == None:
+            result = {'code': False, 'data': None, 'msg': 'no result returned from the worker process'}
+        symbol_result = report.setdefault(
+            param['symbol'],
+            {'code': True, 'data': {'files': 0, 'rows': 0}, 'msg': ''},
+        )
+        if not result['code']:
+            symbol_result['code'] = False
+            symbol_result['msg'] += result['msg']
+            continue
+        symbol_result['data']['files'] += result['data']['files']
+        symbol_result['data']['rows'] += result['data']['rows']
+    errors = ['{symbol}: {msg}'.format(symbol=symbol, msg=result['msg'])
+              for symbol, result in report.items() if not result['code']]
+    if errors and not skip_exception:
+        raise exception.ExecuteException(func=func_name, msg='\n'.join(errors))
+    return report
+
+
+# 生成以日期为单位存储的数据集
+def make_candle_by_date(
+        instType: str,
+        base_dir: str,
+        symbols: Union[list, int],
+        start: Union[int, float, str, datetime.date],
+        end: Union[int, float, str, datetime.date],
+        timezone: str = None,
+        bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = '1m',
+        format: str = 'csv',
+        seed: int = 0,
+        price: float = 100.0,
+        volatility: float = 1e-3,
+        gap_rate: float = 0.0,
+        duplicate_rate: float = 0.0,
+        chunk_days: int = 31,
+        replace: bool = True,
+        p_num: int = 1,
+        p_mode: Literal['process', 'thread'] = 'process',
+        skip_exception: bool = False,
+) -> dict:
+    '''
+    :param instType: 产品类别
+    :param base_dir: 数据文件夹
+    :param symbols: 产品名称列表，或者产品数量（使用make_symbols的名称）
+    :param start: 起始日期
+    :param end: 终止日期（包含）
+    :param timezone: 时区
+    :param bar: 时间粒度
+    :param format: 存储格式
+    :param seed: 随机数种子，每个产品与分块的种子由seed与产品名称派生
+    :param price: 每个产品的起始价格
+    :param volatility: 每根K线收盘价对数收益率的标准差
+    :param gap_rate: 每根K线被删除的概率
+    :param duplicate_rate: 每根K线重复一次的概率
+    :param chunk_days: 每个任务生成的天数，决定了单个任务占用的内存
+    :param replace: 是否覆盖已有的文件
+    :param p_num: 并行数量，<=1时顺序生成
+    :param p_mode: 并行方式 process|thread
+    :param skip_exception: 某个产品写入失败时是否继续
+        True    记录在返回结果中，继续写入其他产品
+        False   全部任务完成后抛出ExecuteException
+    :return: {symbol: {'code': True|False, 'data': {'files': 写入的文件数量, 'rows': 生成的行数}, 'msg': 失败原因}}
+
+    gap_rate或duplicate_rate大于0时，数据原样写入，不进行去重与验证
+    '''
+    if isinstance(symbols, int):
+        symbols = make_symbols(symbols)
+    # 预先初始化清单，避免并行写入时同时创建数据集
+    manifest_kwargs = dict(instType=instType, base_dir=base_dir, timezone=timezone, bar=bar)
+    _manifest.init_manifest(format=format, **manifest_kwargs)
+    params = []
+    for symbol in symbols:
+        for chunk in _get_chunks(
+                symbol=symbol,
+                start=start,
+                end=end,
+                timezone=timezone,
+                bar=bar,
+                seed=seed,
+                price=price,
+                volatility=volatility,
+                chunk_days=chunk_days,
+        ):
+            params.append(dict(
+                instType=instType,
+                symbol=symbol,
+                base_dir=base_dir,
+                timezone=timezone,
+                bar=bar,
+                format=format,
+                volatility=volatility,
+                gap_rate=gap_rate,
+                duplicate_rate=duplicate_rate,
+                replace=replace,
+                **chunk
+            ))
+    return _run_tasks(
+        func=_make_date_chunk,
+        func_name='make_candle_by_date',
+        params=params,
+        p_num=p_num,
+        p_mode=p_mode,
+        skip_exception=skip_exception,
+    )
+
+
+# 生成以文件为单位存储的数据集
+def make_candle_by_file(
+        instType: str,
+        base_dir: str,
+        symbols: Union[list, int],
+        start: Union[int, float, str, datetime.date],
+        end: Union[int, float, str, datetime.date],
+        timezone: str = None,
+        bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = '1m',
+        format: str = 'csv',
+        seed: int = 0,
+        price: float = 100.0,
+        volatility: float = 1e-3,
+        gap_rate: float = 0.0,
+        duplicate_rate: float = 0.0,
+        chunk_days: int = 31,
+        replace: bool = True,
+        p_num: int = 1,
+        p_mode: Literal['process', 'thread'] = 'process',
+        skip_exception: bool = False,
+) -> dict:
+    '''
+    参数与make_candle_by_date相同，相同的参数生成的数据与make_candle_by_date相同
+    每个产品一个任务，单个任务占用整个日期范围的内存
+    :return: {symbol: {'code': True|False, 'data': {'files': 写入的文件数量, 'rows': 生成的行数}, 'msg': 失败原因}}
+    '''
+    if isinstance(symbols, int):
+        symbols = make_symbols(symbols)
+    params = [
+        dict(
+            instType=instType,
+            symbol=symbol,
+            chunks=_get_chunks(
+                symbol=symbol,
+                start=start,
+                end=end,
+                timezone=timezone,
+                bar=bar,
+                seed=seed,
+                price=price,
+                volatility=volatility,
+                chunk_days=chunk_days,
+            ),
+            base_dir=base_dir,
+            timezone=timezone,
+            bar=bar,
+            format=format,
+            volatility=volatility,
+            gap_rate=gap_rate,
+            duplicate_rate=duplicate_rate,
+            replace=replace,
+        )
+        for symbol in symbols
+    ]
+    return _run_tasks(
+        func=_make_file,
+        func_name='make_candle_by_file',
+        params=params,
+        p_num=p_num,
+        p_mode=p_mode,
+        skip_exception=skip_exception,
+    )
@@ -0,0 +1,336 @@
+'''
+读写流程各阶段的耗时统计
+
+开启追踪后，读取与保存函数在每个阶段记录一个事件: 阶段名称、产品名称、起止时间、文件数量、字节数与行数
+没有开启追踪时每个阶段只多一次全局变量的判断
+
+    with tracing() as tracer:
+        load.load_candle_map_by_date(...)
+    print(tracer.format_summary())
+    tracer.dump_chrome_trace('trace.json')      # chrome://tracing 或 https://ui.perfetto.dev
+
+阶段:
+    load_candle_by_date / load_candle_by_file / save_candle_by_date / save_candle_by_file
+                    单个产品的完整调用，内部的阶段继承它的产品名称
+    check_path      检查以日期为单位存储的文件是否齐全
+    find_segment    在合并后的分段文件中查找缺失日期的数据
+    read            读取文件（缓存命中时没有这个阶段），bytes为文件大小
+    write           写入文件，bytes为写入后的文件大小
+    append          在文件末尾追加数据，bytes为追加的字节数
+    concat          合并多个日期的数据
+    to_candle       排序去重
+    valid           验证数据
+    manifest        追加数据集清单
+    get_symbols     查询产品名称
+    pool            多进程读写在主进程中的总耗时（包括进程启动与结果的序列化传回）
+    shm_attach      映射子进程写入的共享内存
+
+追踪在当前进程中生效，线程池中的读写记录在同一个Tracer中
+多进程读写时子进程各自记录，随结果传回主进程合并（Linux与macOS的perf_counter在进程之间可比）
+
+Tracer          事件记录
+tracing         在with语句中开启追踪
+get_tracer      当前的Tracer，没有开启追踪返回None
+span            记录一个阶段
+traced          记录函数调用的装饰器
+pool_worker     多进程执行，开启追踪时合并子进程的事件
+'''
+
+from contextlib import contextmanager
+import os
+import functools
+import json
+import time
+import threading
+from paux import process as _process
+
+__all__ = ['Tracer', 'tracing', 'get_tracer', 'span', 'traced', 'pool_worker']
+
+ENCODING = 'UTF-8'
+# 事件中的计数字段
+COUNTERS = ['files', 'bytes', 'rows']
+
+# 当前的Tracer
+_TRACER = None
+
+
+class Tracer():
+    def __init__(self, callback=None):
+        '''
+        :param callback: 每记录一个事件调用一次 callback(event)，event的字段见add
+        '''
+        self.callback = callback
+        self.events = []
+        # 每个线程当前所在阶段的产品名称
+        self._local = threading.local()
+
+    # 记录一个事件
+    def add(
+            self,
+            stage: str,
+            start: float,
+            end: float,
+            symbol: str = None,
+            files: int = 0,
+            bytes: int = 0,
+            rows: int = 0,
+            pid: int = None,
+            tid: int = None,
+    ) -> dict:
+        '''
+        :param stage: 阶段名称
+        :param start: 起始时间 time.perf_counter()
+        :param end: 终止时间 time.perf_counter()
+        :param symbol: 产品名称
+        :param files: 文件数量
+        :param bytes: 字节数
+        :param rows: 行数
+        :param pid: 进程id，None表示当前进程
+        :param tid: 线程id，None表示当前线程
+        '''
+        event = {
+            'stage': stage,
+            'symbol': symbol,
+            'start': start,
+            'end': end,
+            'files': files,
+            'bytes': bytes,
+            'rows': rows,
+            'pid': os.getpid() if pid == None else pid,
+            'tid': threading.get_ident() if tid == None else tid,
+        }
+        self._add_event(event)
+        return event
+
+    def _add_event(self, event: dict) -> None:
+        self.events.append(event)
+        if self.callback != None:
+            self.callback(event)
+
+    # 合并其他进程记录的事件
+    def extend(self, events: list) -> None:
+        for event in events:
+            self._add_event(event)
+
+    # 记录一个阶段，with语句中得到的字典可以填写files、bytes与rows
+    @contextmanager
+    def span(self, stage: str, symbol: str = None):
+        '''
+        :param stage: 阶段名称
+        :param symbol: 产品名称，None表示继承当前线程外层阶段的产品名称
+        '''
+        symbols = getattr(self._local, 'symbols', None)
+        if symbols == None:
+            symbols = self._local.symbols = []
+        if symbol == None and symbols:
+            symbol = symbols[-1]
+        record = {'files': 0, 'bytes': 0, 'rows': 0}
+        symbols.append(symbol)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            end = time.perf_counter()
+            symbols.pop()
+            self.add(stage=stage, start=start, end=end, symbol=symbol, **record)
+
+    # 按照阶段或者产品汇总
+    def summary(self, by: str = 'stage') -> list:
+        '''
+        :param by: 汇总方式
+            stage   按照阶段
+            symbol  按照产品与阶段
+        :return: [{'stage', 'symbol', 'count', 'seconds', 'max_seconds', 'files', 'bytes', 'rows'}, ...]
+            按照首次出现的顺序排列，by=symbol时先按照产品名称排序，by=stage时symbol为None
+        '''
+        groups = {}
+        for event in self.events:
+            key = (event['stage'], event['symbol'] if by == 'symbol' else None)
+            group = groups.get(key)
+            if group == None:
+                group = groups[key] = {
+                    'stage': key[0],
+                    'symbol': key[1],
+                    'count': 0,
+                    'seconds': 0.0,
+                    'max_seconds': 0.0,
+                    'files': 0,
+                    'bytes': 0,
+                    'rows': 0,
+                }
+            seconds = event['end'] - event['start']
+            group['count'] += 1
+            group['seconds'] += seconds
+            group['max_seconds'] = max(group['max_seconds'], seconds)
+            for counter in COUNTERS:
+                group[counter] += event[counter]
+        if by == 'symbol':
+            return sorted(groups.values(), key=lambda group: group['symbol'] or '')
+        return list(groups.values())
+
+    # 汇总表格
+    def format_summary(self, by: str = 'stage') -> str:
+        '''
+        :param by: 汇总方式 stage|symbol
+        '''
+        head = '{:<24}{:>8}{:>12}{:>12}{:>10}{:>12}{:>12}'
+        line = '{:<24}{:>8}{:>12.3f}{:>12.3f}{:>10}{:>12.2f}{:>12}'
+        lines = []
+        if by == 'symbol':
+            head = '{:<20}' + head
+            line = '{:<20}' + line
+        titles = ['stage', 'count', 'total(s)', 'max(ms)', 'files', 'MB', 'rows']
+        lines.append(head.format(*(['symbol'] if by == 'symbol' else []) + titles))
+        for group in self.summary(by=by):
+            values = [
+                group['stage'],
+                group['count'],
+                group['seconds'],
+                group['max_seconds'] * 1000,
+                group['files'],
+                group['bytes'] / 1024 / 1024,
+                group['rows'],
+            ]
+            if by == 'symbol':
+                values = [str(group['symbol'])] + values
+            lines.append(line.format(*values))
+        return '\n'.join(lines)
+
+    # Chrome Trace Event格式
+    def to_chrome_trace(self) -> dict:
+        origin = min([event['start'] for event in self.events], default=0)
+        trace_events = []
+        for event in self.events:
+            trace_events.append({
+                'name': event['stage'],
+                'cat': 'candlelite',
+                'ph': 'X',
+                'ts': (event['start'] - origin) * 1e6,
+                'dur': (event['end'] - event['start']) * 1e6,
+                'pid': event['pid'],
+                'tid': event['tid'],
+                'args': {
+                    'symbol': event['symbol'],
+                    'files': event['files'],
+                    'bytes': event['bytes'],
+                    'rows': event['rows'],
+                },
+            })
+        return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
+    # 保存为Chrome Trace Event格式的JSON文件
+    def dump_chrome_trace(self, path: str) -> None:
+        with open(path, 'w', encoding=ENCODING) as f:
+            json.dump(self.to_chrome_trace(), f)
+
+    # 清空事件
+    def clear(self) -> None:
+        self.events = []
+
+
+class _NullSpan():
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+# 在with语句中开启追踪，退出时恢复之前的Tracer
+@contextmanager
+def tracing(tracer: Tracer = None):
+    '''
+    :param tracer: 记录事件的Tracer，None表示新建
+    '''
+    global _TRACER
+    if tracer == None:
+        tracer = Tracer()
+    last_tracer = _TRACER
+    _TRACER = tracer
+    try:
+        yield tracer
+    finally:
+        _TRACER = last_tracer
+
+
+# 当前的Tracer，没有开启追踪返回None
+def get_tracer():
+    return _TRACER
+
+
+# 记录一个阶段，没有开启追踪时with语句中得到None
+def span(stage: str, symbol: str = None):
+    '''
+    :param stage: 阶段名称
+    :param symbol: 产品名称，None表示继承外层阶段的产品名称
+
+        with trace.span('read') as record:
+            ...
+            if record != None:
+                record['bytes'] = ...
+    '''
+    if _TRACER == None:
+        return _NULL_SPAN
+    return _TRACER.span(stage=stage, symbol=symbol)
+
+
+# 记录函数调用的装饰器，产品名称取自参数symbol，行数取自返回的candle或者参数candle
+def traced(stage: str):
+    '''
+    :param stage: 阶段名称
+    '''
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _TRACER == None:
+                return func(*args, **kwargs)
+            with _TRACER.span(stage=stage, symbol=kwargs.get('symbol')) as record:
+                result = func(*args, **kwargs)
+                candle = result if hasattr(result, 'shape') else kwargs.get('candle')
+                if hasattr(candle, 'shape') and len(candle.shape):
+                    record['rows'] = int(candle.shape[0])
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+# 在子进程中开启追踪并执行函数，返回结果与事件
+def worker(trace_func, **kwargs) -> dict:
+    tracer = Tracer()
+    with tracing(tracer):
+        data = trace_func(**kwargs)
+    return {'data': data, 'events': tracer.events}
+
+
+# 多进程执行（paux.process.pool_worker，出现异常时终止），开启追踪时合并子进程的事件
+def pool_worker(params: list, p_num: int, func) -> list:
+    '''
+    :param params: 参数序列 [dict, dict, ...]
+    :param p_num: 进程数
+    :param func: 执行函数
+    :return: 按照params顺序的结果，子进程异常退出时为None
+    '''
+    tracer = _TRACER
+    if tracer == None:
+        return _process.pool_worker(params=params, p_num=p_num, func=func, skip_exception=False)
+    with tracer.span('pool'):
+        results = _process.pool_worker(
+            params=[dict(param, trace_func=func) for param in params],
+            p_num=p_num,
+            func=worker,
+            skip_exception=False,
+        )
+    datas = []
+    for result in results:
+        if result == None:
+            datas.append(None)
+            continue
+        tracer.extend(result['events'])
+        datas.append(result['data'])
+    return datas
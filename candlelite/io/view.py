@@ -0,0 +1,293 @@
+'''
+以日期为单位存储的单个产品的延迟加载视图
+
+CandleView只在创建时查询数据的日期范围，按照时间切片或者行索引访问时，只读取相交的单日文件
+读取过的单日数据保存在视图内部（按照最近使用淘汰），滚动回测重复访问相邻的日期时不再读取文件
+
+行索引需要每天的行数:
+    数据集清单已初始化时使用清单中记录的行数（仍在追加写入的日期读取文件的行数）
+    否则按照完整数据计算每天的行数（夏令时切换日按照当天实际的时长），读取时校验
+'''
+
+from collections import OrderedDict
+from typing import Union, Literal
+import datetime
+import numpy as np
+from paux import date as _date
+from candlelite.calculate import interval as _interval
+from candlelite.io import path as _path
+from candlelite.io import manifest as _manifest
+from candlelite.io import storage as _storage
+from candlelite.io import cache as _cache
+from candlelite.io import load as _load
+from candlelite import exception
+
+__all__ = ['CandleView']
+
+
+class CandleView():
+    def __init__(
+            self,
+            instType: str,
+            symbol: str,
+            base_dir: str,
+            timezone: str = None,
+            bar: Literal['1m', '3m', '5m', '15m', '1H', '2H', '4H'] = '1m',
+            format: str = 'csv',
+            mmap: bool = False,
+            cache: _cache.CandleCache = None,
+            valid_interval: bool = True,
+            max_days: int = 366,
+    ):
+        '''
+        :param instType: 产品类型
+        :param symbol: 产品名称
+        :param base_dir: 数据文件夹
+        :param timezone: 时区
+        :param bar: 时间粒度
+        :param format: 存储格式 csv|npy|npc
+        :param mmap: 是否以内存映射的方式读取（仅支持npy格式）
+        :param cache: 进程内的单日数据缓存，None表示不使用
+        :param valid_interval: 读取单日数据时是否验证数据时间间隔
+        :param max_days: 视图内部最多保存的单日数据数量
+        '''
+        if max_days < 1:
+            raise exception.ParamException(
+                func='CandleView',
+                msg='max_days={max_days}, max_days must >= 1'.format(max_days=max_days),
+            )
+        self.instType = instType
+        self.symbol = symbol
+        self.base_dir = base_dir
+        self.timezone = timezone
+        self.bar = bar
+        self.format = format
+        self.mmap = mmap
+        self.cache = cache
+        self.valid_interval = valid_interval
+        self.max_days = max_days
+        self.interval = _interval.get_interval(bar)
+        candle_dates_result = _path.get_candle_dates(
+            instType=instType,
+            symbol=symbol,
+            base_dir=base_dir,
+            timezone=timezone,
+            bar=bar,
+            format=format,
+        )
+        if candle_dates_result['code'] != True:
+            raise exception.CandleDatesNonError(str(candle_dates_result))
+        # 数据覆盖的日期
+        self.start_date = candle_dates_result['data']['start']
+        self.end_date = candle_dates_result['data']['end']
+        if self.start_date:
+            self.dates = _date.get_range_dates(start=self.start_date, end=self.end_date, timezone=timezone)
+        else:
+            self.dates = []
+        self._date_indexes = {date: i for i, date in enumerate(self.dates)}
+        # 每天起始的毫秒时间戳，最后一个元素为终止日期的下一天
+        self._day_ts = np.array(
+            [_date.to_ts(date=date, timezone=timezone) for date in self.dates] +
+            ([_date.tomorrow(date=self.dates[-1], timezone=timezone).timestamp() * 1000] if self.dates else []),
+            dtype=np.float64,
+        )
+        self._offsets = None
+        self._days = OrderedDict()
+        # 依次读取同一分段中的日期时只读取一次分段
+        self._segments = {}
+
+    # 数据覆盖的起始时间戳
+    @property
+    def start_ts(self) -> Union[float, None]:
+        return self._day_ts[0] if self.dates else None
+
+    # 数据覆盖的终止时间戳（最后一根K线）
+    @property
+    def end_ts(self) -> Union[float, None]:
+        return self._day_ts[-1] - self.interval if self.dates else None
+
+    # 每天第一行在视图中的行索引，最后一个元素为总行数
+    @property
+    def offsets(self) -> np.ndarray:
+        if self._offsets is None:
+            manifest = _manifest.read_manifest(
+                instType=self.instType,
+                base_dir=self.base_dir,
+                timezone=self.timezone,
+                bar=self.bar,
+                format=self.format,
+            )
+            rows = (np.diff(self._day_ts) // self.interval).astype(np.int64)
+            if manifest != None:
+                symbol_dates = manifest.get(self.symbol, {})
+                for i, date in enumerate(self.dates):
+                    record = symbol_dates.get(date)
+                    if record == None:
+                        continue
+                    if _manifest.is_open_record(record):
+                        rows[i] = _storage.read_summary(
+                            path=_path.get_candle_date_path(
+                                instType=self.instType,
+                                symbol=self.symbol,
+                                date=date,
+                                timezone=self.timezone,
+                                bar=self.bar,
+                                base_dir=self.base_dir,
+                                format=self.format,
+                            ),
+                            format=self.format,
+                        )['rows']
+                    else:
+                        rows[i] = record['rows']
+            self._offsets = np.concatenate([[0], np.cumsum(rows)]).astype(np.int64)
+        return self._offsets
+
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+
+    def __repr__(self) -> str:
+        return 'CandleView(instType={instType}, symbol={symbol}, bar={bar}, start={start}, end={end})'.format(
+            instType=self.instType,
+            symbol=self.symbol,
+            bar=self.bar,
+            start=self.start_date,
+            end=self.end_date,
+        )
+
+    # 读取单日数据（视图内部缓存）
+    def get_day(self, date: str) -> np.ndarray:
+        '''
+        :param date: 日期 %Y-%m-%d
+        :return: 该日期的candle
+        '''
+        if date not in self._date_indexes:
+            raise exception.ParamException(
+                func='CandleView.get_day',
+                msg='date={date}, date must in {start}~{end}'.format(
+                    date=date, start=self.start_date, end=self.end_date
+                ),
+            )
+        candle = self._days.get(date)
+        if candle is not None:
+            self._days.move_to_end(date)
+            return candle
+        candle = _load._read_date_candle(
+            instType=self.instType,
+            symbol=self.symbol,
+            dates=[date],
+            base_dir=self.base_dir,
+            timezone=self.timezone,
+            bar=self.bar,
+            format=self.format,
+            mmap=self.mmap,
+            cache=self.cache,
+            segment_cache=self._segments,
+        )
+        if self.valid_interval:
+            _load._valid_date_candle(
+                candle=candle,
+                symbol=self.symbol,
+                start_date=None,
+                end_date=None,
+                timezone=self.timezone,
+                bar=self.bar,
+                valid_interval=True,
+            )
+        # 视图内部保存的数据与调用者共享，设置为只读
+        candle.flags.writeable = False
+        self._days[date] = candle
+        while len(self._days) > self.max_days:
+            self._days.popitem(last=False)
+        return candle
+
+    # 按照时间切片，包含start与end
+    def slice(
+            self,
+            start: Union[int, float, str, datetime.date] = None,
+            end: Union[int, float, str, datetime.date] = None,
+            columns: list = [],
+    ) -> np.ndarray:
+        '''
+        :param start: 起始时间，None表示数据的起点
+        :param end: 终止时间，None表示数据的终点
+        :param columns: 保留字段，空列表表示全部
+        :return: start<=ts<=end的candle
+        '''
+        start_ts = self.start_ts if start == None else _date.to_ts(date=start, timezone=self.timezone)
+        end_ts = self.end_ts if end == None else _date.to_ts(date=end, timezone=self.timezone)
+        if not self.dates or start_ts > end_ts:
+            return self._empty(columns)
+        # 与切片相交的日期
+        first = max(int(np.searchsorted(self._day_ts, start_ts, side='right')) - 1, 0)
+        last = min(int(np.searchsorted(self._day_ts, end_ts, side='right')) - 1, len(self.dates) - 1)
+        if first > last:
+            return self._empty(columns)
+        candles = []
+        for date in self.dates[first:last + 1]:
+            candle = self.get_day(date)
+            candle = candle[(candle[:, 0] >= start_ts) & (candle[:, 0] <= end_ts)]
+            if columns:
+                candle = candle[:, columns]
+            candles.append(candle)
+        return np.concatenate(candles)
+
+    # 按照行索引读取，支持整数、切片与(行, 列)
+    def __getitem__(self, key):
+        columns = slice(None)
+        if isinstance(key, tuple):
+            key, columns = key
+        size = len(self)
+        if isinstance(key, slice):
+            indexes = np.arange(*key.indices(size))
+        else:
+            index = int(key)
+            if index < 0:
+                index += size
+            if not 0 <= index < size:
+                raise IndexError('index {index} is out of bounds for size {size}'.format(index=key, size=size))
+            indexes = np.array([index])
+        day_indexes = np.searchsorted(self.offsets, indexes, side='right') - 1
+        candle = None
+        for i in np.unique(day_indexes).tolist():
+            day_candle = self.get_day(self.dates[i])
+            # 行索引依赖每天的行数
+            if day_candle.shape[0] != self.offsets[i + 1] - self.offsets[i]:
+                raise exception.CandleIntervalError(
+                    symbol=self.symbol,
+                    msg='[view rows error]: date={date} correct_rows={rows} error_rows={error_rows}'.format(
+                        date=self.dates[i],
+                        rows=self.offsets[i + 1] - self.offsets[i],
+                        error_rows=day_candle.shape[0],
+                    ),
+                )
+            positions = np.flatnonzero(day_indexes == i)
+            day_rows = day_candle[indexes[positions] - self.offsets[i]]
+            if candle is None:
+                candle = np.empty((indexes.shape[0],) + day_rows.shape[1:], dtype=day_rows.dtype)
+            # 按照行索引原来的位置写入，负步长的切片与ndarray一致
+            candle[positions] = day_rows
+        if candle is None:
+            candle = self._empty([])
+        candle = candle[:, columns]
+        if not isinstance(key, slice):
+            return candle[0]
+        return candle
+
+    # 读取全部数据
+    def to_candle(self, columns: list = []) -> np.ndarray:
+        return self.slice(columns=columns)
+
+    # 清空视图内部的单日数据与分段
+    def clear(self) -> None:
+        self._days.clear()
+        self._segments.clear()
+
+    # 空数据，列数与已经读取的数据相同
+    def _empty(self, columns: list) -> np.ndarray:
+        if columns:
+            width = len(columns)
+        elif self._days:
+            width = next(iter(self._days.values())).shape[1]
+        else:
+            width = 6
+        return np.zeros((0, width), dtype=np.float64)
@@ -18,11 +18,13 @@ INIT_DATA = {
     "OKX_FILE_DIRNAME": ["'OKX_FILE'", 'OKX以文件为单位的存储目录'],
     "OKX_TIMEZONE": ["'Asia/Shanghai'", 'OKX的默认时区'],
     "OKX_DEFAULT_BAR": ["'1m'", 'OKX的默认时间粒度'],
+    "OKX_DEFAULT_FORMAT": ["'csv'", 'OKX的默认存储格式 csv|npy|npc'],
 
     "BINANCE_DATE_DIRNAME": ["'BINANCE'", 'BINANCE以日期为单位的存储目录'],
     "BINANCE_FILE_DIRNAME": ["'BINANCE_FILE'", 'BINANCE以文件为单位的存储目录'],
     "BINANCE_TIMEZONE": ["'America/New_York'", 'BINANCE的默认时区'],
     "BINANCE_DEFAULT_BAR": ["'1m'", 'BINANCE的默认时间粒度'],
+    "BINANCE_DEFAULT_FORMAT": ["'csv'", 'BINANCE的默认存储格式 csv|npy|npc'],
 
 }
 
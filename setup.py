@@ -84,7 +84,7 @@ setup(
     author_email=EMAIL,
     python_requires=REQUIRES_PYTHON,
     url=URL,
-    packages=find_packages(exclude=["tests", "*.tests", "*.tests.*", "tests.*"]),
+    packages=find_packages(exclude=["tests", "*.tests", "*.tests.*", "tests.*", "benchmarks", "benchmarks.*"]),
     install_requires=REQUIRED,
     extras_require=EXTRAS,
     include_package_data=True,